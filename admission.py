@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+
+class QueueFull(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """Bounded admission for graph runs.
+
+    At most `max_active` runs execute at once and at most `max_queue` wait
+    behind them; anything beyond that is refused immediately so callers can
+    back off instead of piling onto the sandbox pool and the LLM rate limit.
+    """
+
+    def __init__(self, max_active: int, max_queue: int, queue_timeout: float = 30):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.draining = False
+        self._slots = asyncio.Semaphore(max_active)
+        self._active = 0
+        self._waiting = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._avg_s = 30.0  # running estimate of a run's duration, for Retry-After
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "Admission":
+        # One run holds one sandbox per speculative candidate and makes its LLM calls in sequence
+        sandboxes = int(os.getenv("SANDBOX_POOL_MAX", "4")) // max(1, int(os.getenv("SPECULATIVE_K", "1")))
+        llm = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        max_active = int(os.getenv("SERVER_MAX_ACTIVE", "0")) or max(1, min(sandboxes, llm))
+        return cls(
+            max_active=max_active,
+            max_queue=int(os.getenv("SERVER_MAX_QUEUE", str(max_active * 2))),
+            queue_timeout=float(os.getenv("SERVER_QUEUE_TIMEOUT", "30")),
+        )
+
+    def retry_after(self) -> int:
+        return max(1, round(self._avg_s * (self._waiting + 1) / self.max_active))
+
+    def _refuse(self, reason: str):
+        self.rejected += 1
+        raise QueueFull(reason, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.draining:
+            self._refuse("Server is shutting down")
+        if self._active + self._waiting >= self.max_active + self.max_queue:
+            self._refuse("Too many requests in flight")
+        self._waiting += 1
+        self._idle.clear()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            self._active += 1
+        except asyncio.TimeoutError:
+            self._refuse(f"No capacity within {self.queue_timeout}s")
+        finally:
+            self._waiting -= 1
+            self._check_idle()
+
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_s = 0.8 * self._avg_s + 0.2 * (time.monotonic() - t0)
+            self._active -= 1
+            self._slots.release()
+            self._check_idle()
+
+    def _check_idle(self) -> None:
+        if self._active == 0 and self._waiting == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        # Refuse new work, then wait for in-flight runs to finish
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> dict:
+        return {"active": self._active, "waiting": self._waiting, "max_active": self.max_active,
+                "max_queue": self.max_queue, "rejected": self.rejected, "draining": self.draining,
+                "avg_run_s": round(self._avg_s, 2)}
@@ -1,48 +1,219 @@
 
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langgraph.graph import StateGraph, START, END 
-from daytona_utils import create_models, sandbox, download_charts
+from resources import get_models, get_pool, get_code_cache, get_registry, get_kernels, get_charts, get_speculation, get_memory, get_results, get_router, get_manifest, get_env_fixes, get_checkpointer, prewarm
+from code_cache import dataset_fingerprint
+from datasets import describe_datasets
+from ingest import ingest
+from memory import count_tokens, format_results
+from metrics import metrics
+from patching import PatchError, apply_fix, number_lines
+from recovery import TransientError, retry_policy
+from lifecycle import background
+from streaming import stream_code_run
+from telemetry import traced_node
+from validation import imported_modules, validate_code
+import inspect
+import os
 from prompts import Generator_PROMPT, Reflector_PROMPT, Summarizer_PROMPT, Manager_PROMPT
-from schema import GeneratorOutput, ReflectorOutput, AgentState, ManagerOutput
+from schema import GeneratorOutput, ReflectorOutput, AgentState, ManagerOutput, TRACE_RESET
 from typing import cast
 from dotenv import load_dotenv
 from langgraph.types import Command
+from langgraph.config import get_stream_writer
+from langchain_core.runnables import RunnableConfig
 from typing import Literal
+import time
+import uuid
 
 load_dotenv()
 
-MANAGER, GENERATOR, REFLECTOR, SUMMARIZER = create_models({"model": "gpt-4.1-mini"})
+if os.getenv("PREWARM", "").lower() in ("1", "true"):
+    prewarm()
+
+# "script" runs every attempt as a fresh process; "kernel" keeps one interpreter
+# per thread so retries and follow-ups reuse loaded data and unchanged cells
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "script")
+
+# K > 1 races K generator candidates in separate sandboxes; the first to run cleanly wins
+SPECULATIVE_K = int(os.getenv("SPECULATIVE_K", "1"))
+
+# Manager sees a token-budgeted window plus a rolling summary instead of the full history
+CONVERSATION_MEMORY = os.getenv("CONVERSATION_MEMORY", "1").lower() in ("1", "true")
+
+# Local rule/nearest-neighbour tiers answer obvious intents before the manager LLM is called
+FAST_ROUTER = os.getenv("FAST_ROUTER", "1").lower() in ("1", "true")
+
+# Reflector returns line patches against the failing code instead of the whole script
+PATCH_FIXES = os.getenv("PATCH_FIXES", "1").lower() in ("1", "true")
+
+# Static checks (syntax, imports, chart names, print(result)) before code reaches the sandbox
+STATIC_VALIDATION = os.getenv("STATIC_VALIDATION", "1").lower() in ("1", "true")
+
+REWRITE_REQUEST = "Return the complete corrected script in `code` instead of patches."
+
+# Transient LLM/sandbox errors are retried per node with backoff (NODE_RETRY_ATTEMPTS)
+RETRY_POLICY = retry_policy()
+
+
+def thread_id_of(config: RunnableConfig) -> str:
+    return str(config.get("configurable", {}).get("thread_id") or "default")
+
+
+def fingerprint_of(state: AgentState) -> str:
+    registry = get_registry()
+    return dataset_fingerprint([registry.get(h).sha256 for h in state.get("datasets") or []])
+
+
+def register_inline_data(state: AgentState) -> dict:
+    # Swap CSV pasted into the latest message for a dataset handle, so the raw
+    # data never travels through the manager, generator or reflector prompts
+    last = state["messages"][-1]
+    if not isinstance(last, HumanMessage) or not isinstance(last.content, str):
+        return {}
+    content, found = get_registry().extract_inline(last.content)
+    if not found:
+        return {}
+    return {"messages": [HumanMessage(content=content, id=last.id)], "datasets": [d.handle for d in found]}
+
   
-def manager_cmd(state: AgentState) -> Command[Literal["code_gen", "summarizer","__end__"]]:
+def manager_messages(state: AgentState, thread_id: str, update: dict) -> tuple[dict, list]:
+    messages = state["messages"][:-1] + update["messages"] if update else state["messages"]
+    if not CONVERSATION_MEMORY:
+        return update, [Manager_PROMPT] + messages
 
-    resp = cast(ManagerOutput, MANAGER.invoke([Manager_PROMPT] + state["messages"]))
+    memory = get_memory()
+    window = memory.context(thread_id, messages, state.get("conversation_summary"), state.get("summarized_count", 0))
+    index = get_results().index(thread_id)
+    prompt = [Manager_PROMPT] + ([SystemMessage(content=index)] if index else [])
+    return {**update, **memory.snapshot(thread_id)}, prompt + window
+
+
+def route_manager(resp: ManagerOutput, update: dict) -> Command:
     decision = resp.decision
 
+    # Threads are checkpointed, so a failure or trace from an earlier turn must not leak into this one
+    update = {**update, "trace": {TRACE_RESET: True, **(update.get("trace") or {})}}
     if decision == "code_gen":
-        return Command(update = {"question": resp.question},
-                   goto = "code_gen"
+        return Command(update = {**update, "question": resp.question, "system_error": None},
+                   goto = "ingest"
  )
     elif decision == "summarizer":
-        return Command(update = {"question": resp.question},
+        return Command(update = {**update, "question": resp.question, "result_refs": resp.result_refs, "system_error": None},
                    goto = "summarizer"
  )  
     else:
-        return Command(update = {"messages": [AIMessage(content=resp.messages)]},
+        return Command(update = {**update, "messages": update.get("messages", []) + [AIMessage(content=resp.messages)]},
                    goto = "__end__"
 )
 
+  
+def routing_input(state: AgentState, update: dict, thread_id: str) -> dict:
+    last = (update.get("messages") or state["messages"])[-1]
+    return {
+        "text": last.content if isinstance(last.content, str) else "",
+        "has_data": bool(state.get("datasets") or update.get("datasets")),
+        "latest": get_results().latest(thread_id),
+    }
+
 
-def code_gen(state: AgentState):
-    sandbox.start()
-    question = state["question"]
-    msgs = [
+def fast_route(inputs: dict) -> tuple[ManagerOutput | None, dict]:
+    if not FAST_ROUTER:
+        return None, {}
+    t0 = time.perf_counter()
+    route = get_router().route(inputs["text"], inputs["has_data"], inputs["latest"] is not None)
+    router_ms = round((time.perf_counter() - t0) * 1000, 3)
+    tier = route.tier if route else "miss"
+    metrics.observe("router_ms", router_ms, tier=tier)
+    trace = {"router_tier": tier, "router_ms": router_ms, "router_confidence": route.confidence if route else None}
+    if route is None:
+        return None, trace
+    resp = ManagerOutput(
+        decision=route.decision,
+        messages=route.reply,
+        question=None if route.decision == "chats" else inputs["text"],
+        result_refs=[inputs["latest"]["id"]] if route.decision == "summarizer" else None,
+    )
+    return resp, trace
+
+
+def record_route(inputs: dict, resp: ManagerOutput, manager_ms: float, trace: dict) -> dict:
+    metrics.observe("router_ms", manager_ms, tier="llm")
+    if FAST_ROUTER:
+        # The manager's decisions are the training data for the nearest-neighbour tier
+        get_router().record(inputs["text"], resp.decision, inputs["has_data"], inputs["latest"] is not None)
+    return {**trace, "router_tier": "llm", "manager_ms": manager_ms}
+
+
+def manager_cmd(state: AgentState, config: RunnableConfig) -> Command[Literal["ingest", "summarizer","__end__"]]:
+    thread_id = thread_id_of(config)
+    update = register_inline_data(state)
+    inputs = routing_input(state, update, thread_id)
+    resp, trace = fast_route(inputs)
+    if resp is None:
+        update, msgs = manager_messages(state, thread_id, update)
+        t0 = time.perf_counter()
+        resp = cast(ManagerOutput, get_models().manager.invoke(msgs))
+        trace = record_route(inputs, resp, round((time.perf_counter() - t0) * 1000, 1), trace)
+    return route_manager(resp, {**update, "trace": trace})
+
+
+def route_execution(state: AgentState, config: RunnableConfig) -> dict:
+    pool = get_pool()
+    if not hasattr(pool, "route"):
+        return {}
+    # Tiered pools decide local vs remote before the thread's first lease of the turn
+    registry = get_registry()
+    size = sum(registry.get(h).size for h in state.get("datasets") or [])
+    trusted = bool(config.get("configurable", {}).get("trusted"))
+    return {"execution_tier": pool.route(thread_id_of(config), size, trusted)}
+
+
+def ingest_datasets(state: AgentState, config: RunnableConfig):
+    trace = route_execution(state, config)
+    registry = get_registry()
+    pending = [h for h in state.get("datasets") or [] if registry.get(h).profile is None]
+    if not pending:
+        return {"trace": trace} if trace else {}
+    # Only first sight of a dataset touches the sandbox; later runs reuse the cached profile
+    t0 = time.perf_counter()
+    try:
+        ingest(get_pool().lease(thread_id_of(config)), registry, pending)
+    except RuntimeError as e:
+        return {"trace": {**trace, "ingest_error": str(e)}}
+    return {"trace": {**trace, "ingest_ms": round((time.perf_counter() - t0) * 1000, 1)}}
+
+
+def cached_solution(state: AgentState) -> dict | None:
+    cached = get_code_cache().get(state["question"], fingerprint_of(state))
+    if not cached:
+        return None
+    # Known-good code for this question and dataset: skip the generator entirely
+    cache_key, code_soln, tier = cached
+    return {**code_soln, "attempts": 1, "answer": None, "agent_error": None, "cache_key": cache_key, "cache_hit": tier}
+
+
+def generator_messages(state: AgentState) -> list:
+    registry = get_registry()
+    datasets = [registry.get(h) for h in state.get("datasets") or []]
+    return [
         Generator_PROMPT,                
-        HumanMessage(content=question) 
+        HumanMessage(content=f"{state['question']}\n\n{describe_datasets(datasets)}".strip()) 
     ]
-    code_soln = cast(GeneratorOutput, GENERATOR.invoke(msgs))
 
+
+def startup_trace(sandbox, start_ms: float, generator_ms: float) -> dict:
+    return {
+        "sandbox_start_ms": round(start_ms, 1),
+        "sandbox_start_skipped": start_ms == 0,
+        # A skipped start saves a whole round-trip; an overlapped one saves what ran alongside the LLM
+        "sandbox_start_saved_ms": round(sandbox.start_rtt_ms if start_ms == 0 else min(start_ms, generator_ms), 1),
+    }
+
+
+def generator_update(code_soln: GeneratorOutput | None, sandbox_trace: dict) -> dict:
     if code_soln is None:
-        return {"code":"", "system_error": "Generator didnt provide any code soln"}
+        return {"code":"", "system_error": "Generator didnt provide any code soln", "trace": sandbox_trace}
     
     code_soln = code_soln.model_dump() 
     thinking = code_soln.get("thinking")
@@ -50,37 +221,205 @@ def code_gen(state: AgentState):
     charts_exists = code_soln.get("charts_exists")
     generated_chart_names = code_soln.get("generated_chart_names")
 
-    return {"code": code, "thinking": thinking, "attempts": 1, "charts_exists": charts_exists, "generated_chart_names": generated_chart_names}
-
-
-def code_execute(state: AgentState):
+    return {"code": code, "thinking": thinking, "attempts": 1, "charts_exists": charts_exists, "generated_chart_names": generated_chart_names,
+            "answer": None, "agent_error": None, "cache_key": None, "cache_hit": None, "trace": sandbox_trace}
+
+
+def candidate_check(sandbox, soln: GeneratorOutput) -> str | None:
+    if not STATIC_VALIDATION:
+        return None
+    errors = validate_code(soln.code, get_manifest().get(sandbox), soln.charts_exists, soln.generated_chart_names)
+    return validation_error(errors) if errors else None
+
+
+def speculative_code_gen(state: AgentState, thread_id: str) -> dict:
+    registry = get_registry()
+    handles = state.get("datasets") or []
+    outcome = get_speculation().run(thread_id, generator_messages(state),
+                                    prepare_sandbox=lambda sandbox: registry.ensure_uploaded(sandbox, handles),
+                                    check=candidate_check)
+    if outcome["soln"] is None and all(c["transient"] for c in outcome["report"]["candidates"]):
+        # Every candidate lost its sandbox or LLM call; retry the node rather than report a system error
+        raise TransientError(f"All {len(outcome['report']['candidates'])} speculative candidates failed: "
+                             f"{outcome['report']['candidates'][0]['error']}")
+    update = generator_update(outcome["soln"], {})
+    update["speculation"] = outcome["report"]
+    if outcome["resp"] is not None:
+        # Candidates already executed; record the winner's answer, or the first failure for the reflector
+        update.update(execution_update({**state, **update}, thread_id, outcome["sandbox"], outcome["resp"]))
+    return update
+
+
+def prefetch_manifest(sandbox) -> None:
+    # Fetched while the generator is thinking, so the first validation doesn't wait on the sandbox.
+    # Chained on startup rather than blocking a lifecycle worker until it finishes.
+    if STATIC_VALIDATION:
+        sandbox.start_async().add_done_callback(lambda _: background(get_manifest().get, sandbox))
+
+
+def code_gen(state: AgentState, config: RunnableConfig):
+    cached = cached_solution(state)
+    if cached:
+        return cached
+    if SPECULATIVE_K > 1:
+        return speculative_code_gen(state, thread_id_of(config))
+
+    sandbox = get_pool().lease(thread_id_of(config))
+    # Bring the sandbox up and upload data while the generator is thinking instead of before it
+    startup = sandbox.start_async()
+    uploading = background(get_registry().ensure_uploaded, sandbox, state.get("datasets") or [])
+    prefetch_manifest(sandbox)
+    t0 = time.perf_counter()
+    code_soln = cast(GeneratorOutput, get_models().generator.invoke(generator_messages(state)))
+    generator_ms = (time.perf_counter() - t0) * 1000
+    start_ms = startup.result()
+    uploading.result()
+    return generator_update(code_soln, startup_trace(sandbox, start_ms, generator_ms))
+
+
+def execution_precheck(state: AgentState) -> dict | None:
     if state.get("system_error"):
         return {"system_error": state.get("system_error")}
-    
-    code = state.get("code", "")
-    if not code:
+    if not state.get("code", ""):
          return {"system_error": "Code was empty."}
-    
-    code_resp = sandbox.process.code_run(code)
+    return None
+
+
+def record_avoided_installs(code: str) -> None:
+    # Ran first time while importing something a fresh sandbox once lacked: replay or the snapshot saved an install
+    fixes = get_env_fixes()
+    if fixes is not None:
+        avoided = imported_modules(code) & fixes.fixed_modules()
+        if avoided:
+            metrics.inc("env_fix_avoided", len(avoided))
+
+
+def execution_update(state: AgentState, thread_id: str, sandbox, code_resp) -> dict:
+    cache = get_code_cache()
+    first_attempt = state.get("attempts", 1) == 1
+    if first_attempt:
+        metrics.inc("first_attempts")
     if code_resp.exit_code == 0:
+        if first_attempt:
+            metrics.inc("first_attempt_success")
+            record_avoided_installs(state["code"])
         if state.get("charts_exists", False):
-            download_charts(state.get("generated_chart_names", []))
-        return {"answer": code_resp.result}
+            # Runs in the background; summarizer collects it after its LLM call
+            get_charts().start(thread_id, sandbox, state.get("generated_chart_names", []))
+        if not state.get("cache_hit"):
+            cache.put(state["question"], fingerprint_of(state), {
+                "thinking": state.get("thinking"),
+                "code": state["code"],
+                "charts_exists": state.get("charts_exists", False),
+                "generated_chart_names": state.get("generated_chart_names", []),
+            })
+        # Full result lives outside the history; follow-ups pull it back in by id
+        get_results().put(thread_id, state["question"], code_resp.result, state["code"])
+        return {"answer": code_resp.result, "result_refs": None}
+    else:
+        update = {"agent_error": f"Error: Code execution failed {code_resp.exit_code} {code_resp.result}"}
+        if state.get("cache_hit"):
+            # Cached code no longer works; drop it so the fixed version replaces it
+            cache.invalidate(state["cache_key"])
+            update.update({"cache_key": None, "cache_hit": None})
+        return update
+
+
+def validation_error(errors: list[str]) -> str:
+    return "Static validation failed before execution\n" + "\n".join(errors)
+
+
+def validation_update(state: AgentState, sandbox) -> dict:
+    # Empty/errored code falls through to code_execute, which reports it
+    if not STATIC_VALIDATION or execution_precheck(state):
+        return {"agent_error": None}
+    t0 = time.perf_counter()
+    modules = get_manifest().get(sandbox) if sandbox is not None else None
+    errors = validate_code(state["code"], modules, state.get("charts_exists", False), state.get("generated_chart_names"))
+    trace = {"validation_ms": round((time.perf_counter() - t0) * 1000, 1)}
+    if not errors:
+        return {"agent_error": None, "trace": trace}
+    metrics.inc("validation_failures")
+    if (state.get("attempts") or 1) == 1:
+        # A first attempt that never reached the sandbox still failed
+        metrics.inc("first_attempts")
+    # Same shape as an execution failure, so the reflector needs no special case
+    return {"agent_error": f"Error: {validation_error(errors)}", "trace": {**trace, f"validation_{state.get('attempts') or 1}": errors}}
+
+
+def validate(state: AgentState, config: RunnableConfig):
+    sandbox = get_pool().lease(thread_id_of(config)) if STATIC_VALIDATION else None
+    return validation_update(state, sandbox)
+
+
+def after_validate(state: AgentState):
+    return should_continue(state) if state.get("agent_error") else "code_execute"
+
+
+def output_writer(node: str):
+    # Sandbox output reaches `stream_mode="custom"` clients while the code is still running
+    writer = get_stream_writer()
+    return lambda stream, text: writer({"type": "output", "node": node, "stream": stream, "text": text})
+
+
+def code_execute(state: AgentState, config: RunnableConfig):
+    failed = execution_precheck(state)
+    if failed:
+        return failed
+    
+    code = state["code"]
+    thread_id = thread_id_of(config)
+    sandbox = get_pool().lease(thread_id)
+    get_registry().ensure_uploaded(sandbox, state.get("datasets") or [])
+    on_output = output_writer("code_execute")
+    if EXECUTION_MODE == "kernel":
+        code_resp = get_kernels().run(thread_id, sandbox, code, on_output)
+    else:
+        code_resp = stream_code_run(sandbox, code, on_output)
+    return execution_update(state, thread_id, sandbox, code_resp)
+
+
+
+def cmd_update(state: AgentState, cmd_resp) -> dict:
+    if cmd_resp.exit_code == 0:
+        fixes = get_env_fixes()
+        if fixes is not None:
+            # Installs that worked here are replayed on every sandbox provisioned from now on
+            fixes.record(state.get("cmd") or "", state.get("agent_error"))
+        return {"agent_error": None}
     else:
-        return {"agent_error": f"Error: Code execution failed {code_resp.exit_code} {code_resp.result}"}
+        return {"agent_error": f"Error: Cmd execution failed {cmd_resp.exit_code} {cmd_resp.result}"}
+
 
+def shared_environment_refusal(thread_id: str) -> dict | None:
+    # Local tiers run commands on the server host; an install there would change the server's own environment
+    if get_pool().shared_environment(thread_id):
+        return {"agent_error": "Error: Environment fixes can't run on this execution tier. "
+                               "Use only the packages that are already installed."}
+    return None
 
 
-def cmd_execute(state: AgentState):
+def cmd_execute(state: AgentState, config: RunnableConfig):
     cmd = state.get("cmd", "")
     if not cmd:
         return {"system_error": "Cmd was empty."} 
+    if refusal := shared_environment_refusal(thread_id_of(config)):
+        return refusal
+    sandbox = get_pool().lease(thread_id_of(config))
     cmd_resp = sandbox.process.exec(cmd)
+    # The fix may have installed packages
+    get_manifest().invalidate(sandbox)
+    return cmd_update(state, cmd_resp)
 
-    if cmd_resp.exit_code == 0:
-        return {"agent_error": None}
+
+def after_code_gen(state: AgentState):
+    # Only speculative generation executes code itself
+    if state.get("answer"):
+        return "summarizer"
+    elif state.get("agent_error"):
+        return should_continue(state)
     else:
-        return {"agent_error": f"Error: Cmd execution failed {cmd_resp.exit_code} {cmd_resp.result}"}
+        return "validate"
 
 
 def should_continue(state: AgentState):
@@ -92,24 +431,31 @@ def should_continue(state: AgentState):
         return "summarizer"
 
 
-def summarizer(state: AgentState):
+def summarizer_messages(state: AgentState, thread_id: str) -> list | None:
     answer = state.get("answer")  
-    agent_error = state.get("agent_error")
-    system_error = state.get("system_error")
+    refs = state.get("result_refs")
+    stored = get_results().get(thread_id, refs) if refs else []
+    if stored:
+        # Follow-up about earlier analyses: answer from the referenced results
+        return [Summarizer_PROMPT, format_results(stored), HumanMessage(content=state.get("question") or "")]
+    if not answer:
+        return None
     charts_exists = state.get("charts_exists", False)
     generated_chart_names = state.get("generated_chart_names", [])
     thinking = state.get("thinking", "No thinking provided.")
     code = state.get("code", "No code provided.")
-    
-    if answer:  
-        content = f"Analysis results:\n{answer}"
-        if charts_exists and generated_chart_names:
-            content += f"\n\nVisualizations created: {', '.join(generated_chart_names)}"
-        
-        summary = SUMMARIZER.invoke([Summarizer_PROMPT, AIMessage(content=thinking), AIMessage(content=code), HumanMessage(content=content)])
-        return {"messages": [summary]}
-    
-    elif system_error:
+
+    content = f"Analysis results:\n{answer}"
+    if charts_exists and generated_chart_names:
+        content += f"\n\nVisualizations created: {', '.join(generated_chart_names)}"
+    return [Summarizer_PROMPT, AIMessage(content=thinking), AIMessage(content=code), HumanMessage(content=content)]
+
+
+def fallback_summary(state: AgentState) -> dict:
+    agent_error = state.get("agent_error")
+    system_error = state.get("system_error")
+
+    if system_error:
         return {"messages": [AIMessage(content=f"System Failure: {system_error}")]}
     
     elif agent_error:
@@ -120,8 +466,30 @@ def summarizer(state: AgentState):
         return {"messages": [AIMessage(content="No result generated.")]}
 
 
+def finish_thread(thread_id: str, result: dict) -> dict:
+    # Charts were downloading while the summary was generated
+    result["charts"] = get_charts().collect(thread_id)
 
-def reflection(state: AgentState):
+    # The analysis is finished with the sandbox; hand it back for the next thread.
+    # Kernel sessions keep it for follow-ups unless another thread needs the slot first.
+    if EXECUTION_MODE == "kernel":
+        get_pool().park(thread_id)
+    else:
+        get_pool().release(thread_id)
+    return result
+
+
+def summarizer(state: AgentState, config: RunnableConfig):
+    msgs = summarizer_messages(state, thread_id_of(config))
+    if msgs:
+        result = {"messages": [get_models().summarizer.invoke(msgs)]}
+    else:
+        result = fallback_summary(state)
+    return finish_thread(thread_id_of(config), result)
+
+
+
+def reflector_messages(state: AgentState) -> list:
     code = state.get("code", "No code provided.")
     agent_error = state.get("agent_error", "No error reported.")
     thinking = state.get("thinking", "No thinking provided.")
@@ -132,56 +500,232 @@ def reflection(state: AgentState):
     else:
         human_input_str = (
             "Review the following code and error to reflect on the needed fix:\n\n"
-            f"--- Code ---\n{code}\n"
+            f"--- Code ---\n{number_lines(code) if PATCH_FIXES else code}\n"
             f"--- Agent Error ---\n{agent_error}\n"
             f"--- Thinking process of model who wrote the code ---\n{thinking}\n"
         )
-        
-    reflection = cast(ReflectorOutput, REFLECTOR.invoke(
-        [Reflector_PROMPT, HumanMessage(content=human_input_str)]
-    ))
+        if not PATCH_FIXES:
+            human_input_str += f"\n{REWRITE_REQUEST}"
+    return [Reflector_PROMPT, HumanMessage(content=human_input_str)]
+
+
+def parse_reflection(resp, t0: float) -> tuple[ReflectorOutput | None, dict]:
+    stats = {"ms": round((time.perf_counter() - t0) * 1000, 1), "output_tokens": None}
+    if isinstance(resp, dict):
+        # include_raw=True: usage comes from the raw message
+        usage = getattr(resp.get("raw"), "usage_metadata", None) or {}
+        stats["output_tokens"] = usage.get("output_tokens")
+        resp = resp.get("parsed")
+    if resp is not None and stats["output_tokens"] is None:
+        stats["output_tokens"] = count_tokens(resp.model_dump_json(exclude_none=True))
+    return resp, stats
+
+
+def fixed_code(state: AgentState, reflection: ReflectorOutput) -> tuple[str | None, str, str | None]:
+    # (code, how it was produced, why patching failed)
+    error = None
+    if (reflection.patches or reflection.diff) and state.get("code"):
+        try:
+            return apply_fix(state["code"], reflection.patches, reflection.diff), "patch", None
+        except PatchError as e:
+            error = str(e)
+    if reflection.code:
+        return reflection.code, "rewrite", error
+    return None, "failed", error or "No patches or code in the fix"
+
+
+def rewrite_request(state: AgentState, reflection: ReflectorOutput | None) -> HumanMessage | None:
+    # A CODE_FIX whose patches don't apply gets one more call asking for the whole script
+    if reflection is None or reflection.fix_type != "CODE_FIX":
+        return None
+    _, how, error = fixed_code(state, reflection)
+    if how != "failed":
+        return None
+    return HumanMessage(content=f"Your fix could not be applied: {error}. {REWRITE_REQUEST}")
+
+
+def reflection_trace(state: AgentState, code: str | None, how: str, stats: dict) -> dict:
+    entry = {"mode": how, **stats}
+    if how == "patch":
+        # What a full rewrite would have cost, at the decode rate this call achieved
+        rewrite_tokens = count_tokens(code)
+        saved = max(rewrite_tokens - (stats["output_tokens"] or 0), 0)
+        ms_per_token = (stats["ms"] or 0) / max(stats["output_tokens"] or 1, 1)
+        entry.update(rewrite_tokens_est=rewrite_tokens, tokens_saved=saved, ms_saved_est=round(saved * ms_per_token, 1))
+        metrics.inc("reflector_tokens_saved", saved)
+    metrics.inc("reflector_fixes", mode=how)
+    if stats["ms"] is not None:
+        metrics.observe("reflector_ms", stats["ms"], mode=how)
+    previous = (state.get("trace") or {}).get("reflector_tokens_saved", 0)
+    return {f"reflector_{state.get('attempts') or 1}": entry,
+            "reflector_tokens_saved": previous + entry.get("tokens_saved", 0)}
+
+
+def reflection_update(state: AgentState, reflection: ReflectorOutput | None, stats: dict | None = None) -> dict:
     if reflection is None:
         return {"system_error": "Reflector LLM failed to generate response. Aborting."}
 
-    reflection = reflection.model_dump()  
-    fix_type = reflection.get("fix_type")
+    fix_type = reflection.fix_type
     cmd = None
     new_code = None
+    how = "cmd"
     if fix_type == "ENVIRONMENT_FIX":
-        cmd = reflection.get("cmd")
+        cmd = reflection.cmd
     else:
         # Default to CODE_FIX
-        new_code = reflection.get("code")
+        new_code, how, _ = fixed_code(state, reflection)
 
     return {
-        "reflection": reflection, 
+        "reflection": reflection.model_dump(), 
         "attempts": state.get("attempts", 0) + 1, 
         "fix_type": fix_type, 
         "code": new_code if new_code else state.get("code"),
-        "cmd": cmd
+        "cmd": cmd,
+        "trace": reflection_trace(state, new_code, how, stats or {"ms": None, "output_tokens": None}),
     }
 
-def router(state: AgentState):
-        if state.get("fix_type") == "ENVIRONMENT_FIX":
-            return "cmd_execute"
-        else:
-            return "code_execute"
-
 
-graph = StateGraph(AgentState)
-graph.add_node("manager_cmd", manager_cmd)
-graph.add_node("code_gen", code_gen)
-graph.add_node("code_execute", code_execute)
-graph.add_node("summarizer", summarizer)
-graph.add_node("reflector", reflection)
-graph.add_node("cmd_execute", cmd_execute)
+def reflector_for(state: AgentState) -> tuple:
+    # Later fix attempts can go to a stronger model ([[roles.reflector.escalate]] in models.toml)
+    models = get_models()
+    model, escalated = models.reflector, None
+    for from_attempt, name, tier in models.reflector_tiers:
+        if (state.get("attempts") or 1) >= from_attempt:
+            model, escalated = tier, name
+    if escalated:
+        metrics.inc("reflector_escalations", model=escalated)
+    return model, escalated
 
 
-graph.add_edge(START, "manager_cmd")
-graph.add_edge("code_gen", "code_execute")
-graph.add_conditional_edges("code_execute", should_continue, ["summarizer", "reflector"])
-graph.add_conditional_edges("reflector", router, ["cmd_execute", "code_execute"])
-graph.add_edge("cmd_execute", "code_execute")
-graph.add_edge("summarizer", END)
+def reflection(state: AgentState):
+    msgs = reflector_messages(state)
+    model, escalated = reflector_for(state)
+    t0 = time.perf_counter()
+    reflection, stats = parse_reflection(model.invoke(msgs), t0)
+    retry = rewrite_request(state, reflection)
+    if retry is not None:
+        t0 = time.perf_counter()
+        reflection, retry_stats = parse_reflection(model.invoke(msgs + [retry]), t0)
+        stats = {"ms": stats["ms"] + retry_stats["ms"],
+                 "output_tokens": (stats["output_tokens"] or 0) + (retry_stats["output_tokens"] or 0), "patch_failed": True}
+    return reflection_update(state, reflection, {**stats, "escalated_to": escalated} if escalated else stats)
 
-app = graph.compile()
\ No newline at end of file
+def router(state: AgentState):
+        if state.get("fix_type") == "ENVIRONMENT_FIX":
+            return "cmd_execute"
+        else:
+            return "validate"
+
+
+def with_progress(name: str, fn):
+    # Emits a "progress" custom stream event as the graph enters and leaves each node
+    takes_config = "config" in inspect.signature(fn).parameters
+
+    def emit(writer, status, t0, **extra):
+        writer({"type": "progress", "node": name, "status": status,
+                "ms": round((time.perf_counter() - t0) * 1000, 1), **extra})
+
+    if inspect.iscoroutinefunction(fn):
+        async def node(state: AgentState, config: RunnableConfig):
+            writer, t0 = get_stream_writer(), time.perf_counter()
+            emit(writer, "start", t0)
+            try:
+                result = await (fn(state, config) if takes_config else fn(state))
+            except Exception as e:
+                emit(writer, "error", t0, error=f"{type(e).__name__}: {e}")
+                raise
+            emit(writer, "end", t0)
+            return result
+    else:
+        def node(state: AgentState, config: RunnableConfig):
+            writer, t0 = get_stream_writer(), time.perf_counter()
+            emit(writer, "start", t0)
+            try:
+                result = fn(state, config) if takes_config else fn(state)
+            except Exception as e:
+                emit(writer, "error", t0, error=f"{type(e).__name__}: {e}")
+                raise
+            emit(writer, "end", t0)
+            return result
+
+    # Keep the Command[Literal[...]] return hint; the graph reads its destinations from it
+    if "return" in getattr(fn, "__annotations__", {}):
+        node.__annotations__["return"] = fn.__annotations__["return"]
+    node.__name__ = fn.__name__
+    return node
+
+
+def build_graph(nodes: dict, retry=RETRY_POLICY) -> StateGraph:
+    graph = StateGraph(AgentState)
+    for name in ("manager_cmd", "ingest", "code_gen", "validate", "code_execute", "summarizer", "reflector", "cmd_execute"):
+        graph.add_node(name, traced_node(name, with_progress(name, nodes[name]), entry=name == "manager_cmd"),
+                       retry_policy=retry)
+
+
+    graph.add_edge(START, "manager_cmd")
+    graph.add_edge("ingest", "code_gen")
+    graph.add_conditional_edges("code_gen", after_code_gen, ["validate", "summarizer", "reflector"])
+    graph.add_conditional_edges("validate", after_validate, ["code_execute", "summarizer", "reflector"])
+    graph.add_conditional_edges("code_execute", should_continue, ["summarizer", "reflector"])
+    graph.add_conditional_edges("reflector", router, ["cmd_execute", "validate"])
+    graph.add_edge("cmd_execute", "validate")
+    graph.add_edge("summarizer", END)
+    return graph
+
+
+NODES = {
+    "manager_cmd": manager_cmd,
+    "ingest": ingest_datasets,
+    "code_gen": code_gen,
+    "validate": validate,
+    "code_execute": code_execute,
+    "summarizer": summarizer,
+    "reflector": reflection,
+    "cmd_execute": cmd_execute,
+}
+
+graph = build_graph(NODES)
+
+
+class _ThreadedApp:
+    """The compiled graph, but a call without a thread_id gets its own throwaway thread
+    (the checkpointer needs one), so config-less invoke/stream behave as they did before."""
+
+    def __init__(self, compiled):
+        self._compiled = compiled
+
+    def __getattr__(self, name):
+        return getattr(self._compiled, name)
+
+    def _config(self, config):
+        config = config or {}
+        configurable = config.get("configurable", {})
+        if configurable.get("thread_id") or self._compiled.checkpointer is None:
+            return config
+        return {**config, "configurable": {**configurable, "thread_id": f"run-{uuid.uuid4().hex}"}}
+
+    def invoke(self, input, config=None, **kwargs):
+        return self._compiled.invoke(input, self._config(config), **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        return self._compiled.stream(input, self._config(config), **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self._compiled.ainvoke(input, self._config(config), **kwargs)
+
+    def astream(self, input, config=None, **kwargs):
+        return self._compiled.astream(input, self._config(config), **kwargs)
+
+
+def __getattr__(name: str):
+    # Every completed node is checkpointed (CHECKPOINTER, sqlite by default); a run that
+    # still fails after node retries resumes from there with app.invoke(None, config).
+    # `app` is compiled on first access so importing agent doesn't open the store.
+    if name == "app":
+        globals()["app"] = app = _ThreadedApp(graph.compile(checkpointer=get_checkpointer()))
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# A forked worker opens its own store (resources drops the parent's)
+os.register_at_fork(after_in_child=lambda: globals().pop("app", None))
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Literal, cast
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Command
+
+from agent import (EXECUTION_MODE, SPECULATIVE_K, STATIC_VALIDATION, build_graph, cached_solution, cmd_update, execution_precheck,
+                   execution_update, fallback_summary, fast_route, finish_thread, generator_messages, generator_update,
+                   ingest_datasets, manager_messages, parse_reflection, record_route, reflection_update, reflector_for, reflector_messages,
+                   output_writer, prefetch_manifest, register_inline_data, rewrite_request, route_manager, routing_input, shared_environment_refusal,
+                   speculative_code_gen, startup_trace, summarizer_messages, thread_id_of, validation_update)
+from streaming import astream_code_run
+from resources import get_kernels, get_manifest, get_models, get_pool, get_registry
+from schema import AgentState, GeneratorOutput, ManagerOutput
+
+# Same graph as agent.app, but every LLM and sandbox round-trip is awaited, so
+# a server worker doesn't hold a thread per in-flight request. Pool, registry
+# and cache calls are local or short and run in the default executor.
+
+
+async def manager_cmd(state: AgentState, config: RunnableConfig) -> Command[Literal["ingest", "summarizer", "__end__"]]:
+    thread_id = thread_id_of(config)
+    update = await asyncio.to_thread(register_inline_data, state)
+    inputs = await asyncio.to_thread(routing_input, state, update, thread_id)
+    resp, trace = await asyncio.to_thread(fast_route, inputs)
+    if resp is None:
+        update, msgs = await asyncio.to_thread(manager_messages, state, thread_id, update)
+        t0 = time.perf_counter()
+        resp = cast(ManagerOutput, await get_models().manager.ainvoke(msgs))
+        trace = await asyncio.to_thread(record_route, inputs, resp, round((time.perf_counter() - t0) * 1000, 1), trace)
+    return route_manager(resp, {**update, "trace": trace})
+
+
+async def ingest(state: AgentState, config: RunnableConfig):
+    return await asyncio.to_thread(ingest_datasets, state, config)
+
+
+async def code_gen(state: AgentState, config: RunnableConfig):
+    cached = await asyncio.to_thread(cached_solution, state)
+    if cached:
+        return cached
+
+    thread_id = thread_id_of(config)
+    if SPECULATIVE_K > 1:
+        return await asyncio.to_thread(speculative_code_gen, state, thread_id)
+    sandbox = await asyncio.to_thread(get_pool().lease, thread_id)
+    startup = asyncio.ensure_future(sandbox.aensure_started())
+    uploading = asyncio.ensure_future(asyncio.to_thread(get_registry().ensure_uploaded, sandbox, state.get("datasets") or []))
+    prefetch_manifest(sandbox)
+    t0 = time.perf_counter()
+    code_soln = cast(GeneratorOutput, await get_models().generator.ainvoke(generator_messages(state)))
+    generator_ms = (time.perf_counter() - t0) * 1000
+    start_ms, _ = await asyncio.gather(startup, uploading)
+    return generator_update(code_soln, startup_trace(sandbox, start_ms, generator_ms))
+
+
+async def code_execute(state: AgentState, config: RunnableConfig):
+    failed = execution_precheck(state)
+    if failed:
+        return failed
+
+    thread_id = thread_id_of(config)
+    sandbox = await asyncio.to_thread(get_pool().lease, thread_id)
+    await asyncio.to_thread(get_registry().ensure_uploaded, sandbox, state.get("datasets") or [])
+    on_output = output_writer("code_execute")
+    if EXECUTION_MODE == "kernel":
+        code_resp = await asyncio.to_thread(get_kernels().run, thread_id, sandbox, state["code"], on_output)
+    else:
+        code_resp = await astream_code_run(sandbox, state["code"], on_output)
+    return await asyncio.to_thread(execution_update, state, thread_id, sandbox, code_resp)
+
+
+async def cmd_execute(state: AgentState, config: RunnableConfig):
+    cmd = state.get("cmd", "")
+    if not cmd:
+        return {"system_error": "Cmd was empty."}
+    if refusal := shared_environment_refusal(thread_id_of(config)):
+        return refusal
+    sandbox = await asyncio.to_thread(get_pool().lease, thread_id_of(config))
+    cmd_resp = await sandbox.aexec(cmd)
+    get_manifest().invalidate(sandbox)
+    return await asyncio.to_thread(cmd_update, state, cmd_resp)
+
+
+async def validate(state: AgentState, config: RunnableConfig):
+    # Only the first check on a sandbox leaves the process, to fetch its import manifest
+    sandbox = await asyncio.to_thread(get_pool().lease, thread_id_of(config)) if STATIC_VALIDATION else None
+    return await asyncio.to_thread(validation_update, state, sandbox)
+
+
+async def summarizer(state: AgentState, config: RunnableConfig):
+    msgs = await asyncio.to_thread(summarizer_messages, state, thread_id_of(config))
+    if msgs:
+        result = {"messages": [await get_models().summarizer.ainvoke(msgs)]}
+    else:
+        result = fallback_summary(state)
+    return await asyncio.to_thread(finish_thread, thread_id_of(config), result)
+
+
+async def reflection(state: AgentState):
+    msgs = reflector_messages(state)
+    model, escalated = reflector_for(state)
+    t0 = time.perf_counter()
+    reflection, stats = parse_reflection(await model.ainvoke(msgs), t0)
+    retry = rewrite_request(state, reflection)
+    if retry is not None:
+        t0 = time.perf_counter()
+        reflection, retry_stats = parse_reflection(await model.ainvoke(msgs + [retry]), t0)
+        stats = {"ms": stats["ms"] + retry_stats["ms"],
+                 "output_tokens": (stats["output_tokens"] or 0) + (retry_stats["output_tokens"] or 0), "patch_failed": True}
+    return reflection_update(state, reflection, {**stats, "escalated_to": escalated} if escalated else stats)
+
+
+NODES = {
+    "manager_cmd": manager_cmd,
+    "ingest": ingest,
+    "code_gen": code_gen,
+    "validate": validate,
+    "code_execute": code_execute,
+    "summarizer": summarizer,
+    "reflector": reflection,
+    "cmd_execute": cmd_execute,
+}
+
+graph = build_graph(NODES)
+
+# Async checkpointers are bound to an event loop, so this one runs without; callers
+# that need resumable runs compile `graph` with recovery.open_async_checkpointer()
+app = graph.compile()
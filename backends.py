@@ -0,0 +1,705 @@
+import asyncio
+import inspect
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import queue
+import threading
+import uuid
+from dataclasses import dataclass
+
+
+@dataclass
+class ExecResult:
+    exit_code: int
+    result: str
+
+
+# Installed into images this code builds (Modal image, baked Daytona snapshots)
+BASE_PACKAGES = ("pandas", "numpy", "matplotlib", "seaborn", "pyarrow")
+
+
+class SandboxBackend:
+    name = "base"
+    # True when every sandbox shares one Python environment, so installs never need replaying
+    shared_environment = False
+    # False when sandboxes have no code_interpreter, so EXECUTION_MODE=kernel can't run on them
+    kernel_mode = True
+
+    def create(self, name: str):
+        raise NotImplementedError
+
+    def destroy(self, sandbox) -> None:
+        raise NotImplementedError
+
+    def is_healthy(self, sandbox) -> bool:
+        raise NotImplementedError
+
+    def reset(self, sandbox) -> None:
+        # Clear per-analysis artifacts before the sandbox goes back to the pool
+        sandbox.process.exec("rm -rf charts && mkdir -p charts")
+
+
+class DaytonaBackend(SandboxBackend):
+    name = "daytona"
+
+    def __init__(self, snapshot: str | None = None, labels: dict | None = None):
+        self.snapshot = snapshot or os.getenv("DAYTONA_SNAPSHOT") or None
+        self.labels = labels or {"pool": "CodeStore"}
+        self._default_snapshot = None  # what Daytona starts sandboxes from when none is given
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from daytona import Daytona
+            self._client = Daytona()
+        return self._client
+
+    def create(self, name: str):
+        from daytona import CreateSandboxFromSnapshotParams, CodeLanguage
+        # auto_stop_interval=0: the local lifecycle manager owns stop/archive transitions
+        params = CreateSandboxFromSnapshotParams(name=name, language=CodeLanguage.PYTHON,
+                                                 labels=self.labels, snapshot=self.snapshot,
+                                                 auto_stop_interval=0)
+        sandbox = self.client.create(params=params)
+        if self.snapshot is None:
+            self._default_snapshot = getattr(sandbox, "snapshot", None)
+        sandbox.process.exec("mkdir -p charts")
+        return sandbox
+
+    def _base_image(self) -> str:
+        # Bake on top of whatever new sandboxes run now, so nothing preinstalled there goes
+        # missing and the Python version stays the same
+        current = self.snapshot or self._default_snapshot
+        if current is None:
+            raise RuntimeError("No base snapshot known yet; set DAYTONA_SNAPSHOT or create a sandbox first")
+        info = self.client.snapshot.get(current)
+        return info.image_name or info.ref
+
+    def bake_snapshot(self, name: str, packages: list[str]) -> str:
+        from daytona import CreateSnapshotParams, Image
+        image = Image.base(self._base_image()).pip_install(list(BASE_PACKAGES) + list(packages))
+        self.client.snapshot.create(CreateSnapshotParams(name=name, image=image), timeout=0)
+        previous, self.snapshot = self.snapshot, name
+        if previous and previous.startswith("analyst-env-"):
+            # Sandboxes already running keep working; only new ones use the new snapshot
+            try:
+                self.client.snapshot.delete(self.client.snapshot.get(previous))
+            except Exception as e:
+                print(f"Failed to delete snapshot {previous}: {e}")
+        return name
+
+    async def async_handle(self, sandbox):
+        from daytona import AsyncDaytona
+        if self._async_client is None:
+            self._async_client = AsyncDaytona()
+        return await self._async_client.get(sandbox.id)
+
+    def destroy(self, sandbox) -> None:
+        sandbox.delete()
+
+    def is_healthy(self, sandbox) -> bool:
+        from daytona import SandboxState
+        try:
+            sandbox.refresh_data()
+        except Exception:
+            return False
+        return sandbox.state in (SandboxState.STARTED, SandboxState.STOPPED, SandboxState.ARCHIVED)
+
+
+# Local stand-in for a remote sandbox: same `process`/`fs` surface as a Daytona
+# sandbox, backed by a temp directory and subprocesses. Not an isolation boundary.
+@dataclass
+class SessionExecuteResponse:
+    cmd_id: str
+    output: str | None = None
+    exit_code: int | None = None
+
+
+@dataclass
+class SessionCommand:
+    id: str
+    command: str
+    exit_code: int | None = None
+
+
+def _local_env(env: dict | None = None) -> dict:
+    # `python3` in shell commands resolves to this interpreter, as it would to the sandbox's own
+    path = os.path.dirname(sys.executable) + os.pathsep + os.environ.get("PATH", "")
+    return {**os.environ, "PATH": path, "MPLBACKEND": "Agg", **(env or {})}
+
+
+def _rlimits(memory_mb: int, cpu_seconds: int):
+    # Runs in the child between fork and exec
+    def apply():
+        import resource
+        if memory_mb:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_mb << 20, memory_mb << 20))
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    return apply
+
+
+class _LocalProcess:
+    def __init__(self, root: str, memory_mb: int = 0, cpu_seconds: int = 0, timeout: int | None = None):
+        self.root = root
+        self._limits = _rlimits(memory_mb, cpu_seconds) if memory_mb or cpu_seconds else None
+        self._timeout = timeout
+        self._sessions: dict[str, dict[str, subprocess.Popen]] = {}
+
+    def code_run(self, code: str, params=None, timeout: int | None = None) -> ExecResult:
+        script = os.path.join(self.root, f".run_{uuid.uuid4().hex}.py")
+        with open(script, "w") as f:
+            f.write(code)
+        try:
+            return self._run([sys.executable, script], timeout=timeout)
+        finally:
+            os.remove(script)
+
+    def exec(self, command: str, cwd: str | None = None, env: dict | None = None, timeout: int | None = None) -> ExecResult:
+        return self._run(command, cwd=cwd, env=env, timeout=timeout, shell=True)
+
+    def _run(self, args, cwd=None, env=None, timeout=None, shell=False) -> ExecResult:
+        timeout = timeout or self._timeout
+        try:
+            proc = subprocess.run(args, cwd=os.path.join(self.root, cwd or ""), shell=shell,
+                                  env=_local_env(env), preexec_fn=self._limits,
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            return ExecResult(exit_code=-1, result=f"Timed out after {timeout}s\n{e.output or ''}")
+        return ExecResult(exit_code=proc.returncode, result=proc.stdout)
+
+    # Session API, mirroring Daytona's: commands run in the background and their
+    # logs can be followed while they run
+    def create_session(self, session_id: str, request_timeout: float | None = None) -> None:
+        self._sessions[session_id] = {}
+
+    def execute_session_command(self, session_id: str, req, timeout: int | None = None) -> SessionExecuteResponse:
+        proc = subprocess.Popen(req.command, shell=True, cwd=self.root, env=_local_env(),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        cmd_id = uuid.uuid4().hex
+        self._sessions[session_id][cmd_id] = proc
+        if req.run_async:
+            return SessionExecuteResponse(cmd_id=cmd_id)
+        out, err = proc.communicate(timeout=timeout)
+        return SessionExecuteResponse(cmd_id=cmd_id, output=(out + err).decode(errors="replace"), exit_code=proc.returncode)
+
+    async def get_session_command_logs_async(self, session_id: str, command_id: str, on_stdout, on_stderr) -> None:
+        proc = self._sessions[session_id][command_id]
+
+        async def pump(stream, handler):
+            while chunk := await asyncio.to_thread(stream.read1, 4096):
+                result = handler(chunk.decode(errors="replace"))
+                if inspect.isawaitable(result):
+                    await result
+
+        await asyncio.gather(pump(proc.stdout, on_stdout), pump(proc.stderr, on_stderr))
+        await asyncio.to_thread(proc.wait)
+
+    def get_session_command(self, session_id: str, command_id: str, request_timeout: float | None = None) -> SessionCommand:
+        proc = self._sessions[session_id][command_id]
+        return SessionCommand(id=command_id, command=str(proc.args), exit_code=proc.poll())
+
+    def delete_session(self, session_id: str, request_timeout: float | None = None) -> None:
+        for proc in self._sessions.pop(session_id, {}).values():
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
+class _LocalFileSystem:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+    def upload_file(self, src: str | bytes, dst: str, timeout: int = 1800) -> None:
+        os.makedirs(os.path.dirname(self._path(dst)) or self.root, exist_ok=True)
+        if isinstance(src, bytes):
+            with open(self._path(dst), "wb") as f:
+                f.write(src)
+        else:
+            shutil.copyfile(src, self._path(dst))
+
+    def download_file(self, remote_path: str, local_path: str | None = None) -> bytes | None:
+        if local_path is not None:
+            shutil.copyfile(self._path(remote_path), local_path)
+            return None
+        with open(self._path(remote_path), "rb") as f:
+            return f.read()
+
+
+@dataclass
+class InterpreterError:
+    name: str
+    value: str
+    traceback: str = ""
+
+
+@dataclass
+class InterpreterResult:
+    stdout: str = ""
+    stderr: str = ""
+    error: InterpreterError | None = None
+
+
+_INTERPRETER_DRIVER = r"""
+import contextlib, io, json, sys, traceback
+reply = sys.stdout
+ns = {"__name__": "__main__"}
+for line in sys.stdin:
+    out, err, error = io.StringIO(), io.StringIO(), None
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            exec(compile(json.loads(line), "<cell>", "exec"), ns)
+        except BaseException as e:
+            error = {"name": type(e).__name__, "value": str(e), "traceback": traceback.format_exc()}
+    reply.write(json.dumps({"stdout": out.getvalue(), "stderr": err.getvalue(), "error": error}) + "\n")
+    reply.flush()
+"""
+
+
+class _LocalContext:
+    def __init__(self, root: str):
+        self.id = uuid.uuid4().hex
+        self.proc = subprocess.Popen([sys.executable, "-u", "-c", _INTERPRETER_DRIVER], cwd=root,
+                                     env={**os.environ, "MPLBACKEND": "Agg"},
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+
+# Stand-in for the Daytona code interpreter: one long-lived Python process per context
+class _LocalInterpreter:
+    def __init__(self, root: str):
+        self.root = root
+
+    def create_context(self, cwd: str | None = None, request_timeout: float | None = None) -> _LocalContext:
+        return _LocalContext(os.path.join(self.root, cwd or ""))
+
+    def delete_context(self, context: _LocalContext) -> None:
+        context.proc.kill()
+        context.proc.wait()
+
+    def run_code(self, code: str, *, context: _LocalContext, timeout: int | None = None, **_) -> InterpreterResult:
+        if context.proc.poll() is not None:
+            return InterpreterResult(error=InterpreterError("KernelDied", f"exit code {context.proc.returncode}"))
+        context.proc.stdin.write(json.dumps(code) + "\n")
+        context.proc.stdin.flush()
+        reply = []
+        reader = threading.Thread(target=lambda: reply.append(context.proc.stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(timeout)
+        if not reply or not reply[0]:
+            self.delete_context(context)
+            return InterpreterResult(error=InterpreterError("TimeoutError", f"Cell did not finish within {timeout}s"))
+        data = json.loads(reply[0])
+        error = InterpreterError(**data["error"]) if data["error"] else None
+        return InterpreterResult(stdout=data["stdout"], stderr=data["stderr"], error=error)
+
+
+class LocalSandbox:
+    def __init__(self, name: str, root: str):
+        self.id = f"local-{uuid.uuid4().hex[:12]}"
+        self.name = name
+        self.root = root
+        self.state = "started"
+        self.process = _LocalProcess(root)
+        self.fs = _LocalFileSystem(root)
+        self.code_interpreter = _LocalInterpreter(root)
+
+    def start(self, timeout: float | None = 60):
+        self.state = "started"
+
+    def stop(self, timeout: float | None = 60):
+        self.state = "stopped"
+
+
+class SubprocessBackend(SandboxBackend):
+    name = "local"
+    shared_environment = True
+
+    def create(self, name: str):
+        sandbox = LocalSandbox(name, tempfile.mkdtemp(prefix=f"{name}-"))
+        os.makedirs(os.path.join(sandbox.root, "charts"), exist_ok=True)
+        return sandbox
+
+    def destroy(self, sandbox) -> None:
+        shutil.rmtree(sandbox.root, ignore_errors=True)
+
+    def is_healthy(self, sandbox) -> bool:
+        return os.path.isdir(sandbox.root)
+
+
+# Process-pool stand-in: warm driver processes with pandas/matplotlib already
+# imported fork a fresh child per job, so a run costs a fork instead of an
+# interpreter start and leaves no state behind. Each child gets rlimits, a
+# wall-clock timeout and the sandbox's temp directory as its working directory.
+# Meant for small or trusted jobs; not an isolation boundary.
+_POOL_DRIVER = r"""
+import json, os, resource, select, signal, sys, time
+memory_mb, preload = int(sys.argv[1]), [m for m in sys.argv[2].split(",") if m]
+os.environ["MPLBACKEND"] = "Agg"
+for module in preload:
+    try:
+        __import__(module)
+    except ImportError:
+        pass
+reply = os.fdopen(os.dup(1), "w")
+for line in sys.stdin:
+    job = json.loads(line)
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        os.dup2(w, 1)
+        os.dup2(w, 2)
+        code = 0
+        try:
+            os.chdir(job["cwd"])
+            if memory_mb:
+                resource.setrlimit(resource.RLIMIT_AS, (memory_mb << 20, memory_mb << 20))
+            if job["cpu"]:
+                resource.setrlimit(resource.RLIMIT_CPU, (job["cpu"], job["cpu"] + 1))
+            exec(compile(job["code"], "<analysis>", "exec"), {"__name__": "__main__"})
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except BaseException as e:
+            import traceback
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    os.close(w)
+    chunks, deadline, timed_out = [], time.monotonic() + job["timeout"], False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            os.kill(pid, signal.SIGKILL)
+            timed_out = True
+            break
+        if select.select([r], [], [], remaining)[0]:
+            chunk = os.read(r, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    os.close(r)
+    _, status = os.waitpid(pid, 0)
+    output = b"".join(chunks).decode(errors="replace")
+    if timed_out:
+        output += f"\nTimed out after {job['timeout']}s"
+    reply.write(json.dumps({"exit_code": -1 if timed_out else os.waitstatus_to_exitcode(status), "output": output}) + "\n")
+    reply.flush()
+"""
+
+
+class _PoolWorker:
+    def __init__(self, memory_mb: int, preload: str):
+        self.proc = subprocess.Popen([sys.executable, "-u", "-c", _POOL_DRIVER, str(memory_mb), preload],
+                                     env=_local_env(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    def run(self, job: dict) -> dict | None:
+        try:
+            self.proc.stdin.write(json.dumps(job) + "\n")
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline()
+        except (BrokenPipeError, OSError):
+            return None
+        return json.loads(line) if line else None
+
+    def close(self) -> None:
+        self.proc.kill()
+        self.proc.wait()
+
+
+class _PooledProcess:
+    def __init__(self, root: str, backend: "ProcessPoolBackend"):
+        self.root = root
+        self.backend = backend
+        # Shell commands get the same limits as the forked runs
+        self._shell = _LocalProcess(root, backend.memory_mb, backend.cpu_seconds, backend.timeout)
+
+    def code_run(self, code: str, params=None, timeout: int | None = None) -> ExecResult:
+        return self.backend.run(code, self.root, timeout)
+
+    def exec(self, command: str, cwd: str | None = None, env: dict | None = None, timeout: int | None = None) -> ExecResult:
+        return self._shell.exec(command, cwd=cwd, env=env, timeout=timeout)
+
+
+class ProcessPoolBackend(SandboxBackend):
+    name = "procpool"
+    shared_environment = True
+
+    def __init__(self, workers: int | None = None, memory_mb: int | None = None, cpu_seconds: int | None = None,
+                 timeout: int | None = None, preload: str | None = None):
+        self.workers = workers or int(os.getenv("PROCPOOL_WORKERS", "0")) or os.cpu_count() or 1
+        self.memory_mb = memory_mb if memory_mb is not None else int(os.getenv("PROCPOOL_MEMORY_MB", "2048"))
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else int(os.getenv("PROCPOOL_CPU_SECONDS", "60"))
+        self.timeout = timeout or int(os.getenv("PROCPOOL_TIMEOUT", "120"))
+        self.preload = preload if preload is not None else os.getenv("PROCPOOL_PRELOAD", "pandas,numpy,matplotlib.pyplot")
+        self._idle: queue.Queue[_PoolWorker] = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> _PoolWorker:
+        with self._lock:
+            if self._idle.empty() and self._started < self.workers:
+                self._started += 1
+                return _PoolWorker(self.memory_mb, self.preload)
+        return self._idle.get()
+
+    def warm(self) -> None:
+        # Start the remaining drivers and wait until their imports are done
+        with self._lock:
+            workers = [_PoolWorker(self.memory_mb, self.preload) for _ in range(self.workers - self._started)]
+            self._started = self.workers
+        for worker in workers:
+            worker.run({"code": "", "cwd": tempfile.gettempdir(), "cpu": 0, "timeout": 60})
+            self._idle.put(worker)
+
+    def run(self, code: str, cwd: str, timeout: int | None = None) -> ExecResult:
+        worker = self._acquire()
+        reply = worker.run({"code": code, "cwd": cwd, "cpu": self.cpu_seconds, "timeout": timeout or self.timeout})
+        if reply is None:
+            # The driver itself died; replace it
+            worker.close()
+            worker = _PoolWorker(self.memory_mb, self.preload)
+            self._idle.put(worker)
+            return ExecResult(exit_code=-1, result="Execution worker died")
+        self._idle.put(worker)
+        return ExecResult(exit_code=reply["exit_code"], result=reply["output"])
+
+    def create(self, name: str):
+        sandbox = LocalSandbox(name, tempfile.mkdtemp(prefix=f"{name}-"))
+        sandbox.process = _PooledProcess(sandbox.root, self)
+        os.makedirs(os.path.join(sandbox.root, "charts"), exist_ok=True)
+        return sandbox
+
+    def destroy(self, sandbox) -> None:
+        shutil.rmtree(sandbox.root, ignore_errors=True)
+
+    def is_healthy(self, sandbox) -> bool:
+        return os.path.isdir(sandbox.root)
+
+
+@dataclass
+class OutputChunk:
+    output: str
+
+
+# E2B: commands run through the sandbox's shell, kernel mode maps onto code contexts
+class _E2BProcess:
+    def __init__(self, sbx, root: str):
+        self.sbx = sbx
+        self.root = root
+
+    def code_run(self, code: str, params=None, timeout: int | None = None) -> ExecResult:
+        script = f"{self.root}/.run_{uuid.uuid4().hex}.py"
+        self.sbx.files.write(script, code)
+        return self.exec(f"python3 {script}; code=$?; rm -f {script}; exit $code", timeout=timeout)
+
+    def exec(self, command: str, cwd: str | None = None, env: dict | None = None, timeout: int | None = None) -> ExecResult:
+        from e2b import CommandExitException
+        try:
+            result = self.sbx.commands.run(command, cwd=f"{self.root}/{cwd or ''}", envs=env, timeout=timeout or 600)
+        except CommandExitException as e:
+            return ExecResult(exit_code=e.exit_code, result=e.stdout + e.stderr)
+        return ExecResult(exit_code=result.exit_code, result=result.stdout + result.stderr)
+
+
+class _E2BFileSystem:
+    def __init__(self, sbx, root: str):
+        self.sbx = sbx
+        self.root = root
+
+    def upload_file(self, src: str | bytes, dst: str, timeout: int = 1800) -> None:
+        if not isinstance(src, bytes):
+            with open(src, "rb") as f:
+                src = f.read()
+        self.sbx.files.write(f"{self.root}/{dst}", src)
+
+    def download_file(self, remote_path: str, local_path: str | None = None) -> bytes | None:
+        data = bytes(self.sbx.files.read(f"{self.root}/{remote_path}", format="bytes"))
+        if local_path is None:
+            return data
+        with open(local_path, "wb") as f:
+            f.write(data)
+        return None
+
+
+class _E2BInterpreter:
+    def __init__(self, sbx, root: str):
+        self.sbx = sbx
+        self.root = root
+
+    def create_context(self, cwd: str | None = None, request_timeout: float | None = None):
+        return self.sbx.create_code_context(cwd=f"{self.root}/{cwd or ''}")
+
+    def delete_context(self, context) -> None:
+        self.sbx.remove_code_context(context)
+
+    def run_code(self, code: str, *, context, timeout: int | None = None, on_stdout=None, on_stderr=None,
+                 **_) -> InterpreterResult:
+        def relay(handler):
+            return (lambda msg: handler(OutputChunk(msg.line))) if handler else None
+
+        execution = self.sbx.run_code(code, context=context, timeout=timeout,
+                                      on_stdout=relay(on_stdout), on_stderr=relay(on_stderr))
+        error = execution.error
+        return InterpreterResult(stdout="".join(execution.logs.stdout), stderr="".join(execution.logs.stderr),
+                                 error=InterpreterError(error.name, error.value, error.traceback) if error else None)
+
+
+class E2BSandbox:
+    def __init__(self, name: str, sbx, root: str, keepalive: int):
+        self.id = sbx.sandbox_id
+        self.name = name
+        self.sbx = sbx
+        self.state = "started"
+        self.keepalive = keepalive
+        self.process = _E2BProcess(sbx, root)
+        self.fs = _E2BFileSystem(sbx, root)
+        self.code_interpreter = _E2BInterpreter(sbx, root)
+
+    def start(self, timeout: float | None = 60):
+        # E2B sandboxes die at their timeout; every start pushes it out again
+        self.sbx.set_timeout(self.keepalive)
+        self.state = "started"
+
+    def stop(self, timeout: float | None = 60):
+        self.state = "stopped"
+
+
+class E2BBackend(SandboxBackend):
+    name = "e2b"
+    root = "/home/user"
+
+    def __init__(self, template: str | None = None, keepalive: int | None = None):
+        self.template = template or os.getenv("E2B_TEMPLATE") or None
+        self.keepalive = keepalive or int(os.getenv("E2B_SANDBOX_TIMEOUT", "3600"))
+
+    def create(self, name: str):
+        from e2b_code_interpreter import Sandbox
+        sbx = Sandbox.create(template=self.template, timeout=self.keepalive, metadata={"name": name})
+        sandbox = E2BSandbox(name, sbx, self.root, self.keepalive)
+        sandbox.process.exec("mkdir -p charts")
+        return sandbox
+
+    def destroy(self, sandbox) -> None:
+        sandbox.sbx.kill()
+
+    def is_healthy(self, sandbox) -> bool:
+        try:
+            return sandbox.sbx.is_running()
+        except Exception:
+            return False
+
+
+# Modal: no interpreter contexts, so kernel mode isn't available here
+class _ModalProcess:
+    def __init__(self, sb, root: str):
+        self.sb = sb
+        self.root = root
+
+    def code_run(self, code: str, params=None, timeout: int | None = None) -> ExecResult:
+        script = f"{self.root}/.run_{uuid.uuid4().hex}.py"
+        self.sb.filesystem.write_text(code, script)
+        return self.exec(f"python3 {script}; code=$?; rm -f {script}; exit $code", timeout=timeout)
+
+    def exec(self, command: str, cwd: str | None = None, env: dict | None = None, timeout: int | None = None) -> ExecResult:
+        proc = self.sb.exec("bash", "-c", command, workdir=f"{self.root}/{cwd or ''}".rstrip("/"), env=env,
+                            timeout=timeout)
+        stdout, stderr = proc.stdout.read(), proc.stderr.read()
+        return ExecResult(exit_code=proc.wait(), result=stdout + stderr)
+
+
+class _ModalFileSystem:
+    def __init__(self, sb, root: str):
+        self.sb = sb
+        self.root = root
+
+    def upload_file(self, src: str | bytes, dst: str, timeout: int = 1800) -> None:
+        if not isinstance(src, bytes):
+            with open(src, "rb") as f:
+                src = f.read()
+        self.sb.filesystem.write_bytes(src, f"{self.root}/{dst}")
+
+    def download_file(self, remote_path: str, local_path: str | None = None) -> bytes | None:
+        data = self.sb.filesystem.read_bytes(f"{self.root}/{remote_path}")
+        if local_path is None:
+            return data
+        with open(local_path, "wb") as f:
+            f.write(data)
+        return None
+
+
+class ModalSandbox:
+    def __init__(self, name: str, sb, root: str):
+        self.id = sb.object_id
+        self.name = name
+        self.sb = sb
+        self.state = "started"
+        self.process = _ModalProcess(sb, root)
+        self.fs = _ModalFileSystem(sb, root)
+
+    def start(self, timeout: float | None = 60):
+        self.state = "started"
+
+    def stop(self, timeout: float | None = 60):
+        self.state = "stopped"
+
+
+class ModalBackend(SandboxBackend):
+    name = "modal"
+    kernel_mode = False
+    root = "/workspace"
+
+    def __init__(self, app_name: str | None = None, keepalive: int | None = None):
+        self.app_name = app_name or os.getenv("MODAL_APP", "data-analyst-sandboxes")
+        self.keepalive = keepalive or int(os.getenv("MODAL_SANDBOX_TIMEOUT", "3600"))
+        self._app = None
+        self._image = None
+
+    def create(self, name: str):
+        import modal
+        if self._app is None:
+            self._app = modal.App.lookup(self.app_name, create_if_missing=True)
+            self._image = modal.Image.debian_slim().pip_install(*BASE_PACKAGES)
+        sb = modal.Sandbox.create(app=self._app, image=self._image, timeout=self.keepalive, workdir=self.root)
+        sandbox = ModalSandbox(name, sb, self.root)
+        sandbox.process.exec("mkdir -p charts")
+        return sandbox
+
+    def destroy(self, sandbox) -> None:
+        sandbox.sb.terminate()
+
+    def is_healthy(self, sandbox) -> bool:
+        try:
+            return sandbox.sb.poll() is None
+        except Exception:
+            return False
+
+
+BACKENDS = {
+    "daytona": DaytonaBackend,
+    "e2b": E2BBackend,
+    "modal": ModalBackend,
+    "local": SubprocessBackend,
+    "procpool": ProcessPoolBackend,
+}
+
+
+def get_backend(name: str | None = None) -> SandboxBackend:
+    name = name or os.getenv("SANDBOX_BACKEND", "daytona")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sandbox backend '{name}'. Choose from {sorted(BACKENDS)}")
+    # Fail at configuration time rather than on a thread's first kernel run
+    if os.getenv("EXECUTION_MODE", "script") == "kernel" and not BACKENDS[name].kernel_mode:
+        raise ValueError(f"Sandbox backend '{name}' doesn't support EXECUTION_MODE=kernel; use EXECUTION_MODE=script")
+    return BACKENDS[name]()
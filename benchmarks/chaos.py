@@ -0,0 +1,224 @@
+"""Chaos run: the offline suite with transient LLM and sandbox failures injected.
+
+Every LLM call and sandbox code_run/exec fails with a ConnectionError at
+`--fault-rate` before it reaches the fake model or backend. Each case is run
+under three recovery strategies:
+
+    restart  no checkpoints or node retries; a failed turn is run again from the start
+    resume   checkpoints, no node retries; a failed turn resumes from its last completed node
+    retry    checkpoints and node retries (the defaults), resuming only once retries run out
+
+and compared with a fault-free pass. Work is counted in LLM and sandbox calls
+that completed; anything beyond the fault-free pass was done twice. "recovered"
+is the share of restart's repeated work the strategy did not have to redo.
+
+    python benchmarks/chaos.py
+    python benchmarks/chaos.py --fault-rate 0.2 --repeat 3 --cases sales_region,weather_hottest
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suite import bench_env, check, load_cases, turn_input  # noqa: E402
+
+MODES = ("restart", "resume", "retry")
+
+
+class Chaos:
+    """Fails a `rate` share of the calls that pass through it, reproducibly per seed."""
+
+    def __init__(self, rate: float, seed: int):
+        self.rate = rate
+        self.armed = False
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"llm_faults": 0, "sandbox_faults": 0, "llm_calls": 0, "sandbox_calls": 0}
+
+    def reset(self, seed: int) -> None:
+        with self._lock:
+            self._random.seed(seed)
+            self.counts = dict.fromkeys(self.counts, 0)
+
+    def call(self, kind: str, fn):
+        with self._lock:
+            fail = self.armed and self._random.random() < self.rate
+            self.counts[f"{kind}_faults" if fail else f"{kind}_calls"] += 1
+        if fail:
+            raise ConnectionError(f"chaos: injected {kind} failure")
+        return fn()
+
+
+def chaos_models(chaos: Chaos, models):
+    from langchain_core.runnables import RunnableLambda
+
+    def role(name, model):
+        async def ainvoke(messages):
+            chaos.call("llm", lambda: None)
+            return await model.ainvoke(messages)
+
+        return RunnableLambda(lambda messages: chaos.call("llm", lambda: model.invoke(messages)),
+                              afunc=ainvoke, name=f"chaos-{name}")
+
+    return models._replace(**{name: role(name, getattr(models, name))
+                              for name in ("manager", "generator", "reflector", "summarizer")})
+
+
+class _ChaosProcess:
+    def __init__(self, inner, chaos: Chaos):
+        self._inner = inner
+        self._chaos = chaos
+
+    def code_run(self, code: str, params=None, timeout: int | None = None):
+        return self._chaos.call("sandbox", lambda: self._inner.code_run(code, timeout=timeout))
+
+    def exec(self, command: str, cwd: str | None = None, env: dict | None = None, timeout: int | None = None):
+        return self._chaos.call("sandbox", lambda: self._inner.exec(command, cwd=cwd, env=env, timeout=timeout))
+
+
+class _ChaosSandbox:
+    def __init__(self, raw, process: _ChaosProcess):
+        self.raw = raw
+        self.process = process
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def chaos_backend(inner, chaos: Chaos):
+    import backends
+
+    class ChaosBackend(backends.SandboxBackend):
+        name = "chaos"
+        shared_environment = inner.shared_environment
+
+        def create(self, name: str):
+            sandbox = inner.create(name)
+            return _ChaosSandbox(sandbox, _ChaosProcess(sandbox.process, chaos))
+
+        def destroy(self, sandbox) -> None:
+            inner.destroy(sandbox.raw)
+
+        def is_healthy(self, sandbox) -> bool:
+            return inner.is_healthy(sandbox.raw)
+
+    return ChaosBackend()
+
+
+def run_case(app, fixtures, registry, case: dict, mode: str, max_recoveries: int) -> dict:
+    from recovery import is_transient
+    from resources import get_pool
+    thread_id = f"chaos-{case['id']}-{uuid.uuid4().hex[:8]}"
+    fixtures.bind(thread_id, case["id"])
+    config = {"configurable": {"thread_id": thread_id}}
+    recoveries, answers, error = 0, [], None
+    for i, message in enumerate(case["turns"]):
+        fixtures.start_turn(thread_id)
+        inputs = turn_input(registry, case, message, i == 0)
+        run_inputs = inputs
+        while True:
+            try:
+                state = app.invoke(run_inputs, config)
+                answers.append(state.get("answer"))
+                break
+            except Exception as e:
+                if not is_transient(e) or recoveries >= max_recoveries:
+                    error = f"{type(e).__name__}: {e}"
+                    break
+                recoveries += 1
+                # Without checkpoints the only option is to run the turn again
+                if mode == "restart":
+                    fixtures.restart_turn(thread_id)
+                run_inputs = inputs if mode == "restart" else None
+        if error:
+            break
+    # A run that never reached the summarizer still holds its sandbox; don't wait out SANDBOX_LEASE_TTL
+    get_pool().release(thread_id)
+    return {"case": case["id"], "ok": not error and check(case, answers), "recoveries": recoveries, "error": error}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", default="", help="comma separated case ids (default: all)")
+    parser.add_argument("--fault-rate", type=float, default=0.1, help="share of LLM and sandbox calls that fail")
+    parser.add_argument("--repeat", type=int, default=2, help="runs of the corpus per strategy")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-recoveries", type=int, default=50, help="restarts/resumes allowed per case")
+    parser.add_argument("--sandbox", choices=("local", "replay"), default="local")
+    args = parser.parse_args()
+
+    bench_env(1)
+    # Retries back off fast and deterministically so the run measures work, not sleeps
+    os.environ.update({"NODE_RETRY_BACKOFF": "0.01", "NODE_RETRY_JITTER": "0"})
+
+    import resources
+    from backends import get_backend
+    from metrics import metrics
+    from recovery import get_checkpointer
+    from replay import Fixtures, ReplayBackend, replay_models
+    from sandbox_pool import SandboxPool
+
+    fixtures = Fixtures()
+    chaos = Chaos(args.fault_rate, args.seed)
+    resources.set_models(chaos_models(chaos, replay_models(fixtures)))
+    backend = ReplayBackend(get_backend("local"), fixtures, "replay" if args.sandbox == "replay" else "live")
+    resources.set_pool(SandboxPool.from_env(chaos_backend(backend, chaos)))
+    registry = resources.get_registry()
+    import agent
+
+    apps = {
+        "restart": agent.build_graph(agent.NODES, retry=None).compile(),
+        "resume": agent.build_graph(agent.NODES, retry=None).compile(checkpointer=get_checkpointer("sqlite")),
+        "retry": agent.graph.compile(checkpointer=get_checkpointer("sqlite")),
+    }
+    cases = load_cases([c for c in args.cases.split(",") if c])
+    runs = [case for _ in range(args.repeat) for case in cases]
+    print(f"{len(cases)} cases x {args.repeat}, fault rate {args.fault_rate}, sandbox={args.sandbox}")
+
+    def measure(mode: str, armed: bool) -> dict:
+        chaos.reset(args.seed)
+        chaos.armed = armed
+        metrics.reset()
+        t0 = time.perf_counter()
+        results = [run_case(apps[mode], fixtures, registry, case, mode, args.max_recoveries) for case in runs]
+        transient = sum(v for k, v in metrics.summary()["counters"].items()
+                        if k.startswith("node_exceptions") and "transient=True" in k)
+        recoveries = sum(r["recoveries"] for r in results)
+        # Each resume follows a node that ran out of retries; its last error wasn't retried
+        return {**chaos.counts, "wall_s": time.perf_counter() - t0, "ok": sum(r["ok"] for r in results),
+                "recoveries": recoveries, "node_retries": max(0, transient - recoveries) if transient else 0,
+                "errors": [r["error"] for r in results if r["error"]]}
+
+    # Dataset ingestion happens once per process; keep it out of every pass
+    measure("retry", armed=False)
+    clean = measure("retry", armed=False)
+    print(f"{'fault-free':10} {clean['llm_calls']:4d} llm calls  {clean['sandbox_calls']:4d} sandbox calls  "
+          f"{clean['wall_s']:6.2f}s  correct {clean['ok']}/{len(runs)}")
+    repeated = {}
+    for mode in MODES:
+        r = measure(mode, armed=True)
+        # Sandbox counts include background manifest fetches, which a fault can skip
+        extra_llm = max(0, r["llm_calls"] - clean["llm_calls"])
+        extra_sandbox = max(0, r["sandbox_calls"] - clean["sandbox_calls"])
+        repeated[mode] = extra_llm + extra_sandbox
+        recovered = ""
+        if mode != "restart" and repeated["restart"] > 0:
+            recovered = f"  recovered {100 * (1 - repeated[mode] / repeated['restart']):5.1f}%"
+        print(f"{mode:10} {r['llm_calls']:4d} llm calls (+{extra_llm:3d})  {r['sandbox_calls']:4d} sandbox calls "
+              f"(+{extra_sandbox:3d})  {r['wall_s']:6.2f}s  faults {r['llm_faults'] + r['sandbox_faults']:3d}  "
+              f"node retries {r['node_retries']:3d}  {'restarts' if mode == 'restart' else 'resumes'} {r['recoveries']:3d}  "
+              f"correct {r['ok']}/{len(runs)}{recovered}")
+        for error in r["errors"][:3]:
+            print(f"  failed: {error[:100]}")
+    print(f"fixtures: {fixtures.stats}")
+    resources.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
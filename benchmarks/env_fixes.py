@@ -0,0 +1,108 @@
+"""Install round-trips saved by replaying recorded environment fixes.
+
+Every turn gets a fresh sandbox (as after recycling or scale-out) whose
+generated code imports a package the base image lacks. Without replay each
+turn goes execute (or validate) -> reflector -> pip install -> execute; with
+replay the first turn's install is recorded and later sandboxes are
+provisioned with it. Sandboxes are local temp directories with their own
+"site" so an install in one is invisible to the others; `pip install` of the
+fake package just sleeps for --install-delay and drops a module in place.
+
+    python benchmarks/env_fixes.py --turns 6 --install-delay 2 --latency 0.3
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+PACKAGE = "fancystats"
+CODE = f"""import {PACKAGE}
+result = [{{'question': 'total', 'answer': {PACKAGE}.total(range(100))}}]
+print(result)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--install-delay", type=float, default=2.0, help="seconds a simulated pip install takes")
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per LLM call")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SANDBOX_BACKEND": "isolated",
+        "SANDBOX_POOL_MIN": "0",
+        "FAST_ROUTER": "0",
+        "STREAM_EXECUTION": "0",
+        "CODE_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "code_cache.sqlite"),
+        "RESULT_STORE": os.path.join(tempfile.mkdtemp(), "results"),
+        "ENV_FIX_BAKE_INTERVAL": "0",
+    })
+    import agent
+    import backends
+    import resources
+    from env_fixes import parse_installs
+    from fakes import fake_models, fake_role
+    from metrics import metrics
+    from schema import ReflectorOutput
+
+    class _IsolatedProcess(backends._LocalProcess):
+        def exec(self, command, cwd=None, env=None, timeout=None):
+            packages, _ = parse_installs(command)
+            if PACKAGE in packages:
+                time.sleep(args.install_delay)
+                with open(os.path.join(self.root, f"{PACKAGE}.py"), "w") as f:
+                    f.write("def total(values):\n    return sum(values)\n")
+                return backends.ExecResult(exit_code=0, result=f"Successfully installed {PACKAGE}")
+            return super().exec(command, cwd=cwd, env=env, timeout=timeout)
+
+    class IsolatedBackend(backends.SubprocessBackend):
+        name = "isolated"
+        shared_environment = False
+
+        def create(self, name):
+            sandbox = super().create(name)
+            sandbox.process = _IsolatedProcess(sandbox.root)
+            return sandbox
+
+    backends.BACKENDS["isolated"] = IsolatedBackend
+
+    def reflect(messages):
+        if f"No module named '{PACKAGE}'" in messages[-1].content:
+            return ReflectorOutput(fix_type="ENVIRONMENT_FIX", cmd=f"pip install {PACKAGE}", comment="missing package")
+        return ReflectorOutput(fix_type="CODE_FIX", code=CODE, cmd=None, comment="retry")
+
+    resources.set_models(fake_models(args.latency, CODE)._replace(reflector=fake_role(reflect, args.latency)))
+
+    for replay in (False, True):
+        resources.ENV_FIX_REPLAY = replay
+        os.environ["ENV_FIX_PATH"] = os.path.join(tempfile.mkdtemp(), "env_fixes.sqlite")
+        resources.set_pool(None)
+        resources.get_pool().max_uses = 1  # a fresh sandbox every turn
+        metrics.reset()
+        latencies, attempts = [], []
+        for _ in range(args.turns):
+            t0 = time.perf_counter()
+            state = agent.app.invoke({"messages": [HumanMessage(content=f"Total the values ({uuid.uuid4().hex})")]},
+                                     {"configurable": {"thread_id": f"envfix-{uuid.uuid4().hex[:8]}"}})
+            latencies.append(time.perf_counter() - t0)
+            assert state.get("answer"), state.get("agent_error")
+            attempts.append(state["attempts"])
+        counters = metrics.summary()["counters"]
+        first = counters.get("first_attempts", 0)
+        print(f"replay {'on ' if replay else 'off'}: turn mean {statistics.mean(latencies) * 1000:6.0f}ms  "
+              f"after first {statistics.mean(latencies[1:]) * 1000:6.0f}ms  attempts/turn {statistics.mean(attempts):.1f}  "
+              f"first-attempt success {counters.get('first_attempt_success', 0) / first if first else 0:.0%}  "
+              f"avoided installs {counters.get('env_fix_avoided', 0):.0f}")
+        resources.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
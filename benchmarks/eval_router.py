@@ -0,0 +1,91 @@
+"""Offline evaluation of the fast-path router against recorded routing decisions.
+
+Replays a decision log (the manager's logged decisions, or the bundled
+sample set) with k-fold cross validation. The nearest-neighbour tier is fit on
+the training folds only. For each threshold, reports coverage (the share of
+messages the router answers without the manager LLM), accuracy on the answered
+messages, and latency per tier. Like a real log, the sample set repeats
+questions in different words; the nearest-neighbour tier only answers those.
+
+    python benchmarks/eval_router.py --log .cache/routing_log.jsonl --thresholds 0.6,0.7,0.8,0.9
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_router import FastRouter  # noqa: E402
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_samples.jsonl")
+
+
+def load(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(records: list[dict], threshold: float, folds: int, k: int, seed: int) -> dict:
+    records = records[:]
+    random.Random(seed).shuffle(records)
+    answered, correct, confusion = Counter(), Counter(), Counter()
+    latencies: dict[str, list[float]] = {}
+    for fold in range(folds):
+        router = FastRouter(threshold=threshold, k=k)
+        test = records[fold::folds]
+        for i, r in enumerate(records):
+            if i % folds != fold:
+                router.add(r["text"], r["decision"], r["has_data"], r["has_result"])
+        for r in test:
+            t0 = time.perf_counter()
+            route = router.route(r["text"], r["has_data"], r["has_result"])
+            tier = route.tier if route else "miss"
+            latencies.setdefault(tier, []).append((time.perf_counter() - t0) * 1000)
+            if route:
+                answered[tier] += 1
+                correct[tier] += route.decision == r["decision"]
+                confusion[(r["decision"], route.decision)] += 1
+    n = len(records)
+    total_answered = sum(answered.values())
+    return {
+        "threshold": threshold,
+        "coverage": total_answered / n,
+        "accuracy": sum(correct.values()) / total_answered if total_answered else None,
+        "tiers": {t: {"answered": answered[t], "accuracy": correct[t] / answered[t]} for t in answered},
+        "latency_ms": {t: {"p50": statistics.median(v), "max": max(v)} for t, v in latencies.items()},
+        "errors": {f"{want}->{got}": c for (want, got), c in confusion.items() if want != got},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default=SAMPLES, help="JSONL of recorded decisions (text, decision, has_data, has_result)")
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.9")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print full results as JSON")
+    args = parser.parse_args()
+
+    records = load(args.log)
+    print(f"{len(records)} recorded decisions from {args.log}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        result = evaluate(records, threshold, args.folds, args.k, args.seed)
+        if args.json:
+            print(json.dumps(result))
+            continue
+        accuracy = f"{result['accuracy']:.1%}" if result["accuracy"] is not None else "n/a"
+        tiers = "  ".join(f"{t}: {v['answered']} @ {v['accuracy']:.0%}" for t, v in sorted(result["tiers"].items()))
+        latency = "  ".join(f"{t} p50 {v['p50']:.3f}ms" for t, v in sorted(result["latency_ms"].items()))
+        print(f"threshold {threshold:.2f}: coverage {result['coverage']:.1%}  accuracy {accuracy}  [{tiers}]  {latency}")
+        if result["errors"]:
+            print(f"    misroutes: {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
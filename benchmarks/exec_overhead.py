@@ -0,0 +1,68 @@
+"""Per-execution overhead of each sandbox backend.
+
+Creates one sandbox per backend, then times `process.code_run` for a trivial
+script and for one that imports pandas. Sandbox creation is reported
+separately. Backends whose SDK or credentials are missing are skipped.
+
+    python benchmarks/exec_overhead.py --backends local,procpool,daytona,e2b,modal --runs 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import get_backend  # noqa: E402
+
+JOBS = {
+    "print": "print(1)",
+    "pandas": "import pandas as pd\nprint(pd.DataFrame({'a': range(1000)})['a'].sum())",
+}
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:8.1f}ms"
+
+
+def bench(name: str, runs: int) -> None:
+    backend = get_backend(name)
+    t0 = time.perf_counter()
+    try:
+        sandbox = backend.create(f"bench-{name}")
+        if hasattr(backend, "warm"):
+            backend.warm()
+    except Exception as e:
+        print(f"{name:>9}: skipped ({type(e).__name__}: {str(e)[:80]})")
+        return
+    created = time.perf_counter() - t0
+    try:
+        row = [f"{name:>9}: create {ms(created)}"]
+        for job, code in JOBS.items():
+            latencies = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                result = sandbox.process.code_run(code)
+                latencies.append(time.perf_counter() - t0)
+                if result.exit_code != 0:
+                    raise RuntimeError(f"{job} failed: {result.result[:200]}")
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            row.append(f"{job} p50 {ms(statistics.median(latencies))} p95 {ms(p95)}")
+        print("  ".join(row))
+    finally:
+        backend.destroy(sandbox)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default="local,procpool,daytona,e2b,modal")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    for name in args.backends.split(","):
+        bench(name.strip(), args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import asyncio
+import re
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from resources import Models
+from schema import GeneratorOutput, ManagerOutput, ReflectorOutput
+
+ANALYSIS_CODE = "result = [{'question': 'total', 'answer': sum(range(100))}]\nprint(result)"
+
+
+def fake_role(respond, latency: float = 0.0):
+    def invoke(messages):
+        time.sleep(latency)
+        return respond(messages)
+
+    async def ainvoke(messages):
+        await asyncio.sleep(latency)
+        return respond(messages)
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def fake_models(latency: float = 0.0, code: str = ANALYSIS_CODE) -> Models:
+    # Deterministic stand-ins for the four roles; `latency` simulates the LLM round-trip
+    return Models(
+        manager=fake_role(lambda m: ManagerOutput(decision="code_gen", messages=None, question=m[-1].content), latency),
+        generator=fake_role(lambda m: GeneratorOutput(thinking="- sum the values", code=code, charts_exists=False,
+                                                      generated_chart_names=[]), latency),
+        reflector=fake_role(lambda m: ReflectorOutput(fix_type="CODE_FIX", code=code, cmd=None, comment="retry"), latency),
+        summarizer=fake_role(lambda m: AIMessage(content="The total is 4950."), latency),
+    )
+
+
+class StreamingFakeChat(BaseChatModel):
+    """Chat model that emits `text` token by token, so LangGraph's "messages"
+    stream mode sees it the way it sees a real streaming model."""
+
+    text: str = "The total is 4950. The numbers 0 through 99 were summed in a single pass."
+    first_token: float = 0.3
+    token_delay: float = 0.02
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-fake"
+
+    def _tokens(self) -> list[str]:
+        return [t for t in re.split(r"(\s+)", self.text) if t]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.first_token + self.token_delay * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token)
+        for token in self._tokens():
+            time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
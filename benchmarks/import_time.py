@@ -0,0 +1,59 @@
+"""Measure the cost of `import agent` in a fresh interpreter.
+
+Framework imports (langgraph, langchain_core) are timed separately from the
+agent's own import so the number reported for the agent is the work this
+repo adds on top of them. Run from the repo root:
+
+    python benchmarks/import_time.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import langgraph.graph, langgraph.types, langchain_core.messages, langchain_core.runnables
+t1 = time.perf_counter()
+import agent
+t2 = time.perf_counter()
+print(json.dumps({
+    "framework_ms": (t1 - t0) * 1000,
+    "agent_ms": (t2 - t1) * 1000,
+    "eager_clients": sorted(m for m in ("daytona", "langchain_openai", "openai") if m in sys.modules),
+}))
+"""
+
+
+def run_once() -> dict:
+    # Point the SDKs at an unroutable address: a lazy import must not care.
+    env = {**os.environ, "DAYTONA_API_URL": "http://10.255.255.1", "OPENAI_BASE_URL": "http://10.255.255.1",
+           "PREWARM": ""}
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True,
+                         timeout=60, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    agent_ms = [s["agent_ms"] for s in samples]
+    framework_ms = [s["framework_ms"] for s in samples]
+    print(f"framework imports: median {statistics.median(framework_ms):.1f} ms")
+    print(f"import agent:      median {statistics.median(agent_ms):.1f} ms, max {max(agent_ms):.1f} ms")
+    eager = samples[-1]["eager_clients"]
+    print(f"network clients imported eagerly: {eager or 'none'}")
+    if eager:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Where a turn's time goes, from the telemetry JSONL sink.
+
+Groups the spans written to TELEMETRY_PATH by kind (node, llm, sandbox) and
+name and reports count, p50/p95 wall time, p95 queue time, errors, tokens and
+estimated cost. Run any workload first (the server, load_test.py, ...) with
+the sink turned on.
+
+    TELEMETRY_PATH=.cache/telemetry.jsonl python benchmarks/load_test.py && python benchmarks/latency_breakdown.py
+    python benchmarks/latency_breakdown.py --path .cache/telemetry.jsonl --kind llm
+"""
+import argparse
+import json
+from collections import defaultdict
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=".cache/telemetry.jsonl")
+    parser.add_argument("--kind", default=None, help="only node, llm or sandbox spans")
+    args = parser.parse_args()
+
+    groups = defaultdict(list)
+    with open(args.path) as f:
+        for line in f:
+            span = json.loads(line)
+            if args.kind is None or span["kind"] == args.kind:
+                groups[(span["kind"], span["name"])].append(span)
+
+    print(f"{'kind':8} {'name':42} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'queue p95':>10} {'errors':>7} "
+          f"{'tokens':>9} {'cost $':>9}")
+    for (kind, name), spans in sorted(groups.items(), key=lambda g: -sum(s["ms"] for s in g[1])):
+        ms = [s["ms"] for s in spans]
+        queued = [s["queue_ms"] for s in spans if s.get("queue_ms")]
+        errors = sum(s["status"] != "ok" or s.get("outcome") in ("failed", "error") for s in spans)
+        tokens = sum((s.get("prompt_tokens") or 0) + (s.get("completion_tokens") or 0) for s in spans)
+        cost = sum(s.get("cost_usd") or 0 for s in spans)
+        print(f"{kind:8} {name:42} {len(spans):6d} {percentile(ms, 0.5):9.1f} {percentile(ms, 0.95):9.1f} "
+              f"{percentile(queued, 0.95):10.1f} {errors:7d} {tokens:9d} {cost:9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare concurrent-request throughput of the sync and async graphs.
+
+LLM calls are replaced by fakes with a fixed latency and sandboxes by the
+local subprocess backend, so the numbers isolate how each graph uses worker
+threads. The sync graph runs on a fixed thread pool, as a server worker
+would; the async graph runs every request on one event loop.
+
+    python benchmarks/load_test.py --requests 64 --workers 8 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+
+def request(i: int) -> tuple[dict, dict]:
+    # Unique questions so the code cache never short-circuits the generator
+    state = {"messages": [HumanMessage(content=f"Sum the numbers 0..99 (request {i}, {uuid.uuid4().hex})")]}
+    return state, {"configurable": {"thread_id": f"load-{i}-{uuid.uuid4().hex[:6]}"}}
+
+
+def report(mode: str, latencies: list[float], wall: float) -> None:
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{mode:>5}: {len(latencies) / wall:6.2f} req/s  wall {wall:6.2f}s  "
+          f"p50 {statistics.median(latencies):5.2f}s  p95 {p95:5.2f}s")
+
+
+def run_sync(n: int, workers: int) -> None:
+    import agent
+
+    def one(i):
+        t0 = time.perf_counter()
+        agent.app.invoke(*request(i))
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(one, range(n)))
+    report("sync", latencies, time.perf_counter() - t0)
+
+
+async def run_async(n: int) -> None:
+    import agent_async
+
+    async def one(i):
+        t0 = time.perf_counter()
+        await agent_async.app.ainvoke(*request(i))
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(n)))
+    report("async", list(latencies), time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8, help="thread pool size for the sync graph")
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds per LLM call")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SANDBOX_BACKEND": "local",
+        "SANDBOX_POOL_MIN": "0",
+        "SANDBOX_POOL_MAX": str(args.requests),
+        "CODE_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "code_cache.sqlite"),
+    })
+    import resources
+    from fakes import fake_models
+    resources.set_models(fake_models(args.latency))
+
+    run_sync(args.requests, args.workers)
+    asyncio.run(run_async(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Per-turn manager latency over long sessions, with and without conversation memory.
+
+The manager is a fake whose latency grows with its prompt size (a fixed
+round-trip plus a per-token cost), so the numbers show how prompt growth
+turns into latency. Every turn is chat, so no sandbox is involved.
+
+    python benchmarks/memory_session.py --turns 100 --budget 3000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langgraph.checkpoint.memory import InMemorySaver  # noqa: E402
+
+REPLY = ("Sure - here is a detailed walk through of the metric, the columns involved, the filters applied and "
+         "what the numbers suggest for the next step of the analysis. ") * 4
+
+
+def run_session(agent, turns: int) -> list[float]:
+    app = agent.graph.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": f"memory-{uuid.uuid4().hex[:6]}"}}
+    latencies = []
+    for turn in range(turns):
+        t0 = time.perf_counter()
+        app.invoke({"messages": [HumanMessage(content=f"Turn {turn}: what does the revenue trend look like by region?")]},
+                   config)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def report(mode: str, latencies: list[float], prompt_sizes: list[int]) -> None:
+    n = len(latencies)
+    tail = latencies[-10:]
+    print(f"{mode:>7}: first10 {statistics.mean(latencies[:10]) * 1000:7.1f}ms  last10 {statistics.mean(tail) * 1000:7.1f}ms  "
+          f"p50 {statistics.median(latencies) * 1000:7.1f}ms  prompt tokens turn1 {prompt_sizes[0]:>6}  turn{n} {prompt_sizes[-1]:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--budget", type=int, default=3000, help="MEMORY_TOKEN_BUDGET for the memory run")
+    parser.add_argument("--base-ms", type=float, default=20.0, help="fixed simulated manager latency")
+    parser.add_argument("--ms-per-1k", type=float, default=15.0, help="simulated latency per 1k prompt tokens")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "MEMORY_TOKEN_BUDGET": str(args.budget),
+        "RESULT_STORE": os.path.join(tempfile.mkdtemp(), "results"),
+    })
+    import agent
+    import resources
+    from fakes import fake_models, fake_role
+    from memory import count_tokens
+    from schema import ManagerOutput
+
+    prompt_sizes: list[int] = []
+
+    def manager(messages):
+        tokens = sum(count_tokens(m) for m in messages)
+        prompt_sizes.append(tokens)
+        time.sleep((args.base_ms + args.ms_per_1k * tokens / 1000) / 1000)
+        return ManagerOutput(decision="chats", messages=REPLY, question=None)
+
+    models = fake_models()
+    resources.set_models(models._replace(
+        manager=fake_role(manager),
+        summarizer=fake_role(lambda m: AIMessage(content="User is exploring revenue trends by region."), 0.05),
+    ))
+
+    for mode, enabled in (("full", False), ("memory", True)):
+        agent.CONVERSATION_MEMORY = enabled
+        prompt_sizes.clear()
+        latencies = run_session(agent, args.turns)
+        report(mode, latencies, prompt_sizes)
+    resources.get_memory().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Cost of a reflector retry: line patches vs full rewrites.
+
+The generator returns a long analysis script with one broken line. The
+reflector is a fake that either patches that line or re-emits the whole
+script; its latency is a fixed round-trip plus a per-output-token decode cost,
+so the numbers show what the smaller output is worth. Sandboxes use the local
+subprocess backend.
+
+    python benchmarks/reflector_patch.py --runs 5 --filler 150 --ms-per-token 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+
+def script(filler: int, broken: bool) -> str:
+    lines = ["import pandas as pd", "frame = pd.DataFrame({'value': range(100)})"]
+    lines += [f"step_{i} = frame['value'].rolling({i % 7 + 2}).mean().fillna(0).sum()  # derived metric {i}"
+              for i in range(filler)]
+    lines.append("total = frame['valeu'].sum()" if broken else "total = frame['value'].sum()")
+    lines += ["result = [{'question': 'total', 'answer': int(total)}]", "print(result)"]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--filler", type=int, default=150, help="lines of unrelated analysis around the bug")
+    parser.add_argument("--base-ms", type=float, default=300.0, help="fixed simulated reflector round-trip")
+    parser.add_argument("--ms-per-token", type=float, default=10.0, help="simulated decode cost per output token")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SANDBOX_BACKEND": "local",
+        "SANDBOX_POOL_MIN": "0",
+        "FAST_ROUTER": "0",
+        "CODE_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "code_cache.sqlite"),
+        "RESULT_STORE": os.path.join(tempfile.mkdtemp(), "results"),
+    })
+    import agent
+    import resources
+    from fakes import fake_models, fake_role
+    from memory import count_tokens
+    from schema import LinePatch, ReflectorOutput
+
+    broken, fixed = script(args.filler, True), script(args.filler, False)
+    bug_line = broken.splitlines().index("total = frame['valeu'].sum()") + 1
+
+    def reflector(patch: bool):
+        def respond(messages):
+            if patch and agent.REWRITE_REQUEST not in messages[-1].content:
+                out = ReflectorOutput(fix_type="CODE_FIX", cmd=None, comment="typo in column name", patches=[
+                    LinePatch(start_line=bug_line, end_line=bug_line, replacement="total = frame['value'].sum()")])
+            else:
+                out = ReflectorOutput(fix_type="CODE_FIX", code=fixed, cmd=None, comment="typo in column name")
+            time.sleep((args.base_ms + args.ms_per_token * count_tokens(out.model_dump_json(exclude_none=True))) / 1000)
+            return out
+        return fake_role(respond)
+
+    print(f"script: {len(broken.splitlines())} lines, {count_tokens(broken)} tokens")
+    for label, patch in (("rewrite", False), ("patch", True)):
+        agent.PATCH_FIXES = patch
+        resources.set_models(fake_models(0.0, broken)._replace(reflector=reflector(patch)))
+        tokens, reflect_ms, totals = [], [], []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            state = agent.app.invoke({"messages": [HumanMessage(content=f"Total the values ({uuid.uuid4().hex})")]},
+                                     {"configurable": {"thread_id": f"patch-{uuid.uuid4().hex[:8]}"}})
+            totals.append(time.perf_counter() - t0)
+            entry = state["trace"]["reflector_1"]
+            assert state.get("answer") and entry["mode"] == label, entry
+            tokens.append(entry["output_tokens"])
+            reflect_ms.append(entry["ms"])
+        print(f"{label:>7}: reflector output {statistics.mean(tokens):7.0f} tokens  reflector {statistics.mean(reflect_ms):7.1f}ms  "
+              f"turn {statistics.mean(totals) * 1000:7.1f}ms  est. saved {state['trace']['reflector_tokens_saved']} tokens")
+
+
+if __name__ == "__main__":
+    main()
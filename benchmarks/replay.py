@@ -0,0 +1,286 @@
+"""Record/replay fixtures for the offline benchmark suite.
+
+LLM calls are stored per corpus case, in call order per role, in
+fixtures/<case>.json and served back by fake chat models, so a replayed turn
+takes the same path through the graph as the recorded one. Sandbox
+`code_run`/`exec` results are content-addressed (hash of the code or command)
+in fixtures/sandbox.json, so the same generated code gets the same output
+whichever case or thread runs it; misses fall through to the wrapped backend.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+from langchain_core.runnables import RunnableLambda
+
+import backends
+from resources import Models
+from schema import GeneratorOutput, ManagerOutput, ReflectorOutput
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ROLES = ("manager", "generator", "reflector", "summarizer")
+_OUTPUT_TYPES = {cls.__name__: cls for cls in (ManagerOutput, GeneratorOutput, ReflectorOutput)}
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:16]
+
+
+def prompt_digest(messages) -> str:
+    return _digest(*(m.content if isinstance(m.content, str) else json.dumps(m.content) for m in messages))
+
+
+def dump_output(output):
+    if output is None:
+        return None
+    if isinstance(output, dict):
+        # with_structured_output(include_raw=True)
+        error = output.get("parsing_error")
+        return {"type": "raw", "raw": dump_output(output["raw"]), "parsed": dump_output(output.get("parsed")),
+                "parsing_error": str(error) if error else None}
+    if isinstance(output, BaseMessage):
+        return {"type": "message", "message": messages_to_dict([output])[0]}
+    return {"type": type(output).__name__, "data": output.model_dump()}
+
+
+def load_output(data):
+    if data is None:
+        return None
+    if data["type"] == "raw":
+        return {"raw": load_output(data["raw"]), "parsed": load_output(data["parsed"]),
+                "parsing_error": ValueError(data["parsing_error"]) if data["parsing_error"] else None}
+    if data["type"] == "message":
+        return messages_from_dict([data["message"]])[0]
+    return _OUTPUT_TYPES[data["type"]].model_validate(data["data"])
+
+
+def current_thread_id() -> str | None:
+    # Set by LangGraph for everything running under a node, including to_thread calls
+    from langgraph.config import get_config
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+
+
+class FixtureMiss(LookupError):
+    pass
+
+
+class Fixtures:
+    """Recorded LLM calls per case plus the shared sandbox results.
+
+    `bind(thread_id, case_id)` tells the fakes which case a graph thread is
+    running; each thread replays the case's calls from the start. A prompt the
+    thread already sent this turn (a retried or re-run node) gets the same
+    output again instead of the next recorded call, and counts as a repeat;
+    `restart_turn` rewinds the thread to the start of its turn for a full re-run.
+    """
+
+    def __init__(self, directory: str = FIXTURES_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._cases: dict[str, list[dict]] = {}
+        self._threads: dict[str, tuple[str, dict[str, int]]] = {}
+        self._served: dict[str, dict[tuple[str, str], dict]] = {}
+        self._turn_start: dict[str, dict[str, int]] = {}
+        self._spent: dict[str, dict[str, float]] = {}
+        self.sandbox: dict[str, dict] = self._read("sandbox") or {}
+        self.stats = {"llm_replayed": 0, "llm_repeated": 0, "prompt_drift": 0, "sandbox_replayed": 0, "sandbox_misses": 0}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _read(self, name: str):
+        if not os.path.exists(self._path(name)):
+            return None
+        with open(self._path(name)) as f:
+            return json.load(f)
+
+    def case(self, case_id: str) -> list[dict]:
+        with self._lock:
+            if case_id not in self._cases:
+                self._cases[case_id] = (self._read(case_id) or {}).get("llm", [])
+            return self._cases[case_id]
+
+    def bind(self, thread_id: str, case_id: str, record: bool = False) -> None:
+        if record:
+            with self._lock:
+                self._cases[case_id] = []
+        else:
+            self.case(case_id)
+        with self._lock:
+            self._threads[thread_id] = (case_id, dict.fromkeys(ROLES, 0))
+            self._served[thread_id] = {}
+            self._spent[thread_id] = {"llm_ms": 0.0, "sandbox_ms": 0.0}
+
+    def start_turn(self, thread_id: str) -> None:
+        with self._lock:
+            self._served[thread_id] = {}
+            self._turn_start[thread_id] = dict(self._threads[thread_id][1])
+
+    def restart_turn(self, thread_id: str) -> None:
+        # Prompts of a re-run can differ (results stored by the failed run), so replay by position
+        with self._lock:
+            self._threads[thread_id][1].update(self._turn_start[thread_id])
+            self._served[thread_id] = {}
+
+    def spent(self, thread_id: str) -> dict[str, float]:
+        # Time the thread spent inside (fake or recorded) LLM and sandbox calls
+        with self._lock:
+            return dict(self._spent.get(thread_id, {}))
+
+    def add_spent(self, kind: str, ms: float) -> None:
+        thread_id = current_thread_id()
+        with self._lock:
+            if thread_id in self._spent:
+                self._spent[thread_id][kind] += ms
+
+    def next_call(self, role: str, messages) -> dict:
+        thread_id = current_thread_id()
+        with self._lock:
+            if thread_id not in self._threads:
+                raise FixtureMiss(f"Thread {thread_id!r} is not bound to a corpus case")
+            case_id, cursors = self._threads[thread_id]
+            digest = prompt_digest(messages)
+            if (role, digest) in self._served[thread_id]:
+                self.stats["llm_repeated"] += 1
+                return self._served[thread_id][(role, digest)]
+            calls = [c for c in self._cases[case_id] if c["role"] == role]
+            if cursors[role] >= len(calls):
+                raise FixtureMiss(f"No recorded {role} call #{cursors[role] + 1} for case {case_id}")
+            call = calls[cursors[role]]
+            cursors[role] += 1
+            self.stats["llm_replayed"] += 1
+            if call.get("prompt") and call["prompt"] != digest:
+                self.stats["prompt_drift"] += 1
+            self._served[thread_id][(role, digest)] = call
+        return call
+
+    def append_call(self, role: str, messages, output, ms: float) -> None:
+        thread_id = current_thread_id()
+        with self._lock:
+            case_id, _ = self._threads[thread_id]
+            self._cases[case_id].append({"role": role, "prompt": prompt_digest(messages), "ms": round(ms, 1),
+                                         "output": dump_output(output)})
+
+    def save(self, case_ids=None) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            for case_id in list(self._cases) if case_ids is None else case_ids:
+                with open(self._path(case_id), "w") as f:
+                    json.dump({"case": case_id, "llm": self._cases[case_id]}, f, indent=1)
+            with open(self._path("sandbox"), "w") as f:
+                json.dump(self.sandbox, f, indent=1, sort_keys=True)
+
+
+def replay_models(fixtures: Fixtures, latency: float | str = 0.0) -> Models:
+    """Fake chat models serving recorded outputs. `latency` is seconds per call,
+    or "recorded" to sleep for as long as the live call took."""
+    def role(name):
+        def delay(call):
+            return call.get("ms", 0) / 1000 if latency == "recorded" else float(latency)
+
+        def invoke(messages):
+            call = fixtures.next_call(name, messages)
+            time.sleep(delay(call))
+            fixtures.add_spent("llm_ms", delay(call) * 1000)
+            return load_output(call["output"])
+
+        async def ainvoke(messages):
+            call = fixtures.next_call(name, messages)
+            await asyncio.sleep(delay(call))
+            fixtures.add_spent("llm_ms", delay(call) * 1000)
+            return load_output(call["output"])
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"replay-{name}")
+
+    return Models(*(role(name) for name in ROLES))
+
+
+def recording_models(fixtures: Fixtures, live: Models) -> Models:
+    """Wrap live models so every call is appended to the bound case's fixture."""
+    def role(name, model):
+        def invoke(messages):
+            t0 = time.perf_counter()
+            output = model.invoke(messages)
+            fixtures.append_call(name, messages, output, (time.perf_counter() - t0) * 1000)
+            return output
+
+        async def ainvoke(messages):
+            t0 = time.perf_counter()
+            output = await model.ainvoke(messages)
+            fixtures.append_call(name, messages, output, (time.perf_counter() - t0) * 1000)
+            return output
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"record-{name}")
+
+    return Models(*(role(name, getattr(live, name)) for name in ROLES))
+
+
+class _ReplayProcess:
+    # Only code_run/exec: without create_session, execution takes the one-shot path that can be replayed
+    def __init__(self, inner, fixtures: Fixtures, mode: str):
+        self._inner = inner
+        self._fixtures = fixtures
+        self._mode = mode
+
+    def code_run(self, code: str, params=None, timeout: int | None = None):
+        return self._call("code_run", code, lambda: self._inner.code_run(code, timeout=timeout))
+
+    def exec(self, command: str, cwd: str | None = None, env: dict | None = None, timeout: int | None = None):
+        return self._call("exec", command, lambda: self._inner.exec(command, cwd=cwd, env=env, timeout=timeout))
+
+    def _call(self, method: str, payload: str, run):
+        # Dataset ingestion writes the columnar file the registry downloads, so it always really runs
+        key = _digest(method, payload)
+        replayable = "__PROFILE__" not in payload
+        t0 = time.perf_counter()
+        try:
+            if self._mode == "replay" and replayable and key in self._fixtures.sandbox:
+                self._fixtures.stats["sandbox_replayed"] += 1
+                return backends.ExecResult(**self._fixtures.sandbox[key])
+            resp = run()
+            if self._mode == "record" and replayable:
+                self._fixtures.sandbox[key] = {"exit_code": resp.exit_code, "result": resp.result}
+            elif self._mode == "replay" and replayable:
+                self._fixtures.stats["sandbox_misses"] += 1
+            return resp
+        finally:
+            self._fixtures.add_spent("sandbox_ms", (time.perf_counter() - t0) * 1000)
+
+
+class _ReplaySandbox:
+    def __init__(self, raw, process: _ReplayProcess):
+        self.raw = raw
+        self.process = process
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class ReplayBackend(backends.SandboxBackend):
+    """Wraps another backend and times its code_run/exec calls. `mode` is
+    "live" (just run them), "replay" (serve recorded results) or "record"."""
+
+    name = "replay"
+
+    def __init__(self, inner: backends.SandboxBackend, fixtures: Fixtures, mode: str = "live"):
+        self.inner = inner
+        self.fixtures = fixtures
+        self.mode = mode
+        self.shared_environment = inner.shared_environment
+
+    def create(self, name: str):
+        sandbox = self.inner.create(name)
+        return _ReplaySandbox(sandbox, _ReplayProcess(sandbox.process, self.fixtures, self.mode))
+
+    def destroy(self, sandbox) -> None:
+        self.inner.destroy(sandbox.raw)
+
+    def is_healthy(self, sandbox) -> bool:
+        return self.inner.is_healthy(sandbox.raw)
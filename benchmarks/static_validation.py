@@ -0,0 +1,99 @@
+"""Doomed sandbox runs avoided by static validation.
+
+Each case is a generated script with a defect that is knowable before
+execution (syntax error, missing package, chart name mismatch, no
+print(result)). The generator returns the broken script and the reflector
+returns the fixed one, so every turn takes exactly one fix. Runs with
+STATIC_VALIDATION on and off report sandbox executions per turn and turn
+latency, and whether the answer was complete (result printed, chart
+collected). Chart and print defects don't fail at runtime, so without
+validation they cost no retry but lose the chart or the result. Sandboxes use
+the local subprocess backend.
+
+    python benchmarks/static_validation.py --runs 3 --latency 0.3
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+FIXED = """import pandas as pd
+import matplotlib.pyplot as plt
+frame = pd.DataFrame({'value': range(100)})
+frame['value'].plot()
+plt.savefig("charts/value_trend.png")
+plt.close()
+result = [{'question': 'total', 'answer': int(frame['value'].sum())}]
+print(result)
+"""
+
+CASES = {
+    "syntax": FIXED.replace("int(frame['value'].sum())}]", "int(frame['value'].sum()}]"),
+    "missing package": FIXED.replace("import pandas as pd", "import pandas as pd\nimport polars_extra"),
+    "chart name": FIXED.replace("charts/value_trend.png", "charts/trend.png"),
+    "no print": FIXED.replace("print(result)", "print('done')"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per LLM call")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SANDBOX_BACKEND": "local",
+        "SANDBOX_POOL_MIN": "0",
+        "FAST_ROUTER": "0",
+        "CODE_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "code_cache.sqlite"),
+        "RESULT_STORE": os.path.join(tempfile.mkdtemp(), "results"),
+        "STREAM_EXECUTION": "0",
+    })
+    import agent
+    import resources
+    from backends import _LocalProcess
+    from fakes import fake_models, fake_role
+    from schema import GeneratorOutput, ReflectorOutput
+
+    executions = [0]
+    code_run = _LocalProcess.code_run
+
+    def counted(self, *a, **kw):
+        executions[0] += 1
+        return code_run(self, *a, **kw)
+
+    _LocalProcess.code_run = counted
+
+    print(f"{'case':>16}  {'validation':>10}  {'sandbox runs':>12}  {'turn':>8}  {'complete':>8}")
+    for case, broken in CASES.items():
+        for enabled in (False, True):
+            agent.STATIC_VALIDATION = enabled
+            generator = fake_role(lambda m, code=broken: GeneratorOutput(
+                thinking="- sum and plot", code=code, charts_exists=True, generated_chart_names=["value_trend.png"]),
+                args.latency)
+            reflector = fake_role(lambda m: ReflectorOutput(fix_type="CODE_FIX", code=FIXED, cmd=None, comment="fixed"),
+                                  args.latency)
+            resources.set_models(fake_models(args.latency)._replace(generator=generator, reflector=reflector))
+            runs, totals, complete = [], [], []
+            for _ in range(args.runs):
+                executions[0] = 0
+                t0 = time.perf_counter()
+                state = agent.app.invoke({"messages": [HumanMessage(content=f"Total and plot ({uuid.uuid4().hex})")]},
+                                         {"configurable": {"thread_id": f"validate-{uuid.uuid4().hex[:8]}"}})
+                totals.append(time.perf_counter() - t0)
+                assert state.get("answer"), state.get("agent_error")
+                runs.append(executions[0])
+                complete.append("'question'" in state["answer"] and bool(state.get("charts")))
+            print(f"{case:>16}  {'on' if enabled else 'off':>10}  {statistics.mean(runs):12.1f}  "
+                  f"{statistics.mean(totals) * 1000:6.0f}ms  {f'{sum(complete)}/{len(complete)}':>8}")
+
+
+if __name__ == "__main__":
+    main()
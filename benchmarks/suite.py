@@ -0,0 +1,202 @@
+"""Offline benchmark suite: the compiled graph over a corpus of analysis questions.
+
+Each case in corpus/cases.jsonl names its datasets and one or more user turns.
+LLM calls are replayed from fixtures/ by fake chat models; sandbox calls are
+executed by a local backend (`--sandbox local`) or replayed from recorded
+results (`--sandbox replay`). Execution always takes the one-shot code_run
+path (no output streaming) so sandbox time can be attributed. Runs need no
+network and report, per concurrency level, throughput, turn latency, graph
+overhead (turn time not spent inside an LLM or sandbox call), retries per
+case and whether each answer contains the expected values.
+
+    python benchmarks/suite.py                                  # replay, local execution
+    python benchmarks/suite.py --concurrency 1,4,8 --repeat 3 --latency 0.5
+    python benchmarks/suite.py --sandbox replay --graph async
+
+Recording talks to the configured models and sandbox backend and rewrites the
+fixtures, one case at a time:
+
+    python benchmarks/suite.py --record-llm --record-sandbox --cases sales_region
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def bench_env(max_sandboxes: int) -> None:
+    # Set before the graph modules are imported; stores go to a scratch directory
+    scratch = tempfile.mkdtemp()
+    os.environ.update({
+        "SANDBOX_POOL_MIN": "0",
+        "SANDBOX_POOL_MAX": str(max_sandboxes),
+        # Deterministic path per case: no router training, no cross-run cache hits, one candidate
+        "FAST_ROUTER": "0",
+        "CODE_CACHE_TTL": "0",
+        "SPECULATIVE_K": "1",
+        "ENV_FIX_REPLAY": "0",
+        "CODE_CACHE_PATH": os.path.join(scratch, "code_cache.sqlite"),
+        "CHECKPOINT_PATH": os.path.join(scratch, "checkpoints.sqlite"),
+        "RESULT_STORE": os.path.join(scratch, "results"),
+        "DATASET_STORE": os.path.join(scratch, "datasets"),
+        "CHARTS_DIR": os.path.join(scratch, "charts"),
+        "TELEMETRY_PATH": "",
+        "STREAM_EXECUTION": "0",
+    })
+
+
+def load_cases(names: list[str] | None) -> list[dict]:
+    with open(os.path.join(CORPUS_DIR, "cases.jsonl")) as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    return [c for c in cases if not names or c["id"] in names]
+
+
+def turn_input(registry, case: dict, message: str, first: bool) -> dict:
+    # Same shape the server builds: dataset references in the message, handles in state
+    datasets = [registry.register_file(os.path.join(CORPUS_DIR, name)) for name in case.get("datasets", [])] if first else []
+    content = "\n".join([message] + [d.reference() for d in datasets])
+    return {"messages": [HumanMessage(content=content)], "datasets": [d.handle for d in datasets]}
+
+
+def check(case: dict, answers: list[str]) -> bool:
+    text = "\n".join(a for a in answers if a)
+    return all(expected in text for expected in case.get("expect", []))
+
+
+def run_case(app, fixtures, registry, case: dict, record: bool) -> dict:
+    thread_id = f"bench-{case['id']}-{uuid.uuid4().hex[:8]}"
+    fixtures.bind(thread_id, case["id"], record=record)
+    config = {"configurable": {"thread_id": thread_id}}
+    t0 = time.perf_counter()
+    attempts, answers, errors = 0, [], []
+    for i, message in enumerate(case["turns"]):
+        fixtures.start_turn(thread_id)
+        state = app.invoke(turn_input(registry, case, message, i == 0), config)
+        attempts += state.get("attempts") or 0
+        answers.append(state.get("answer"))
+        errors.append(state.get("system_error") or (state.get("agent_error") if not state.get("answer") else None))
+    return finish(fixtures, case, thread_id, t0, attempts, answers, errors)
+
+
+async def arun_case(app, fixtures, registry, case: dict) -> dict:
+    thread_id = f"bench-{case['id']}-{uuid.uuid4().hex[:8]}"
+    fixtures.bind(thread_id, case["id"])
+    config = {"configurable": {"thread_id": thread_id}}
+    t0 = time.perf_counter()
+    attempts, answers, errors = 0, [], []
+    for i, message in enumerate(case["turns"]):
+        fixtures.start_turn(thread_id)
+        state = await app.ainvoke(await asyncio.to_thread(turn_input, registry, case, message, i == 0), config)
+        attempts += state.get("attempts") or 0
+        answers.append(state.get("answer"))
+        errors.append(state.get("system_error") or (state.get("agent_error") if not state.get("answer") else None))
+    return finish(fixtures, case, thread_id, t0, attempts, answers, errors)
+
+
+def finish(fixtures, case, thread_id, t0, attempts, answers, errors) -> dict:
+    wall_ms = (time.perf_counter() - t0) * 1000
+    spent = fixtures.spent(thread_id)
+    code_turns = sum(1 for a in answers if a) or 1
+    return {
+        "case": case["id"], "turns": len(case["turns"]), "wall_ms": wall_ms,
+        "overhead_ms": wall_ms - spent["llm_ms"] - spent["sandbox_ms"],
+        # attempts counts executions, so everything past the first per analysed turn is a retry
+        "retries": max(0, attempts - code_turns) if any(answers) else attempts,
+        "ok": check(case, answers), "error": next((e for e in errors if e), None),
+    }
+
+
+def report(level: int, results: list[dict], wall: float) -> None:
+    turns = sum(r["turns"] for r in results)
+    per_turn = sorted(r["wall_ms"] / r["turns"] for r in results)
+    overhead = [r["overhead_ms"] / r["turns"] for r in results]
+    print(f"concurrency {level:3d}: {turns / wall:6.2f} turns/s  turn p50 {statistics.median(per_turn):7.1f}ms  "
+          f"p95 {per_turn[min(len(per_turn) - 1, int(len(per_turn) * 0.95))]:7.1f}ms  "
+          f"overhead/turn {statistics.mean(overhead):6.1f}ms  retries/case {statistics.mean(r['retries'] for r in results):.2f}  "
+          f"correct {sum(r['ok'] for r in results)}/{len(results)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", default="", help="comma separated case ids (default: all)")
+    parser.add_argument("--concurrency", default="1,4", help="comma separated concurrency levels")
+    parser.add_argument("--repeat", type=int, default=2, help="runs of the whole corpus per level")
+    parser.add_argument("--latency", default="0", help='seconds per replayed LLM call, or "recorded"')
+    parser.add_argument("--sandbox", choices=("local", "replay"), default="local")
+    parser.add_argument("--backend", default="local", help="backend that executes sandbox calls (local, procpool, ...)")
+    parser.add_argument("--graph", choices=("sync", "async"), default="sync")
+    parser.add_argument("--record-llm", action="store_true", help="call the live models and rewrite their fixtures")
+    parser.add_argument("--record-sandbox", action="store_true", help="execute on --backend and store the results")
+    parser.add_argument("--no-warmup", action="store_true", help="measure the first pass (ingestion, imports) too")
+    parser.add_argument("--verbose", action="store_true", help="one line per case run")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    recording = args.record_llm or args.record_sandbox
+    if recording:
+        levels, args.repeat = [1], 1
+    bench_env(max(levels))
+
+    import resources
+    from backends import get_backend
+    from replay import Fixtures, ReplayBackend, recording_models, replay_models
+    from sandbox_pool import SandboxPool
+
+    fixtures = Fixtures()
+    if args.record_llm:
+        resources.set_models(recording_models(fixtures, resources.get_models()))
+    else:
+        resources.set_models(replay_models(fixtures, args.latency if args.latency == "recorded" else float(args.latency)))
+    mode = "record" if args.record_sandbox else "replay" if args.sandbox == "replay" else "live"
+    resources.set_pool(SandboxPool.from_env(ReplayBackend(get_backend(args.backend), fixtures, mode)))
+    registry = resources.get_registry()
+    import agent
+    import agent_async
+
+    cases = load_cases([c for c in args.cases.split(",") if c])
+    print(f"{len(cases)} cases, {sum(len(c['turns']) for c in cases)} turns, graph={args.graph}, "
+          f"sandbox={'record' if args.record_sandbox else args.sandbox} ({args.backend}), latency={args.latency}")
+    if not recording and not args.no_warmup:
+        # Dataset ingestion and first imports happen once per process; keep them out of the levels
+        for case in cases:
+            run_case(agent.app, fixtures, registry, case, False)
+    for level in levels:
+        runs = [case for _ in range(args.repeat) for case in cases]
+        t0 = time.perf_counter()
+        if args.graph == "async":
+            async def run_all():
+                gate = asyncio.Semaphore(level)
+
+                async def one(case):
+                    async with gate:
+                        return await arun_case(agent_async.app, fixtures, registry, case)
+                return await asyncio.gather(*(one(case) for case in runs))
+            results = asyncio.run(run_all())
+        else:
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                results = list(pool.map(lambda case: run_case(agent.app, fixtures, registry, case, args.record_llm), runs))
+        if args.verbose:
+            for r in results:
+                print(f"  {r['case']:22} {r['wall_ms']:8.1f}ms  overhead {r['overhead_ms']:7.1f}ms  retries {r['retries']}  "
+                      f"{'ok' if r['ok'] else 'WRONG'}{'  ' + r['error'][:80] if r['error'] else ''}")
+        report(level, results, time.perf_counter() - t0)
+    print(f"fixtures: {fixtures.stats}")
+    if recording:
+        fixtures.save([c["id"] for c in cases] if args.record_llm else [])
+    resources.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Time-to-first-byte of a code_gen request: blocking invoke vs streaming.
+
+The generated code prints progress for a couple of seconds, and the summarizer
+is a fake chat model that emits tokens one at a time. Sandboxes use the
+local subprocess backend. Each mode reports how long the client waits before
+it sees anything, before the first line of sandbox output, before the first
+summary token, and for the whole answer.
+
+    python benchmarks/ttfb.py --runs 3 --steps 5 --step-delay 0.4
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+SLOW_CODE = """
+import time
+for step in range({steps}):
+    print(f"processed chunk {{step + 1}}/{steps}", flush=True)
+    time.sleep({delay})
+result = [{{'question': 'total', 'answer': sum(range(100))}}]
+print(result)
+"""
+
+
+def request() -> tuple[dict, dict]:
+    state = {"messages": [HumanMessage(content=f"Sum the numbers 0..99 ({uuid.uuid4().hex})")]}
+    return state, {"configurable": {"thread_id": f"ttfb-{uuid.uuid4().hex[:8]}"}}
+
+
+def run_blocking(app) -> dict:
+    t0 = time.perf_counter()
+    app.invoke(*request())
+    total = time.perf_counter() - t0
+    return {"first_event": total, "first_output": total, "first_token": total, "total": total}
+
+
+def run_streaming(app) -> dict:
+    marks: dict[str, float] = {}
+    t0 = time.perf_counter()
+    for mode, payload in app.stream(*request(), stream_mode=["custom", "messages"]):
+        now = time.perf_counter() - t0
+        marks.setdefault("first_event", now)
+        if mode == "custom" and payload.get("type") == "output":
+            marks.setdefault("first_output", now)
+        elif mode == "messages":
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") == "summarizer" and chunk.content:
+                marks.setdefault("first_token", now)
+    marks["total"] = time.perf_counter() - t0
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=5, help="progress lines the generated code prints")
+    parser.add_argument("--step-delay", type=float, default=0.4, help="seconds between progress lines")
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per non-streaming LLM call")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SANDBOX_BACKEND": "local",
+        "SANDBOX_POOL_MIN": "0",
+        "FAST_ROUTER": "0",
+        "CODE_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "code_cache.sqlite"),
+        "RESULT_STORE": os.path.join(tempfile.mkdtemp(), "results"),
+    })
+    import agent
+    import resources
+    import streaming
+    from fakes import StreamingFakeChat, fake_models
+
+    code = SLOW_CODE.format(steps=args.steps, delay=args.step_delay)
+    resources.set_models(fake_models(args.latency, code)._replace(summarizer=StreamingFakeChat()))
+
+    modes = [
+        ("blocking", True, run_blocking),
+        ("stream, one-shot exec", False, run_streaming),
+        ("stream, session logs", True, run_streaming),
+    ]
+    print(f"{'mode':>22}  {'first event':>11}  {'first stdout':>12}  {'first token':>11}  {'total':>7}")
+    for label, stream_exec, run in modes:
+        streaming.STREAM_EXECUTION = stream_exec
+        results = [run(agent.app) for _ in range(args.runs)]
+        row = {k: statistics.mean(r.get(k, float("nan")) for r in results)
+               for k in ("first_event", "first_output", "first_token", "total")}
+        print(f"{label:>22}  {row['first_event']:10.2f}s  {row['first_output']:11.2f}s  "
+              f"{row['first_token']:10.2f}s  {row['total']:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
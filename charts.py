@@ -0,0 +1,102 @@
+import base64
+import contextvars
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def _candidates(name: str) -> list[str]:
+    # Generator is told to save under charts/, but often lists bare file names
+    return [name] if name.startswith("charts/") else [name, f"charts/{name}"]
+
+
+class ChartTransfer:
+    """Moves chart files out of the sandbox without blocking the graph.
+
+    `start` kicks off the transfer when execution succeeds; `collect` is called
+    by the summarizer after its LLM call, so the two overlap. Graph state only
+    holds {name, path} references; `inline` adds the base64 payloads for a response.
+    """
+
+    def __init__(self, out_dir: str | None = None, max_parallel: int | None = None, inline: bool | None = None):
+        self.out_dir = out_dir or os.getenv("CHARTS_DIR", "charts_out")
+        self.max_parallel = max_parallel or int(os.getenv("CHARTS_MAX_PARALLEL", "4"))
+        self.inline = inline if inline is not None else os.getenv("CHARTS_INLINE", "1").lower() in ("1", "true")
+        self._executor = ThreadPoolExecutor(max_workers=self.max_parallel * 2, thread_name_prefix="charts")
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, sandbox, names: list[str]) -> dict[str, bytes]:
+        if not names:
+            return {}
+        if hasattr(sandbox.fs, "download_files"):
+            return self._fetch_batch(sandbox, names)
+        return self._fetch_parallel(sandbox, names)
+
+    def _fetch_batch(self, sandbox, names: list[str]) -> dict[str, bytes]:
+        from daytona import FileDownloadRequest
+        requests = [FileDownloadRequest(source=path) for name in names for path in _candidates(name)]
+        results = {r.source: r.result for r in sandbox.fs.download_files(requests) if not r.error and r.result}
+        charts = {}
+        for name in names:
+            for path in _candidates(name):
+                if isinstance(results.get(path), bytes):
+                    charts[name] = results[path]
+                    break
+        return charts
+
+    def _fetch_parallel(self, sandbox, names: list[str]) -> dict[str, bytes]:
+        def one(name):
+            for path in _candidates(name):
+                try:
+                    return name, sandbox.fs.download_file(path)
+                except Exception:
+                    continue
+            return name, None
+
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(names))) as pool:
+            return {name: data for name, data in pool.map(one, names) if data}
+
+    def store(self, thread_id: str, charts: dict[str, bytes]) -> list[dict]:
+        directory = os.path.join(self.out_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", thread_id))
+        os.makedirs(directory, exist_ok=True)
+        stored = []
+        for name, data in charts.items():
+            path = os.path.join(directory, os.path.basename(name))
+            with open(path, "wb") as f:
+                f.write(data)
+            stored.append({"name": os.path.basename(name), "path": path})
+        return stored
+
+    def with_data(self, charts: list[dict]) -> list[dict]:
+        # Payloads are read back from disk so they never end up in a checkpoint
+        if not self.inline:
+            return charts
+        inlined = []
+        for chart in charts:
+            try:
+                with open(chart["path"], "rb") as f:
+                    inlined.append({**chart, "data": base64.b64encode(f.read()).decode()})
+            except OSError:
+                inlined.append(chart)
+        return inlined
+
+    def start(self, thread_id: str, sandbox, names: list[str]) -> Future:
+        # Run in the caller's context so the download spans keep their node/attempt tags
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, lambda: self.store(thread_id, self.fetch(sandbox, names)))
+        with self._lock:
+            self._pending[thread_id] = future
+        return future
+
+    def collect(self, thread_id: str, timeout: float | None = 120) -> list[dict]:
+        with self._lock:
+            future = self._pending.pop(thread_id, None)
+        if future is None:
+            return []
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Chart transfer failed for thread {thread_id}: {e}")
+            return []
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question or "").strip().lower()
+    return question.rstrip(" ?.!")
+
+
+def dataset_fingerprint(parts: list[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(parts)).encode()).hexdigest()[:16] if parts else ""
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class CodeCache:
+    """Persistent cache of successful GeneratorOutput results.
+
+    Keyed on the normalized question plus a dataset fingerprint. An optional
+    `embed` callable enables a similarity tier restricted to the same dataset.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_entries: int = 500,
+                 embed: Callable[[str], list[float]] | None = None, similarity: float = 0.92):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS code_cache (
+                key TEXT PRIMARY KEY, fingerprint TEXT, question TEXT, output TEXT,
+                embedding TEXT, created_at REAL, last_used REAL)""")
+
+    @classmethod
+    def from_env(cls, embed: Callable[[str], list[float]] | None = None) -> "CodeCache":
+        return cls(
+            os.getenv("CODE_CACHE_PATH", ".cache/code_cache.sqlite"),
+            ttl=float(os.getenv("CODE_CACHE_TTL", str(7 * 24 * 3600))),
+            max_entries=int(os.getenv("CODE_CACHE_MAX_ENTRIES", "500")),
+            embed=embed,
+            similarity=float(os.getenv("CODE_CACHE_SIMILARITY", "0.92")),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def key(question: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\x00{normalize_question(question)}".encode()).hexdigest()
+
+    def get(self, question: str, fingerprint: str) -> tuple[str, dict, str] | None:
+        key = self.key(question, fingerprint)
+        cutoff = time.time() - self.ttl
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT output FROM code_cache WHERE key = ? AND created_at >= ?",
+                             (key, cutoff)).fetchone()
+            if row:
+                db.execute("UPDATE code_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                return key, json.loads(row[0]), "exact"
+            if self.embed is None:
+                return None
+            candidates = db.execute(
+                "SELECT key, output, embedding FROM code_cache WHERE fingerprint = ? AND created_at >= ? "
+                "AND embedding IS NOT NULL", (fingerprint, cutoff)).fetchall()
+        if not candidates:
+            return None
+
+        vector = self.embed(normalize_question(question))
+        best_key, best_output, best_score = None, None, 0.0
+        for cand_key, output, embedding in candidates:
+            score = _cosine(vector, json.loads(embedding))
+            if score > best_score:
+                best_key, best_output, best_score = cand_key, output, score
+        if best_score < self.similarity:
+            return None
+        with self._lock, self._connect() as db:
+            db.execute("UPDATE code_cache SET last_used = ? WHERE key = ?", (time.time(), best_key))
+        return best_key, json.loads(best_output), "semantic"
+
+    def put(self, question: str, fingerprint: str, output: dict) -> str:
+        key = self.key(question, fingerprint)
+        embedding = json.dumps(self.embed(normalize_question(question))) if self.embed else None
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO code_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (key, fingerprint, normalize_question(question), json.dumps(output), embedding, now, now))
+            self._evict(db)
+        return key
+
+    def invalidate(self, key: str) -> None:
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM code_cache WHERE key = ?", (key,))
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM code_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        db.execute("""DELETE FROM code_cache WHERE key NOT IN (
+            SELECT key FROM code_cache ORDER BY last_used DESC LIMIT ?)""", (self.max_entries,))
@@ -0,0 +1,221 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+
+SANDBOX_DATA_DIR = "data"
+SAMPLE_ROWS = 5
+PROFILE_ROWS = 1000
+
+_FENCED = re.compile(r"```(?:csv)?[ \t]*\n(.*?)```", re.DOTALL)
+
+
+@dataclass
+class Dataset:
+    handle: str
+    sha256: str
+    name: str
+    path: str  # location inside the sandbox, relative to its working dir
+    size: int
+    columns: list[str] = field(default_factory=list)
+    dtypes: dict[str, str] = field(default_factory=dict)
+    n_rows: int = 0
+    sample: list[list[str]] = field(default_factory=list)
+    columnar_path: str | None = None
+    profile: dict | None = None
+
+    @property
+    def loader(self) -> str:
+        path = self.columnar_path or self.path
+        if path.endswith(".parquet"):
+            return f'pd.read_parquet("{path}")'
+        if path.endswith(".pkl"):
+            return f'pd.read_pickle("{path}")'
+        if path.endswith((".xlsx", ".xls")):
+            return f'pd.read_excel("{path}")'
+        return f'pd.read_csv("{path}")'
+
+    def describe(self) -> str:
+        if self.profile:
+            cols = "\n".join(f"- {c}: {', '.join(f'{k}={v}' for k, v in info.items())}"
+                             for c, info in self.profile["columns"].items())
+        else:
+            cols = "\n".join(f"- {c}: dtype={self.dtypes.get(c, 'str')}" for c in self.columns)
+        sample = "\n".join(",".join(row) for row in [self.columns] + self.sample)
+        return (f"Dataset {self.handle} ({self.name}, {self.n_rows} rows, {self.size} bytes)\n"
+                f"File: {self.columnar_path or self.path}\nLoad with: df = {self.loader}\n"
+                f"Columns:\n{cols}\nSample:\n{sample}")
+
+    def reference(self) -> str:
+        return f"[dataset {self.handle}: {self.name}, {self.n_rows} rows, columns: {', '.join(self.columns)}]"
+
+
+def _infer_type(values: list[str]) -> str:
+    values = [v for v in values if v != ""]
+    if not values:
+        return "str"
+    for name, cast in (("int", int), ("float", float)):
+        try:
+            for v in values:
+                cast(v)
+            return name
+        except ValueError:
+            continue
+    return "str"
+
+
+def _width(line: str) -> int:
+    return len(next(csv.reader([line]), []))
+
+
+def _looks_like_csv(lines: list[str]) -> bool:
+    if len(lines) < 3:
+        return False
+    widths = {len(row) for row in csv.reader(lines)}
+    return len(widths) == 1 and widths.pop() >= 2
+
+
+class DatasetRegistry:
+    """Content-addressed store for user data.
+
+    Each dataset is kept once on local disk and uploaded once per sandbox;
+    prompts carry only its handle, schema and a short sample.
+    """
+
+    def __init__(self, store_dir: str | None = None):
+        self.store_dir = store_dir or os.getenv("DATASET_STORE", ".cache/datasets")
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._datasets: dict[str, Dataset] = {}
+        self._uploaded: dict[str, set[str]] = {}  # sandbox id -> sandbox paths already uploaded
+        self._lock = threading.Lock()
+
+    def local_path(self, dataset: Dataset) -> str:
+        return os.path.join(self.store_dir, os.path.basename(dataset.columnar_path or dataset.path))
+
+    def register(self, content: bytes, name: str = "data.csv") -> Dataset:
+        sha = hashlib.sha256(content).hexdigest()
+        handle = f"ds_{sha[:12]}"
+        try:
+            # Falls back to the record on disk, so a restart keeps the ingested profile and columnar copy
+            return self.get(handle)
+        except KeyError:
+            pass
+        ext = os.path.splitext(name)[1].lower() or ".csv"
+        dataset = Dataset(handle=handle, sha256=sha, name=name, path=f"{SANDBOX_DATA_DIR}/{sha}{ext}", size=len(content))
+        local = self.local_path(dataset)
+        if not os.path.exists(local):
+            with open(local, "wb") as f:
+                f.write(content)
+        if ext in (".csv", ".tsv", ".txt"):
+            self._profile_csv(dataset, local)  # quick local profile; ingestion replaces it with the full one
+        self._save(dataset)
+        return dataset
+
+    def register_file(self, path: str, name: str | None = None) -> Dataset:
+        with open(path, "rb") as f:
+            return self.register(f.read(), name or os.path.basename(path))
+
+    def get(self, handle: str) -> Dataset:
+        with self._lock:
+            if handle not in self._datasets:
+                meta = os.path.join(self.store_dir, f"{handle}.json")
+                if not os.path.exists(meta):
+                    raise KeyError(f"Unknown dataset handle '{handle}'")
+                with open(meta) as f:
+                    self._datasets[handle] = Dataset(**json.load(f))
+            return self._datasets[handle]
+
+    def ensure_uploaded(self, sandbox, handles: list[str]) -> list[Dataset]:
+        datasets = [self.get(h) for h in handles]
+        # Keyed by the artifact's path: a sandbox that got the raw file before ingestion
+        # finished still needs the columnar copy the prompts now point at
+        with self._lock:
+            uploaded = self._uploaded.setdefault(sandbox.id, set())
+            missing = [d for d in datasets if (d.columnar_path or d.path) not in uploaded]
+        if missing:
+            sandbox.process.exec(f"mkdir -p {SANDBOX_DATA_DIR}")
+            for dataset in missing:
+                # Once ingested, new sandboxes get the columnar copy and never parse the raw file
+                sandbox.fs.upload_file(self.local_path(dataset), dataset.columnar_path or dataset.path)
+            with self._lock:
+                uploaded.update(d.columnar_path or d.path for d in missing)
+        return datasets
+
+    def set_columnar(self, sandbox, dataset: Dataset, columnar_path: str, profile: dict) -> None:
+        local = os.path.join(self.store_dir, os.path.basename(columnar_path))
+        if not os.path.exists(local):
+            sandbox.fs.download_file(columnar_path, local)
+        dataset.columnar_path = columnar_path
+        dataset.profile = profile
+        dataset.n_rows = profile.get("n_rows", dataset.n_rows)
+        dataset.columns = dataset.columns or list(profile.get("columns", {}))
+        self._save(dataset)
+        with self._lock:
+            # Ingestion wrote the columnar file in this sandbox; no upload needed here
+            self._uploaded.setdefault(sandbox.id, set()).add(columnar_path)
+
+    def extract_inline(self, text: str) -> tuple[str, list[Dataset]]:
+        found: list[Dataset] = []
+
+        def replace_fenced(match: re.Match) -> str:
+            lines = match.group(1).strip().splitlines()
+            if not _looks_like_csv(lines):
+                return match.group(0)
+            found.append(self.register("\n".join(lines).encode(), f"inline_{len(found) + 1}.csv"))
+            return found[-1].reference()
+
+        text = _FENCED.sub(replace_fenced, text)
+
+        # Unfenced CSV: runs of 3+ consecutive lines that parse to the same width
+        out, block = [], []
+
+        def flush():
+            if _looks_like_csv(block):
+                found.append(self.register("\n".join(block).encode(), f"inline_{len(found) + 1}.csv"))
+                out.append(found[-1].reference())
+            else:
+                out.extend(block)
+            block.clear()
+
+        for line in text.splitlines():
+            tabular = "," in line and not line.rstrip().endswith((":", "?", "!", "."))
+            if block and tabular and _width(line) == _width(block[0]):
+                block.append(line)
+                continue
+            flush()
+            if tabular:
+                block.append(line)
+            else:
+                out.append(line)
+        flush()
+        return "\n".join(out), found
+
+    def _profile_csv(self, dataset: Dataset, local: str) -> None:
+        with open(local, newline="", encoding="utf-8", errors="replace") as f:
+            reader = csv.reader(f)
+            dataset.columns = next(reader, [])
+            head, n_rows = [], 0
+            for row in reader:
+                if n_rows < PROFILE_ROWS:
+                    head.append(row)
+                n_rows += 1
+        dataset.n_rows = n_rows
+        dataset.sample = head[:SAMPLE_ROWS]
+        dataset.dtypes = {c: _infer_type([r[i] for r in head if i < len(r)]) for i, c in enumerate(dataset.columns)}
+
+    def _save(self, dataset: Dataset) -> None:
+        with open(os.path.join(self.store_dir, f"{dataset.handle}.json"), "w") as f:
+            json.dump(asdict(dataset), f)
+        with self._lock:
+            self._datasets[dataset.handle] = dataset
+
+
+def describe_datasets(datasets: list[Dataset]) -> str:
+    if not datasets:
+        return ""
+    return "AVAILABLE DATASETS (load them from the file path; the data is not repeated here):\n\n" + \
+        "\n\n".join(d.describe() for d in datasets)
+
@@ -1,54 +1,27 @@
-from daytona import Daytona, CreateSandboxFromSnapshotParams, CodeLanguage
 from schema import GeneratorOutput, ReflectorOutput, ManagerOutput
-from pydantic import SecretStr
-import os
-from langchain_openai import ChatOpenAI
-
-sandbox = Daytona().find_one("CodeStore")
-
-def create_sandbox(name: str):
-    params = CreateSandboxFromSnapshotParams(name=name, language=CodeLanguage.PYTHON)
-    resp = sandbox = Daytona().create(params=params)
-    sandbox.process.exec("mkdir charts")
-    return resp
-
-def execute_code(code):
-    resp = sandbox.process.code_run(code)
-    if resp.exit_code != 0:
-        return {"error": f"Error: Code execution failed {resp.exit_code} {resp.result}"}
-    else:
-        return {"answer": resp.result}
-    
-def execute_cmd(cmd):
-    resp = sandbox.process.exec(cmd)
-    if resp.exit_code == 0:
-        return resp.result
-    else:
-        return {"error": f"Error: Cmd execution failed {resp.exit_code} {resp.result}"}
-    
-openrouter_config = {
-    "model": "inception/mercury-coder",
-    "base_url": "https://openrouter.ai/api/v1",
-    "api_key": SecretStr(os.getenv("OPENROUTER_API_KEY", ""))
-}
-
-lm_config = {
-    "model": "openai/gpt-oss-20b",
-    "base_url": "http://127.0.0.1:1234/v1", 
-    "api_key": SecretStr("OPENAI_API_KEY"),
-    "model_kwargs":{"response_format": {"type": "json_object"}}
-}
-def create_models(config: dict):
-    MANAGER = ChatOpenAI(**config).with_structured_output(ManagerOutput)
-    GENERATOR = ChatOpenAI(**config).with_structured_output(GeneratorOutput)
-    REFLECTOR = ChatOpenAI(**config).with_structured_output(ReflectorOutput)
-    SUMMARIZER = ChatOpenAI(**config)
-    return MANAGER, GENERATOR, REFLECTOR, SUMMARIZER
-
-
-def download_charts(chart_names: list[str]):
-    for chart_name in chart_names:
-        sandbox.fs.download_file(chart_name, chart_name)
-        print(f"Downloaded {chart_name}")
 
+# langchain_openai is imported by ModelFactory when a model is first built; it is
+# slow to import and this module is loaded by `import agent`. Sandboxes come from
+# the backends in backends.py.
+
+def create_models(factory):
+    MANAGER = factory.build("manager", ManagerOutput)
+    GENERATOR = factory.build("generator", GeneratorOutput)
+    # Raw message kept so fix cost (output tokens) can be traced
+    REFLECTOR = factory.build("reflector", ReflectorOutput, include_raw=True)
+    # stream_usage so streamed summaries still report token counts
+    SUMMARIZER = factory.build("summarizer", stream_usage=True)
+    # Later reflector attempts may go to a stronger model
+    REFLECTOR_TIERS = tuple((from_attempt, model, factory.build("reflector", ReflectorOutput, include_raw=True, model=model))
+                            for from_attempt, model in factory.escalations("reflector"))
+    return MANAGER, GENERATOR, REFLECTOR, SUMMARIZER, REFLECTOR_TIERS
+
+
+def create_candidate_generators(factory, temperatures: list[float], models: list[str] | None = None):
+    generators = []
+    for i, temperature in enumerate(temperatures):
+        model = models[i % len(models)] if models else factory.config["roles"]["generator"]["model"]
+        generator = factory.build("generator", GeneratorOutput, model=model, temperature=temperature)
+        generators.append((f"{model}@{temperature}", generator))
+    return generators
 
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+import shlex
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+# Successful ENVIRONMENT_FIX installs are remembered so new sandboxes get them
+# up front instead of failing, reflecting and installing again. Only install
+# commands are kept; anything else a fix ran is one-off and not safe to replay.
+
+_PIP = re.compile(r"^(?:uv\s+)?(?:python3?\s+-m\s+)?pip3?\s+install\s+(.*)$")
+_APT = re.compile(r"^(?:sudo\s+)?apt(?:-get)?\s+(?:-\S+\s+)*install\s+")
+_MISSING = re.compile(r"No module named '([\w.]+)'")
+# pip flags that don't change what gets installed
+_PIP_FLAGS = {"-q", "--quiet", "-U", "--upgrade", "--no-cache-dir", "--user", "--break-system-packages",
+              "--disable-pip-version-check", "-y", "--yes"}
+# name[extras] with optional version constraints; no paths, URLs or VCS specs
+_PIP_SPEC = re.compile(r"^[A-Za-z0-9][\w.-]*(\[[\w.,-]+\])?([<>=!~]=?[\w.*+!-]+(,[<>=!~]=?[\w.*+!-]+)*)?$")
+_APT_PACKAGE = re.compile(r"^[a-z0-9][a-z0-9.+-]*(=[\w.:~+-]+)?$")
+
+
+def parse_installs(command: str) -> tuple[list[str], list[str]]:
+    # (pip requirements, other install commands) found in a shell command
+    packages, commands = [], []
+    for part in re.split(r"&&|;|\n", command):
+        part = part.strip()
+        if match := _PIP.match(part):
+            try:
+                args = shlex.split(match.group(1))
+            except ValueError:
+                continue
+            specs = [a for a in args if a not in _PIP_FLAGS]
+            # -r files, index URLs, paths and editable installs depend on the sandbox they ran in
+            if specs and all(_PIP_SPEC.match(a) for a in specs):
+                packages.extend(specs)
+        elif match := _APT.match(part):
+            try:
+                args = shlex.split(part[match.end():])
+            except ValueError:
+                continue
+            names = [a for a in args if not a.startswith("-")]
+            if names and all(_APT_PACKAGE.match(a) for a in names):
+                commands.append(part)
+    return packages, commands
+
+
+def missing_module(error: str | None) -> str | None:
+    match = _MISSING.search(error or "")
+    return match.group(1).split(".")[0] if match else None
+
+
+class EnvFixCache:
+    """Persistent record of install commands that fixed a sandbox environment.
+
+    Recorded installs are replayed when the pool provisions a sandbox, and the
+    most used pip packages can be baked into a snapshot so they cost nothing.
+    """
+
+    def __init__(self, path: str, max_replay: int = 20, bake_min_uses: int = 2):
+        self.path = path
+        self.max_replay = max_replay
+        self.bake_min_uses = bake_min_uses
+        self._lock = threading.Lock()
+        self._baker: threading.Thread | None = None
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS env_fixes (
+                kind TEXT, spec TEXT, module TEXT, uses INTEGER, created_at REAL, last_used REAL,
+                PRIMARY KEY (kind, spec))""")
+            db.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+                name TEXT PRIMARY KEY, packages TEXT, created_at REAL)""")
+
+    @classmethod
+    def from_env(cls) -> "EnvFixCache":
+        return cls(
+            os.getenv("ENV_FIX_PATH", ".cache/env_fixes.sqlite"),
+            max_replay=int(os.getenv("ENV_FIX_MAX_REPLAY", "20")),
+            bake_min_uses=int(os.getenv("ENV_FIX_BAKE_MIN_USES", "2")),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def record(self, command: str, error: str | None = None) -> int:
+        packages, commands = parse_installs(command)
+        module = missing_module(error)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            for kind, spec in [("pip", p) for p in packages] + [("cmd", c) for c in commands]:
+                db.execute("""INSERT INTO env_fixes VALUES (?, ?, ?, 1, ?, ?)
+                    ON CONFLICT (kind, spec) DO UPDATE SET uses = uses + 1, last_used = excluded.last_used,
+                    module = COALESCE(excluded.module, module)""", (kind, spec, module, now, now))
+        return len(packages) + len(commands)
+
+    def snapshot(self) -> tuple[str, set[str]] | None:
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT name, packages FROM snapshots ORDER BY created_at DESC LIMIT 1").fetchone()
+        return (row[0], set(json.loads(row[1]))) if row else None
+
+    def _replayed(self) -> list[tuple[str, str, str | None]]:
+        # (kind, spec, module) of the installs a new sandbox gets
+        with self._lock, self._connect() as db:
+            return db.execute("SELECT kind, spec, module FROM env_fixes ORDER BY uses DESC, last_used DESC LIMIT ?",
+                              (self.max_replay,)).fetchall()
+
+    def fixed_modules(self) -> set[str]:
+        # Modules that were once missing and that new sandboxes now get, replayed or baked in
+        baked = (self.snapshot() or (None, set()))[1]
+        with self._lock, self._connect() as db:
+            rows = db.execute("SELECT kind, spec, module FROM env_fixes WHERE module IS NOT NULL").fetchall()
+        replayed = set(self._replayed())
+        return {module for kind, spec, module in rows
+                if (kind, spec, module) in replayed or (kind == "pip" and spec in baked)}
+
+    def replay_commands(self, baked: set[str] = frozenset()) -> list[str]:
+        rows = [(kind, spec) for kind, spec, _ in self._replayed()]
+        packages = [spec for kind, spec in rows if kind == "pip" and spec not in baked]
+        commands = [spec for kind, spec in rows if kind == "cmd"]
+        # One pip call for every package instead of a round-trip each
+        return ([f"python3 -m pip install -q {' '.join(shlex.quote(p) for p in packages)}"] if packages else []) + commands
+
+    def replay(self, sandbox, baked: set[str] = frozenset()) -> bool:
+        commands = self.replay_commands(baked)
+        for command in commands:
+            with metrics.timer("env_fix_replay_ms"):
+                resp = sandbox.process.exec(command, timeout=600)
+            if resp.exit_code == 0:
+                metrics.inc("env_fix_replays")
+            else:
+                metrics.inc("env_fix_replay_failures")
+                print(f"Replaying environment fix failed ({resp.exit_code}): {command}")
+        return bool(commands)
+
+    def bake_candidates(self) -> list[str]:
+        current = self.snapshot()
+        with self._lock, self._connect() as db:
+            rows = db.execute("SELECT spec FROM env_fixes WHERE kind = 'pip' AND uses >= ?",
+                              (self.bake_min_uses,)).fetchall()
+        return [r[0] for r in rows if not current or r[0] not in current[1]]
+
+    def bake(self, backend) -> str | None:
+        # New snapshot = everything baked so far plus the packages that keep getting installed
+        candidates = self.bake_candidates()
+        if not candidates or not hasattr(backend, "bake_snapshot"):
+            return None
+        current = self.snapshot()
+        packages = sorted((current[1] if current else set()) | set(candidates))
+        name = f"analyst-env-{hashlib.sha256(' '.join(packages).encode()).hexdigest()[:10]}"
+        with metrics.timer("env_fix_bake_ms"):
+            backend.bake_snapshot(name, packages)
+        with self._lock, self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", (name, json.dumps(packages), time.time()))
+        metrics.inc("env_fix_snapshots")
+        return name
+
+    def start_baker(self, backend, interval: float) -> None:
+        if self._baker is not None or interval <= 0 or not hasattr(backend, "bake_snapshot"):
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.bake(backend)
+                except Exception as e:
+                    print(f"Snapshot bake failed: {e}")
+
+        self._baker = threading.Thread(target=loop, name="env-fix-baker", daemon=True)
+        self._baker.start()
+
+    def stats(self) -> dict:
+        counters = metrics.summary().get("counters", {})
+        first = counters.get("first_attempts", 0)
+        return {
+            "first_attempt_success_rate": round(counters.get("first_attempt_success", 0) / first, 3) if first else None,
+            "avoided_installs": counters.get("env_fix_avoided", 0),
+            "replays": counters.get("env_fix_replays", 0),
+            "snapshot": (self.snapshot() or (None,))[0],
+        }
@@ -0,0 +1,173 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+# Dataset references are routing context, not intent; keep them out of the features
+_DATASET_REF = re.compile(r"\[dataset ds_[0-9a-f]+:[^\]]*\]")
+_WORD = re.compile(r"[a-z0-9_]+")
+# The generator only sees the question, so a code_gen message that leans on earlier
+# turns needs the manager to rewrite it into a self-contained one
+_REFERS_BACK = re.compile(r"\b(that|it|them|this|these|those|same|again|instead)\b")
+
+GREETING_REPLY = "Hi! Upload or paste a dataset and ask me a question about it, and I'll run the analysis."
+THANKS_REPLY = "You're welcome! Let me know if you want to dig further into the data."
+BYE_REPLY = "Goodbye! Your results stay available in this conversation if you come back."
+
+# (decision, pattern, confidence, canned reply). Chats only take the fast path
+# when there's a canned reply, since the manager otherwise writes the response.
+RULES = [
+    ("chats", re.compile(r"^(hi|hii+|hello|hey|hey there|yo|good (morning|afternoon|evening))\W*$"), 0.98, GREETING_REPLY),
+    ("chats", re.compile(r"^(thanks|thank you|thx|ty|cheers|great,? thanks|thanks a lot)\W*$"), 0.98, THANKS_REPLY),
+    ("chats", re.compile(r"^(bye|goodbye|see you|see ya)\W*$"), 0.98, BYE_REPLY),
+    ("summarizer", re.compile(r"^(can you |could you |please )?(show|give|send|print)( me)? (the|your) (code|script)"
+                              r"( you (used|wrote|ran))?\W*$"), 0.95, None),
+    ("summarizer", re.compile(r"^(can you |could you |please )?(explain|interpret|summari[sz]e) (that|this|it|the (results?|output|answer|chart))\b"), 0.92, None),
+    ("summarizer", re.compile(r"^(what does|what do) (that|this|it|these|those)( numbers?| results?)? mean\b"), 0.92, None),
+    ("summarizer", re.compile(r"^how did you (get|calculate|compute|come up with)\b"), 0.92, None),
+    ("code_gen", re.compile(r"^(please |can you |could you )?(calculate|compute|plot|chart|visuali[sz]e|analy[sz]e|count|"
+                            r"sum|average|aggregate|group|rank|forecast|correlate|find the (top|bottom|total|average|mean))\b"), 0.9, None),
+]
+
+
+@dataclass
+class Route:
+    decision: str
+    confidence: float
+    tier: str  # rules | knn
+    reply: str | None = None
+
+
+def normalize(text: str) -> str:
+    return " ".join(_DATASET_REF.sub(" ", text).lower().split())
+
+
+def featurize(text: str, dims: int = 4096) -> dict[int, float]:
+    words = _WORD.findall(normalize(text))
+    # Words and bigrams for phrasing, character trigrams for inflections ("plot"/"plotting")
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    grams += [f"#{w[i:i + 3]}" for w in words if len(w) > 3 for i in range(len(w) - 2)]
+    vec: dict[int, float] = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode()) % dims
+        vec[bucket] = vec.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {k: v / norm for k, v in vec.items()} if norm else {}
+
+
+def _cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class FastRouter:
+    """Local routing tiers that run before the manager LLM.
+
+    Rules catch unambiguous phrasings; a nearest-neighbour vote over past
+    manager decisions catches paraphrases of them. Anything below
+    `threshold` returns None and goes to the LLM, whose decision is logged
+    as a new neighbour.
+    """
+
+    def __init__(self, log_path: str | None = None, threshold: float = 0.8, k: int = 5, min_similarity: float = 0.3,
+                 max_examples: int = 5000):
+        self.log_path = log_path
+        self.threshold = threshold
+        self.k = k
+        self.min_similarity = min_similarity
+        self.max_examples = max_examples
+        self._examples: list[tuple[dict[int, float], str, bool, bool]] = []
+        self._lock = threading.Lock()
+        if log_path and os.path.exists(log_path):
+            with open(log_path) as f:
+                for line in f:
+                    if line.strip():
+                        r = json.loads(line)
+                        self.add(r["text"], r["decision"], r.get("has_data", False), r.get("has_result", False))
+
+    @classmethod
+    def from_env(cls) -> "FastRouter":
+        return cls(
+            log_path=os.getenv("ROUTER_LOG", ".cache/routing_log.jsonl"),
+            threshold=float(os.getenv("ROUTER_THRESHOLD", "0.8")),
+            k=int(os.getenv("ROUTER_K", "5")),
+            min_similarity=float(os.getenv("ROUTER_MIN_SIMILARITY", "0.3")),
+        )
+
+    def route(self, text: str, has_data: bool = False, has_result: bool = False) -> Route | None:
+        route = self._rules(text, has_data, has_result) or self._knn(text, has_data, has_result)
+        if route and route.decision == "code_gen" and _REFERS_BACK.search(normalize(text)):
+            return None
+        return route if route and route.confidence >= self.threshold else None
+
+    def _rules(self, text: str, has_data: bool, has_result: bool) -> Route | None:
+        clean = normalize(text)
+        matches = [(decision, confidence, reply) for decision, pattern, confidence, reply in RULES if pattern.search(clean)]
+        decisions = {m[0] for m in matches}
+        if len(decisions) != 1:
+            return None
+        decision, confidence, reply = matches[0]
+        if not self._allowed(decision, has_data, has_result):
+            return None
+        return Route(decision, confidence, "rules", reply)
+
+    def _knn(self, text: str, has_data: bool, has_result: bool) -> Route | None:
+        vec = featurize(text)
+        if not vec:
+            return None
+        with self._lock:
+            examples = list(self._examples)
+        scored = sorted(((_cosine(vec, v), d, len(v)) for v, d, ex_data, ex_result in examples
+                        if (ex_data, ex_result) == (has_data, has_result)), reverse=True)[: self.k]
+        scored = [(sim, d, size) for sim, d, size in scored if sim >= self.min_similarity]
+        if not scored:
+            return None
+        # A lookalike with a clause tacked on ("show me the code" + "for a histogram of
+        # price") asks something else; paraphrases are about as long as their neighbour
+        if len(vec) > 1.5 * scored[0][2]:
+            return None
+        votes: dict[str, list[float]] = {}
+        for sim, decision, _ in scored:
+            votes.setdefault(decision, []).append(sim)
+        weights = sorted(((sum(sims), d) for d, sims in votes.items()), reverse=True)
+        total = sum(w for w, _ in weights)
+        decision = weights[0][1]
+        # Similarity-weighted vote share the winner holds over the runner-up...
+        margin = (weights[0][0] - (weights[1][0] if len(weights) > 1 else 0.0)) / total
+        # ...times how well its neighbours cover the message: one 0.9 lookalike or a few
+        # 0.6 paraphrases are strong evidence, a handful of 0.3 overlaps aren't
+        support = 1.0 - math.prod(1.0 - sim for sim in votes[decision])
+        confidence = margin * support
+        if decision == "chats" or not self._allowed(decision, has_data, has_result):
+            return None
+        return Route(decision, round(confidence, 3), "knn")
+
+    @staticmethod
+    def _allowed(decision: str, has_data: bool, has_result: bool) -> bool:
+        # Without data there's nothing to analyse; without a result there's nothing to explain
+        return not ((decision == "code_gen" and not has_data) or (decision == "summarizer" and not has_result))
+
+    def add(self, text: str, decision: str, has_data: bool = False, has_result: bool = False) -> None:
+        vec = featurize(text)
+        if not vec:
+            return
+        with self._lock:
+            self._examples.append((vec, decision, has_data, has_result))
+            if len(self._examples) > self.max_examples:
+                del self._examples[: len(self._examples) - self.max_examples]
+
+    def record(self, text: str, decision: str, has_data: bool = False, has_result: bool = False) -> None:
+        self.add(text, decision, has_data, has_result)
+        if not self.log_path:
+            return
+        record = {"text": normalize(text), "decision": decision, "has_data": has_data, "has_result": has_result,
+                  "ts": time.time()}
+        with self._lock:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
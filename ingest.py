@@ -0,0 +1,66 @@
+import json
+
+from datasets import Dataset, DatasetRegistry
+
+PROFILE_MARKER = "__PROFILE__"
+
+# Runs inside the sandbox. Parses the raw upload once, writes a columnar copy
+# next to it and prints a schema/statistics profile. Idempotent: if the
+# columnar file already exists it is read instead of the raw file.
+INGEST_SCRIPT = r'''
+import json, os
+import pandas as pd
+
+src, dst = {src!r}, {dst!r}
+try:
+    import pyarrow  # noqa: F401
+    fmt = "parquet"
+except ImportError:
+    fmt, dst = "pickle", os.path.splitext(dst)[0] + ".pkl"
+
+if os.path.exists(dst):
+    df = pd.read_parquet(dst) if fmt == "parquet" else pd.read_pickle(dst)
+else:
+    if src.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(src)
+    else:
+        df = pd.read_csv(src, sep=None if src.endswith(".txt") else ("\t" if src.endswith(".tsv") else ","),
+                         engine="pyarrow" if fmt == "parquet" and not src.endswith(".txt") else None)
+    for col in df.columns[df.dtypes == object]:
+        sample = df[col].dropna().head(1000)
+        if len(sample) and pd.to_datetime(sample, errors="coerce", format="mixed").notna().all():
+            df[col] = pd.to_datetime(df[col], errors="coerce", format="mixed")
+    if fmt == "parquet":
+        df.to_parquet(dst, index=False)
+    else:
+        df.to_pickle(dst)
+
+columns = {{}}
+for col in df.columns:
+    s = df[col]
+    info = {{"dtype": str(s.dtype), "nulls": int(s.isna().sum()), "unique": int(s.nunique())}}
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        info.update(min=float(s.min()) if s.notna().any() else None, max=float(s.max()) if s.notna().any() else None,
+                    mean=round(float(s.mean()), 4) if s.notna().any() else None)
+    elif pd.api.types.is_datetime64_any_dtype(s):
+        info.update(min=str(s.min()), max=str(s.max()))
+    else:
+        info["top"] = [str(v) for v in s.value_counts().head(5).index]
+    columns[str(col)] = info
+
+print("{marker}" + json.dumps({{"path": dst, "format": fmt, "n_rows": len(df), "columns": columns}}, default=str))
+'''
+
+
+def ingest(sandbox, registry: DatasetRegistry, handles: list[str]) -> list[Dataset]:
+    datasets = registry.ensure_uploaded(sandbox, handles)
+    for dataset in datasets:
+        if dataset.profile is not None:
+            continue
+        dst = dataset.path.rsplit(".", 1)[0] + ".parquet"
+        resp = sandbox.process.code_run(INGEST_SCRIPT.format(src=dataset.path, dst=dst, marker=PROFILE_MARKER))
+        if resp.exit_code != 0 or PROFILE_MARKER not in resp.result:
+            raise RuntimeError(f"Ingestion of {dataset.handle} failed: {resp.result[-2000:]}")
+        profile = json.loads(resp.result.split(PROFILE_MARKER, 1)[1].strip().splitlines()[0])
+        registry.set_columnar(sandbox, dataset, profile.pop("path"), profile)
+    return datasets
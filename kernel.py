@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+import time
+
+from backends import ExecResult
+from validation import parse_code
+
+# Installed once per interpreter context: memory cap plus a memo around the
+# pandas readers, so loaded DataFrames survive namespace resets and follow-ups.
+KERNEL_SETUP = r'''
+import os as __os, resource as __resource
+__limit = {memory_bytes}
+if __limit:
+    __resource.setrlimit(__resource.RLIMIT_AS, (__limit, __limit))
+__agent_done__ = []
+try:
+    import pandas as __pd
+
+    def __memoize(fn, cache={{}}):
+        def reader(path, *args, **kwargs):
+            try:
+                key = (fn.__name__, path, __os.path.getmtime(path), args, tuple(sorted(kwargs.items())))
+                hash(key)
+            except (TypeError, OSError):
+                return fn(path, *args, **kwargs)
+            if key not in cache:
+                cache[key] = fn(path, *args, **kwargs)
+            return cache[key].copy()
+        return reader
+
+    for __name in ("read_parquet", "read_csv", "read_pickle", "read_excel", "read_feather"):
+        setattr(__pd, __name, __memoize(getattr(__pd, __name)))
+except ImportError:
+    pass
+'''
+
+# Sent with every execution. Cells whose hashes match the already-executed
+# prefix are skipped; if an executed cell changed, its side effects can't be
+# trusted, so the namespace is cleared and everything re-runs.
+CELL_RUNNER = r'''
+__cells__ = {cells!r}
+__k__ = 0
+while __k__ < min(len(__cells__), len(__agent_done__)) and __cells__[__k__][0] == __agent_done__[__k__]:
+    __k__ += 1
+if __k__ < len(__agent_done__) or __k__ == len(__cells__):
+    for __n__ in [n for n in list(globals()) if not n.startswith("__")]:
+        del globals()[__n__]
+    __agent_done__.clear()
+    __k__ = 0
+elif __k__:
+    import sys as __sys
+    print(f"[kernel] reusing state from {{__k__}} unchanged cell(s)", file=__sys.stderr)
+for __h__, __src__ in __cells__[__k__:]:
+    exec(compile(__src__, f"<cell {{len(__agent_done__)}}>", "exec"), globals())
+    __agent_done__.append(__h__)
+'''
+
+
+def split_cells(code: str) -> list[tuple[str, str]]:
+    # Concurrent kernel runs parse at the same time; parse_code serialises ast.parse
+    tree = parse_code(code)
+    lines = code.splitlines(keepends=True)
+    cells, start = [], 0
+    for node in tree.body:
+        end = node.end_lineno
+        src = "".join(lines[start:end])
+        cells.append((hashlib.sha1(src.encode()).hexdigest()[:16], src))
+        start = end
+    if cells and start < len(lines):
+        h, src = cells[-1]
+        src += "".join(lines[start:])
+        cells[-1] = (hashlib.sha1(src.encode()).hexdigest()[:16], src)
+    return cells
+
+
+class KernelSession:
+    def __init__(self, sandbox, memory_mb: int, timeout: int):
+        self.sandbox = sandbox
+        self.timeout = timeout
+        self.context = sandbox.code_interpreter.create_context()
+        self.last_used = time.monotonic()
+        setup = sandbox.code_interpreter.run_code(
+            KERNEL_SETUP.format(memory_bytes=memory_mb * 1024 * 1024), context=self.context, timeout=timeout)
+        if setup.error:
+            raise RuntimeError(f"Kernel setup failed: {setup.error.name}: {setup.error.value}")
+
+    def run(self, code: str, on_output=None) -> ExecResult:
+        self.last_used = time.monotonic()
+        try:
+            cells = split_cells(code)
+        except SyntaxError as e:
+            return ExecResult(exit_code=1, result=f"SyntaxError: {e}")
+        streams = {}
+        if on_output:
+            streams = {"on_stdout": lambda msg: on_output("stdout", msg.output),
+                       "on_stderr": lambda msg: on_output("stderr", msg.output)}
+        resp = self.sandbox.code_interpreter.run_code(
+            CELL_RUNNER.format(cells=cells), context=self.context, timeout=self.timeout, **streams)
+        output = resp.stdout + (resp.stderr or "")
+        if resp.error:
+            return ExecResult(exit_code=1, result=f"{output}\n{resp.error.traceback or f'{resp.error.name}: {resp.error.value}'}")
+        return ExecResult(exit_code=0, result=resp.stdout)
+
+    def close(self) -> None:
+        try:
+            self.sandbox.code_interpreter.delete_context(self.context)
+        except Exception as e:
+            print(f"Failed to delete kernel context: {e}")
+
+
+class KernelManager:
+    """One long-lived interpreter context per graph thread."""
+
+    def __init__(self, memory_mb: int | None = None, timeout: int | None = None):
+        self.memory_mb = memory_mb if memory_mb is not None else int(os.getenv("KERNEL_MEMORY_MB", "4096"))
+        self.timeout = timeout if timeout is not None else int(os.getenv("KERNEL_TIMEOUT", "600"))
+        self._sessions: dict[str, KernelSession] = {}
+        self._lock = threading.Lock()
+
+    def run(self, thread_id: str, sandbox, code: str, on_output=None) -> ExecResult:
+        with self._lock:
+            session = self._sessions.get(thread_id)
+            if session is not None and session.sandbox is not sandbox:
+                self._sessions.pop(thread_id).close()
+                session = None
+        if session is None:
+            session = KernelSession(sandbox, self.memory_mb, self.timeout)
+            with self._lock:
+                self._sessions[thread_id] = session
+        result = session.run(code, on_output)
+        if result.exit_code != 0 and ("KernelDied" in result.result or "MemoryError" in result.result
+                                      or "TimeoutError" in result.result):
+            # The interpreter is gone or unusable; the next run starts a fresh one
+            self.close(thread_id)
+        return result
+
+    def forget(self, thread_id: str, sandbox=None) -> None:
+        # The sandbox was stopped and its context died with it; deleting it remotely would restart it
+        with self._lock:
+            self._sessions.pop(thread_id, None)
+
+    def close(self, thread_id: str, sandbox=None) -> None:
+        with self._lock:
+            session = self._sessions.pop(thread_id, None)
+        if session is not None:
+            session.close()
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from telemetry import Traced, telemetry
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sandbox-lifecycle")
+
+
+def background(fn, *args, **kwargs) -> Future:
+    return _executor.submit(fn, *args, **kwargs)
+
+
+def _state_name(state) -> str:
+    return str(getattr(state, "value", state) or "unknown").lower()
+
+
+class ManagedSandbox:
+    """Wraps a sandbox and tracks its lifecycle state locally.
+
+    Remote start/stop/archive calls are only issued on real transitions; any
+    access to `process`/`fs` brings the sandbox up first if it was stopped.
+    """
+
+    def __init__(self, sandbox, auto_stop: float | None = None, auto_archive: float | None = None,
+                 async_factory=None):
+        self.raw = sandbox
+        self.async_factory = async_factory  # coroutine fn returning the SDK's native async handle
+        self._async_handle = None
+        self.auto_stop = float(os.getenv("SANDBOX_AUTO_STOP", "900")) if auto_stop is None else auto_stop
+        self.auto_archive = float(os.getenv("SANDBOX_AUTO_ARCHIVE", "0")) if auto_archive is None else auto_archive
+        self.lifecycle_state = _state_name(getattr(sandbox, "state", "started"))
+        self.last_activity = time.monotonic()
+        self.start_rtt_ms = 0.0  # moving average of observed start() round-trips
+        self._lock = threading.RLock()
+        self._pending: Future | None = None
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    @property
+    def process(self):
+        return self._traced("process")
+
+    @property
+    def fs(self):
+        return self._traced("fs")
+
+    @property
+    def code_interpreter(self):
+        return self._traced("code_interpreter")
+
+    def _traced(self, name: str):
+        # Time spent waiting for a stopped sandbox to come up counts as the call's queue time
+        t0 = time.perf_counter()
+        self.ensure_started()
+        target = getattr(self.raw, name)
+        if not telemetry.enabled:
+            return target
+        return Traced(target, "sandbox", name, queue_ms=(time.perf_counter() - t0) * 1000)
+
+    def touch(self) -> None:
+        self.last_activity = time.monotonic()
+
+    def ensure_started(self) -> float:
+        self.touch()
+        if self.lifecycle_state == "started":
+            return 0.0
+        with self._lock:
+            if self.lifecycle_state == "started":
+                return 0.0
+            t0 = time.perf_counter()
+            self.raw.start()
+            elapsed = (time.perf_counter() - t0) * 1000
+            self.lifecycle_state = "started"
+            self.start_rtt_ms = elapsed if not self.start_rtt_ms else 0.8 * self.start_rtt_ms + 0.2 * elapsed
+            return elapsed
+
+    def start_async(self) -> Future:
+        if self.lifecycle_state == "started":
+            self.touch()
+            done = Future()
+            done.set_result(0.0)
+            return done
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                self._pending = _executor.submit(self.ensure_started)
+            return self._pending
+
+    async def aensure_started(self) -> float:
+        if self.lifecycle_state == "started":
+            self.touch()
+            return 0.0
+        return await asyncio.wrap_future(self.start_async())
+
+    async def _aio(self):
+        if self._async_handle is None and self.async_factory is not None:
+            self._async_handle = await self.async_factory(self.raw)
+        return self._async_handle
+
+    async def aexec(self, command: str):
+        return await self._acall("exec", command)
+
+    async def _acall(self, method: str, arg: str):
+        t0 = time.perf_counter()
+        await self.aensure_started()
+        handle = await self._aio()
+        waited = round((time.perf_counter() - t0) * 1000, 1) or None
+        with telemetry.span("sandbox", f"process.{method}", queue_ms=waited) as span:
+            if handle is not None:
+                resp = await getattr(handle.process, method)(arg)
+            else:
+                resp = await asyncio.to_thread(getattr(self.raw.process, method), arg)
+            span["exit_code"] = getattr(resp, "exit_code", None)
+            return resp
+
+    def stop(self) -> None:
+        with self._lock:
+            if self.lifecycle_state != "started":
+                return
+            self.raw.stop()
+            self.lifecycle_state = "stopped"
+
+    def archive(self) -> None:
+        with self._lock:
+            if self.lifecycle_state == "archived" or not hasattr(self.raw, "archive"):
+                return
+            if self.lifecycle_state == "started":
+                self.raw.stop()
+            self.raw.archive()
+            self.lifecycle_state = "archived"
+
+    def refresh_data(self) -> None:
+        self.raw.refresh_data()
+        with self._lock:
+            self.lifecycle_state = _state_name(self.raw.state)
+
+    def apply_idle_policy(self, now: float | None = None) -> str | None:
+        idle = (now or time.monotonic()) - self.last_activity
+        if self.auto_archive and idle > self.auto_archive and self.lifecycle_state != "archived":
+            self.archive()
+            return "archived"
+        if self.auto_stop and idle > self.auto_stop and self.lifecycle_state == "started":
+            self.stop()
+            return "stopped"
+        return None
@@ -0,0 +1,142 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(message: BaseMessage | str) -> int:
+    if isinstance(message, str):
+        text = message
+    else:
+        text = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=())) + 4
+    return len(text) // 4 + 4
+
+
+@dataclass
+class _ThreadMemory:
+    summary: str = ""
+    covered: int = 0  # number of leading messages folded into the summary
+    updating: bool = False
+
+
+class ConversationMemory:
+    """Token-budgeted view of a thread's message history.
+
+    The most recent turns that fit `budget` are sent verbatim; everything older
+    is folded into a rolling summary that is refreshed in the background, so
+    no turn waits on it.
+    """
+
+    def __init__(self, summarize, budget: int | None = None):
+        self.summarize = summarize  # (previous_summary, new_messages) -> summary
+        self.budget = budget or int(os.getenv("MEMORY_TOKEN_BUDGET", "3000"))
+        self._threads: dict[str, _ThreadMemory] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+
+    def context(self, thread_id: str, messages: list[BaseMessage], summary: str | None = None,
+                covered: int = 0) -> list[BaseMessage]:
+        with self._lock:
+            # State from a checkpoint seeds the memory after a restart
+            mem = self._threads.setdefault(thread_id, _ThreadMemory(summary or "", covered or 0))
+
+        window, used = [], 0
+        for message in reversed(messages):
+            tokens = count_tokens(message)
+            if window and used + tokens > self.budget:
+                break
+            window.insert(0, message)
+            used += tokens
+        start = len(messages) - len(window)
+
+        with self._lock:
+            if start > mem.covered and not mem.updating:
+                mem.updating = True
+                self._executor.submit(self._fold, mem, messages[mem.covered:start], start)
+            prefix = [SystemMessage(content=f"Summary of the earlier conversation:\n{mem.summary}")] if mem.summary else []
+        return prefix + window
+
+    def snapshot(self, thread_id: str) -> dict:
+        mem = self._threads.get(thread_id)
+        return {"conversation_summary": mem.summary, "summarized_count": mem.covered} if mem else {}
+
+    def wait(self, timeout: float | None = None) -> None:
+        deadline = time.monotonic() + (timeout or 60)
+        while any(m.updating for m in self._threads.values()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _fold(self, mem: _ThreadMemory, new_messages: list[BaseMessage], covered: int) -> None:
+        try:
+            summary = self.summarize(mem.summary, new_messages)
+            with self._lock:
+                mem.summary, mem.covered = summary, covered
+        except Exception as e:
+            print(f"Conversation summary update failed: {e}")
+        finally:
+            mem.updating = False
+
+
+class ResultStore:
+    """Full analysis results kept outside the message history.
+
+    The manager sees a short index and picks results by id; only those are
+    pulled into the summarizer's context.
+    """
+
+    def __init__(self, root: str | None = None, index_size: int = 10):
+        self.root = root or os.getenv("RESULT_STORE", ".cache/results")
+        self.index_size = index_size
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, thread_id: str) -> str:
+        return os.path.join(self.root, re.sub(r"[^A-Za-z0-9_.-]", "_", thread_id) + ".jsonl")
+
+    def put(self, thread_id: str, question: str, answer: str, code: str | None = None) -> str:
+        result_id = f"res_{uuid.uuid4().hex[:8]}"
+        record = {"id": result_id, "question": question, "answer": answer, "code": code, "created_at": time.time()}
+        with self._lock, open(self._path(thread_id), "a") as f:
+            f.write(json.dumps(record) + "\n")
+        return result_id
+
+    def _records(self, thread_id: str) -> list[dict]:
+        path = self._path(thread_id)
+        if not os.path.exists(path):
+            return []
+        with self._lock, open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def index(self, thread_id: str) -> str:
+        records = self._records(thread_id)[-self.index_size:]
+        if not records:
+            return ""
+        lines = [f"- {r['id']}: {r['question'][:160]}" for r in records]
+        return "STORED ANALYSIS RESULTS (reference by id in result_refs when a follow-up needs them):\n" + "\n".join(lines)
+
+    def latest(self, thread_id: str) -> dict | None:
+        records = self._records(thread_id)
+        return records[-1] if records else None
+
+    def get(self, thread_id: str, result_ids: list[str]) -> list[dict]:
+        wanted = set(result_ids)
+        return [r for r in self._records(thread_id) if r["id"] in wanted]
+
+
+def format_results(results: list[dict]) -> HumanMessage:
+    parts = [f"--- {r['id']} ---\nQuestion: {r['question']}\nResults:\n{r['answer']}\nCode:\n{r.get('code') or 'n/a'}"
+             for r in results]
+    return HumanMessage(content="Previous analysis results relevant to this question:\n\n" + "\n\n".join(parts))
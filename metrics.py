@@ -0,0 +1,107 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{_metric_name(k)}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """In-process counters and latency samples, keyed by name and labels.
+
+    Quantiles come from the last `max_samples` observations per series; counts
+    and sums cover every observation.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._counters: dict[tuple, float] = {}
+        self._samples: dict[tuple, list[float]] = {}
+        self._totals: dict[tuple, list[float]] = {}  # [count, sum] since start or reset
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            samples = self._samples.setdefault(key, [])
+            samples.append(value)
+            totals = self._totals.setdefault(key, [0, 0.0])
+            totals[0] += 1
+            totals[1] += value
+            if len(samples) > self.max_samples:
+                del samples[: len(samples) - self.max_samples]
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - t0) * 1000, **labels)
+
+    def summary(self) -> dict:
+        with self._lock:
+            counters = {self._format(k): v for k, v in self._counters.items()}
+            samples = {self._format(k): (sorted(v), self._totals[k]) for k, v in self._samples.items()}
+        latencies = {
+            name: {"count": count, "p50": v[len(v) // 2], "p95": v[min(len(v) - 1, int(len(v) * 0.95))],
+                   "mean": total / count}
+            for name, (v, (count, total)) in samples.items() if v
+        }
+        return {"counters": counters, "latencies": latencies}
+
+    def prometheus(self, prefix: str = "analyst_") -> str:
+        # Prometheus text exposition: counters as *_total, latency samples as summaries
+        with self._lock:
+            counters = list(self._counters.items())
+            samples = [(k, sorted(v), tuple(self._totals[k])) for k, v in self._samples.items() if v]
+        lines, typed = [], set()
+        for (name, labels), value in sorted(counters, key=lambda c: self._format(c[0])):
+            metric = _metric_name(prefix + name) + "_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value:g}")
+        for (name, labels), v, (count, total) in sorted(samples, key=lambda c: self._format(c[0])):
+            metric = _metric_name(prefix + name)
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for q in (0.5, 0.95):
+                lines.append(f"{metric}{_labels(labels + (('quantile', str(q)),))} {v[min(len(v) - 1, int(len(v) * q))]:g}")
+            # Cumulative, so rate() keeps working once the sample window is full
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+            self._totals.clear()
+
+    @staticmethod
+    def _format(key: tuple) -> str:
+        name, labels = key
+        return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+metrics = Metrics()
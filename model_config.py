@@ -0,0 +1,111 @@
+import os
+import threading
+import tomllib
+
+# Which model serves each role, read from models.toml (MODELS_CONFIG overrides
+# the path). Roles name an endpoint; every role on an endpoint shares one pair
+# of HTTP clients, so connection pools and keep-alives are reused across roles.
+# Calls rejected with 429 fail over to the [fallback] endpoint.
+
+ROLES = ("manager", "generator", "reflector", "summarizer")
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.toml")
+
+# Used when there is no models.toml: every role on gpt-4.1-mini, no escalation or fallback
+DEFAULT_CONFIG = {"endpoints": {"openai": {}}, "roles": {role: {"model": "gpt-4.1-mini"} for role in ROLES}}
+
+# Keys that configure routing rather than the ChatOpenAI instance
+_ROUTING_KEYS = {"endpoint", "escalate", "fallback"}
+_ENDPOINT_KEYS = {"base_url", "api_key", "api_key_env", "max_retries", "max_connections", "max_keepalive",
+                  "structured_output", "timeout"}
+
+
+def load_model_config(path: str | None = None) -> dict:
+    path = path or os.getenv("MODELS_CONFIG", CONFIG_PATH)
+    if not os.path.exists(path):
+        return DEFAULT_CONFIG
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    defaults = config.get("defaults", {})
+    roles = {role: {**defaults, **config.get("roles", {}).get(role, {})} for role in ROLES}
+    for role, settings in roles.items():
+        if "model" not in settings:
+            raise ValueError(f"{path}: role '{role}' has no model (set it under [roles.{role}] or [defaults])")
+        endpoint = settings.get("endpoint", "openai")
+        if endpoint != "openai" and endpoint not in config.get("endpoints", {}):
+            raise ValueError(f"{path}: role '{role}' uses unknown endpoint '{endpoint}'")
+    return {**config, "endpoints": {"openai": {}, **config.get("endpoints", {})}, "roles": roles}
+
+
+class ModelFactory:
+    """Builds the chat models for each role from a models.toml config."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._clients: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, name: str) -> dict:
+        # One sync and one async HTTP client per endpoint, shared by every model on it
+        with self._lock:
+            if name not in self._clients:
+                import httpx
+                from pydantic import SecretStr
+                settings = self.config["endpoints"][name]
+                unknown = set(settings) - _ENDPOINT_KEYS
+                if unknown:
+                    raise ValueError(f"Unknown settings for endpoint '{name}': {sorted(unknown)}")
+                limits = httpx.Limits(max_connections=settings.get("max_connections", 64),
+                                      max_keepalive_connections=settings.get("max_keepalive", 16))
+                timeout = settings.get("timeout", 120)
+                kwargs = {"http_client": httpx.Client(limits=limits, timeout=timeout),
+                          "http_async_client": httpx.AsyncClient(limits=limits, timeout=timeout)}
+                if "base_url" in settings:
+                    kwargs["base_url"] = settings["base_url"]
+                api_key = settings.get("api_key") or os.getenv(settings.get("api_key_env", "OPENAI_API_KEY"))
+                if api_key:
+                    kwargs["api_key"] = SecretStr(api_key)
+                if "max_retries" in settings:
+                    kwargs["max_retries"] = settings["max_retries"]
+                self._clients[name] = kwargs
+            return self._clients[name]
+
+    def chat(self, role: str, endpoint: str | None = None, **overrides):
+        from langchain_openai import ChatOpenAI
+        from telemetry import LLMTelemetry
+        settings = {k: v for k, v in self.config["roles"][role].items() if k not in _ROUTING_KEYS}
+        endpoint = endpoint or self.config["roles"][role].get("endpoint", "openai")
+        return ChatOpenAI(**self.endpoint(endpoint), **{**settings, **overrides}, callbacks=[LLMTelemetry(role)])
+
+    def _fallback(self, role: str) -> dict | None:
+        fallback = self.config["roles"][role].get("fallback", self.config.get("fallback"))
+        if not fallback or fallback["endpoint"] == self.config["roles"][role].get("endpoint", "openai"):
+            return None
+        return {"endpoint": fallback["endpoint"], "model": fallback.get("model", self.config["roles"][role]["model"])}
+
+    def build(self, role: str, schema=None, include_raw: bool = False, **overrides):
+        # Structured output if `schema` is given; rate-limited calls retry on the fallback endpoint
+        from openai import RateLimitError
+
+        def make(endpoint: str, **kwargs):
+            model = self.chat(role, endpoint, **kwargs)
+            if schema is None:
+                return model
+            # Local servers often lack json_schema support; structured_output = "json_mode" there
+            method = self.config["endpoints"][endpoint].get("structured_output")
+            return model.with_structured_output(schema, include_raw=include_raw, **({"method": method} if method else {}))
+
+        primary = make(self.config["roles"][role].get("endpoint", "openai"), **overrides)
+        fallback = self._fallback(role)
+        if fallback is None:
+            return primary
+        return primary.with_fallbacks([make(**{**overrides, **fallback})], exceptions_to_handle=(RateLimitError,))
+
+    def escalations(self, role: str) -> list[tuple[int, str]]:
+        # (from_attempt, model), lowest attempt first
+        return sorted((int(e["from_attempt"]), e["model"]) for e in self.config["roles"][role].get("escalate", []))
+
+    def close(self) -> None:
+        with self._lock:
+            for kwargs in self._clients.values():
+                kwargs["http_client"].close()
+            self._clients.clear()
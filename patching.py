@@ -0,0 +1,81 @@
+import re
+
+from validation import parse_code
+
+# The reflector fixes code by patching the lines that are wrong instead of
+# re-emitting the whole script. Patches refer to the numbered listing it was
+# shown (number_lines) and are applied here, then checked to still parse.
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+
+
+class PatchError(ValueError):
+    pass
+
+
+def number_lines(code: str) -> str:
+    lines = code.splitlines()
+    width = len(str(len(lines)))
+    return "\n".join(f"{i:>{width}}| {line}" for i, line in enumerate(lines, 1))
+
+
+def apply_line_patches(code: str, patches: list) -> str:
+    lines = code.splitlines()
+    # Apply bottom-up so earlier line numbers stay valid
+    ordered = sorted(patches, key=lambda p: (p.start_line, p.end_line), reverse=True)
+    floor = len(lines) + 1
+    for patch in ordered:
+        start, end = patch.start_line, patch.end_line
+        if start < 1 or start > len(lines) + 1 or end < start - 1 or end > len(lines):
+            raise PatchError(f"Lines {start}-{end} are outside the script (1-{len(lines)})")
+        if end >= floor:
+            raise PatchError(f"Patch on lines {start}-{end} overlaps another patch")
+        replacement = patch.replacement.splitlines() if patch.replacement else []
+        lines[start - 1:end] = replacement
+        floor = start
+    return "\n".join(lines) + "\n"
+
+
+def _hunks(diff: str) -> list[tuple[int, list[str], list[str]]]:
+    hunks = []
+    for line in diff.splitlines():
+        if line.startswith(("---", "+++")) and not hunks:
+            continue
+        match = _HUNK.match(line)
+        if match:
+            hunks.append((int(match.group(1)), [], []))
+        elif hunks:
+            _, old, new = hunks[-1]
+            tag, text = (line[:1], line[1:]) if line else (" ", "")
+            if tag in (" ", "-"):
+                old.append(text)
+            if tag in (" ", "+"):
+                new.append(text)
+    if not hunks:
+        raise PatchError("Diff has no hunks")
+    return hunks
+
+
+def apply_unified_diff(code: str, diff: str) -> str:
+    lines = code.splitlines()
+    offset = 0
+    for start, old, new in _hunks(diff):
+        at = max(start - 1 + offset, 0)
+        if lines[at:at + len(old)] != old:
+            # Line numbers drifted; accept the hunk if its context matches exactly once
+            matches = [i for i in range(len(lines) - len(old) + 1) if lines[i:i + len(old)] == old]
+            if len(matches) != 1:
+                raise PatchError(f"Hunk at line {start} does not match the script")
+            at = matches[0]
+        lines[at:at + len(old)] = new
+        offset += len(new) - len(old)
+    return "\n".join(lines) + "\n"
+
+
+def apply_fix(code: str, patches: list | None = None, diff: str | None = None) -> str:
+    patched = apply_line_patches(code, patches) if patches else apply_unified_diff(code, diff or "")
+    try:
+        parse_code(patched)
+    except SyntaxError as e:
+        raise PatchError(f"Patched code does not parse: {e.msg} (line {e.lineno})")
+    return patched
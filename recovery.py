@@ -0,0 +1,147 @@
+import importlib
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+
+from langgraph.types import RetryPolicy
+
+from metrics import metrics
+
+# Durable runs. Every completed node's state is checkpointed under the run's
+# thread_id, so a run that fails mid-loop resumes from the last completed node
+# (`app.invoke(None, config)`) with its code, attempts and results intact.
+# Transient LLM and sandbox failures are first retried in place, per node,
+# with exponential backoff.
+#
+# CHECKPOINTER picks the store: "sqlite" (default, at CHECKPOINT_PATH),
+# "memory", "postgres" (CHECKPOINT_URL, needs langgraph-checkpoint-postgres),
+# "none", or "package.module:factory" returning any BaseCheckpointSaver.
+
+CHECKPOINT_PATH = os.path.join(".cache", "checkpoints.sqlite")
+
+# 429 and gateway/server errors from any SDK that reports an HTTP status
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TransientError(Exception):
+    """An infrastructure failure worth retrying, raised where the original error was swallowed."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    # Timeouts, dropped connections and pool exhaustion (PoolExhausted is a TimeoutError)
+    if isinstance(exc, (TransientError, TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+        if isinstance(exc, httpx.TransportError):
+            return True
+    except ImportError:
+        pass
+    try:
+        import openai
+        if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+            return True
+    except ImportError:
+        pass
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status in _TRANSIENT_STATUS
+
+
+def _retry_on(exc: Exception) -> bool:
+    transient = is_transient(exc)
+    metrics.inc("node_exceptions", error=type(exc).__name__, transient=transient)
+    return transient
+
+
+def retry_policy() -> RetryPolicy | None:
+    # NODE_RETRY_ATTEMPTS counts the first try; 1 turns node retries off
+    attempts = int(os.getenv("NODE_RETRY_ATTEMPTS", "3"))
+    if attempts <= 1:
+        return None
+    return RetryPolicy(max_attempts=attempts, initial_interval=float(os.getenv("NODE_RETRY_BACKOFF", "1")),
+                       backoff_factor=2.0, max_interval=float(os.getenv("NODE_RETRY_MAX_BACKOFF", "30")),
+                       jitter=os.getenv("NODE_RETRY_JITTER", "1").lower() in ("1", "true"), retry_on=_retry_on)
+
+
+def _sqlite_path() -> str:
+    path = os.getenv("CHECKPOINT_PATH", CHECKPOINT_PATH)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return path
+
+
+# WAL lets readers (get_state, other workers) run alongside the writer; NORMAL skips
+# an fsync per checkpoint but still survives a process crash
+_SQLITE_PRAGMAS = ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL")
+
+
+def _custom(kind: str):
+    module, _, attr = kind.partition(":")
+    if not attr:
+        raise ValueError(f"Unknown CHECKPOINTER '{kind}'. Use sqlite, memory, postgres, none or module:factory")
+    return getattr(importlib.import_module(module), attr)()
+
+
+def get_checkpointer(kind: str | None = None):
+    """Checkpointer for the sync graph, or None when checkpointing is off."""
+    kind = kind or os.getenv("CHECKPOINTER", "sqlite")
+    if kind == "none":
+        return None
+    if kind == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    if kind == "sqlite":
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        conn = sqlite3.connect(_sqlite_path(), check_same_thread=False)
+        for pragma in _SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return SqliteSaver(conn)
+    if kind == "postgres":
+        from langgraph.checkpoint.postgres import PostgresSaver
+        from psycopg_pool import ConnectionPool
+        pool = ConnectionPool(os.environ["CHECKPOINT_URL"], max_size=int(os.getenv("CHECKPOINT_POOL_SIZE", "16")),
+                              kwargs={"autocommit": True, "prepare_threshold": 0})
+        saver = PostgresSaver(pool)
+        saver.setup()
+        return saver
+    return _custom(kind)
+
+
+@asynccontextmanager
+async def open_async_checkpointer(kind: str | None = None):
+    """Checkpointer for the async graph. Async savers are bound to the running
+    loop, so open this inside it (e.g. in the server's lifespan)."""
+    kind = kind or os.getenv("CHECKPOINTER", "sqlite")
+    if kind == "sqlite":
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        conn = await aiosqlite.connect(_sqlite_path())
+        try:
+            for pragma in _SQLITE_PRAGMAS:
+                await conn.execute(pragma)
+            yield AsyncSqliteSaver(conn)
+        finally:
+            await conn.close()
+    elif kind == "postgres":
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        from psycopg_pool import AsyncConnectionPool
+        async with AsyncConnectionPool(os.environ["CHECKPOINT_URL"], max_size=int(os.getenv("CHECKPOINT_POOL_SIZE", "16")),
+                                       kwargs={"autocommit": True, "prepare_threshold": 0}, open=False) as pool:
+            saver = AsyncPostgresSaver(pool)
+            await saver.setup()
+            yield saver
+    else:
+        # In-memory and custom savers implement both APIs
+        yield get_checkpointer(kind)
+
+
+def pending_nodes(app, config: dict) -> tuple[str, ...]:
+    # What a failed run still has to execute; empty once the thread's last run finished
+    if app.checkpointer is None:
+        return ()
+    return app.get_state(config).next
+
+
+async def apending_nodes(app, config: dict) -> tuple[str, ...]:
+    if app.checkpointer is None:
+        return ()
+    return (await app.aget_state(config)).next
@@ -0,0 +1,291 @@
+import os
+import threading
+from typing import NamedTuple
+
+# Models and the sandbox pool are built on first use rather than at import, so
+# `import agent` (langgraph dev, worker forks) never waits on the network.
+
+
+class Models(NamedTuple):
+    manager: object
+    generator: object
+    reflector: object
+    summarizer: object
+    # (from_attempt, model name, reflector) for later fix attempts, lowest attempt first
+    reflector_tiers: tuple = ()
+
+
+# Successful ENVIRONMENT_FIX installs are replayed on every new sandbox
+ENV_FIX_REPLAY = os.getenv("ENV_FIX_REPLAY", "1").lower() in ("1", "true")
+
+_lock = threading.Lock()
+_models: Models | None = None
+_model_factory = None
+_pool = None
+_code_cache = None
+_registry = None
+_kernels = None
+_charts = None
+_speculation = None
+_memory = None
+_results = None
+_router = None
+_manifest = None
+_env_fixes = None
+_UNSET = object()
+_checkpointer = _UNSET  # None is a valid value: CHECKPOINTER=none
+
+
+def get_model_factory():
+    global _model_factory
+    if _model_factory is None:
+        with _lock:
+            if _model_factory is None:
+                from model_config import ModelFactory, load_model_config
+                _model_factory = ModelFactory(load_model_config())
+    return _model_factory
+
+
+def get_models() -> Models:
+    global _models
+    if _models is None:
+        factory = get_model_factory()
+        with _lock:
+            if _models is None:
+                from daytona_utils import create_models
+                _models = Models(*create_models(factory))
+    return _models
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                from backends import get_backend
+                from sandbox_pool import RoutedPool, SandboxPool
+                # "procpool,daytona": small or trusted jobs run locally, the rest remotely
+                names = os.getenv("SANDBOX_BACKEND", "daytona").split(",")
+                if len(names) == 2:
+                    pool = RoutedPool.from_env(get_backend(names[0].strip()), get_backend(names[1].strip()))
+                else:
+                    pool = SandboxPool.from_env(get_backend(names[0].strip()))
+                if ENV_FIX_REPLAY:
+                    _provision_env_fixes(pool)
+                pool.start_maintenance()
+                _pool = pool
+    return _pool
+
+
+def _provision_env_fixes(pool) -> None:
+    # Called under _lock while the pool is built, before any sandbox exists
+    global _env_fixes
+    from env_fixes import EnvFixCache
+    fixes = _env_fixes = EnvFixCache.from_env()
+    for sub in getattr(pool, "pools", {"": pool}).values():
+        backend = sub.backend
+        if backend.shared_environment:
+            continue
+        baked = fixes.snapshot()
+        if baked and getattr(backend, "snapshot", "") is None:
+            backend.snapshot = baked[0]
+
+        def provision(sandbox, backend=backend):
+            current = fixes.snapshot()
+            in_snapshot = current[1] if current and getattr(backend, "snapshot", None) == current[0] else set()
+            if fixes.replay(sandbox, in_snapshot):
+                # Replayed installs change what the sandbox can import
+                get_manifest().invalidate(sandbox)
+
+        sub.on_create.append(provision)
+        fixes.start_baker(backend, float(os.getenv("ENV_FIX_BAKE_INTERVAL", str(6 * 3600))))
+
+
+def get_env_fixes():
+    # Built together with the pool; None when replay is disabled
+    get_pool()
+    return _env_fixes
+
+
+def get_code_cache():
+    global _code_cache
+    if _code_cache is None:
+        with _lock:
+            if _code_cache is None:
+                from code_cache import CodeCache
+                embed = None
+                if os.getenv("CODE_CACHE_SEMANTIC", "").lower() in ("1", "true"):
+                    from langchain_openai import OpenAIEmbeddings
+                    embed = OpenAIEmbeddings(model=os.getenv("CODE_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")).embed_query
+                _code_cache = CodeCache.from_env(embed=embed)
+    return _code_cache
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                from datasets import DatasetRegistry
+                _registry = DatasetRegistry()
+    return _registry
+
+
+def get_kernels():
+    global _kernels
+    if _kernels is None:
+        pool = get_pool()
+        with _lock:
+            if _kernels is None:
+                from kernel import KernelManager
+                kernels = KernelManager()
+                # A thread's interpreter goes away with its sandbox lease
+                pool.on_release.append(kernels.close)
+                # A stopped sandbox loses its context; the next run starts a fresh one
+                pool.on_stop.append(kernels.forget)
+                _kernels = kernels
+    return _kernels
+
+
+def get_charts():
+    global _charts
+    if _charts is None:
+        with _lock:
+            if _charts is None:
+                from charts import ChartTransfer
+                _charts = ChartTransfer()
+    return _charts
+
+
+def get_speculation():
+    global _speculation
+    if _speculation is None:
+        pool = get_pool()
+        factory = get_model_factory()
+        with _lock:
+            if _speculation is None:
+                from daytona_utils import create_candidate_generators
+                from speculative import Speculation
+                k = int(os.getenv("SPECULATIVE_K", "1"))
+                temperatures = [float(t) for t in os.getenv("SPECULATIVE_TEMPERATURES", "0,0.5,0.9").split(",")]
+                models = [m for m in os.getenv("SPECULATIVE_MODELS", "").split(",") if m]
+                generators = create_candidate_generators(
+                    factory, [temperatures[i % len(temperatures)] for i in range(k)], models)
+                _speculation = Speculation(pool, generators)
+    return _speculation
+
+
+def get_memory():
+    global _memory
+    if _memory is None:
+        with _lock:
+            if _memory is None:
+                from langchain_core.messages import HumanMessage
+                from memory import ConversationMemory
+                from prompts import Memory_PROMPT
+
+                def summarize(summary, messages):
+                    turns = "\n".join(f"{m.type}: {m.content}" for m in messages)
+                    prompt = f"Current summary:\n{summary or '(empty)'}\n\nNew turns:\n{turns}"
+                    return get_models().summarizer.invoke([Memory_PROMPT, HumanMessage(content=prompt)]).content
+
+                _memory = ConversationMemory(summarize)
+    return _memory
+
+
+def get_results():
+    global _results
+    if _results is None:
+        with _lock:
+            if _results is None:
+                from memory import ResultStore
+                _results = ResultStore()
+    return _results
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _lock:
+            if _router is None:
+                from fast_router import FastRouter
+                _router = FastRouter.from_env()
+    return _router
+
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        with _lock:
+            if _manifest is None:
+                from validation import ImportManifest
+                _manifest = ImportManifest()
+    return _manifest
+
+
+def set_speculation(speculation) -> None:
+    global _speculation
+    with _lock:
+        _speculation = speculation
+
+
+def set_models(models: Models) -> None:
+    global _models
+    with _lock:
+        _models = models
+
+
+def set_pool(pool) -> None:
+    global _pool
+    with _lock:
+        _pool = pool
+
+
+def get_checkpointer():
+    # Opening the store touches disk (or the database), so it waits for the first run
+    global _checkpointer
+    if _checkpointer is _UNSET:
+        with _lock:
+            if _checkpointer is _UNSET:
+                from recovery import get_checkpointer as open_checkpointer
+                _checkpointer = open_checkpointer()
+    return _checkpointer
+
+
+def prewarm(block: bool = False) -> threading.Thread:
+    def warm():
+        try:
+            get_models()
+            get_pool().fill()
+        except Exception as e:
+            print(f"Prewarm failed, resources will be created on first use: {e}")
+
+    thread = threading.Thread(target=warm, name="resource-prewarm", daemon=True)
+    thread.start()
+    if block:
+        thread.join()
+    return thread
+
+
+def _reset_after_fork() -> None:
+    # HTTP clients and the pool's maintenance thread don't survive fork();
+    # each worker process lazily builds its own.
+    global _lock, _models, _model_factory, _pool, _code_cache, _registry, _kernels, _charts, _speculation, _memory, _results, _router, _manifest, _env_fixes, _checkpointer
+    _lock = threading.Lock()
+    _models = None
+    _model_factory = None
+    _pool = None
+    _code_cache = None
+    _registry = None
+    _kernels = None
+    _charts = None
+    _speculation = None
+    _memory = None
+    _results = None
+    _router = None
+    _manifest = None
+    _env_fixes = None
+    _checkpointer = _UNSET
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,373 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from backends import SandboxBackend
+from lifecycle import ManagedSandbox
+from metrics import metrics
+
+
+class PoolExhausted(TimeoutError):
+    pass
+
+
+@dataclass
+class _Entry:
+    sandbox: object
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    checked_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    parked: bool = False  # between turns; reclaimable when the pool is full
+
+
+class SandboxPool:
+    def __init__(self, backend: SandboxBackend, min_size: int = 1, max_size: int = 4,
+                 idle_timeout: float = 600, lease_ttl: float = 1800, lease_timeout: float = 120,
+                 max_uses: int = 50, health_interval: float = 60, name_prefix: str = "CodeStore"):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool bounds min_size={min_size} max_size={max_size}")
+        self.backend = backend
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.lease_ttl = lease_ttl
+        self.lease_timeout = lease_timeout
+        self.max_uses = max_uses
+        self.health_interval = health_interval
+        self.name_prefix = name_prefix
+
+        self._idle: deque[_Entry] = deque()
+        self._leases: dict[str, _Entry] = {}
+        self._size = 0  # idle + leased + being created
+        self._cond = threading.Condition()
+        self._maintenance: threading.Thread | None = None
+        self._closed = threading.Event()
+        self.on_release: list[Callable[[str, object], None]] = []
+        self.on_create: list[Callable[[object], None]] = []
+        # Called when the idle policy stops or archives a sandbox a thread still leases
+        self.on_stop: list[Callable[[str, object], None]] = []
+
+    @classmethod
+    def from_env(cls, backend: SandboxBackend) -> "SandboxPool":
+        return cls(
+            backend,
+            min_size=int(os.getenv("SANDBOX_POOL_MIN", "1")),
+            max_size=int(os.getenv("SANDBOX_POOL_MAX", "4")),
+            idle_timeout=float(os.getenv("SANDBOX_IDLE_TIMEOUT", "600")),
+            lease_ttl=float(os.getenv("SANDBOX_LEASE_TTL", "1800")),
+        )
+
+    def lease(self, thread_id: str):
+        deadline = time.monotonic() + self.lease_timeout
+        waited_from = None
+        reclaimed = None
+        with self._cond:
+            while True:
+                entry = self._leases.get(thread_id)
+                if entry is not None:
+                    entry.last_used = time.monotonic()
+                    entry.parked = False
+                    return entry.sandbox
+                if self._idle:
+                    entry = self._idle.pop()  # most recently used first, keeps the rest evictable
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    entry = None
+                    break
+                parked = [(e.last_used, tid) for tid, e in self._leases.items() if e.parked]
+                if parked:
+                    # Full: take the least recently used sandbox a finished turn is holding on to
+                    reclaimed = min(parked)[1]
+                    entry = self._leases.pop(reclaimed)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"No sandbox available for thread {thread_id} after {self.lease_timeout}s")
+                waited_from = waited_from or time.perf_counter()
+                self._cond.wait(remaining)
+        if waited_from:
+            metrics.observe("sandbox_lease_wait_ms", (time.perf_counter() - waited_from) * 1000)
+        if reclaimed is not None:
+            metrics.inc("sandbox_parked_reclaims")
+            if not self._reset(reclaimed, entry, recycle=False):
+                return self.lease(thread_id)
+
+        if entry is None:
+            entry = self._create_entry()
+        elif not self._healthy(entry):
+            self._discard(entry)
+            return self.lease(thread_id)
+
+        with self._cond:
+            entry.uses += 1
+            entry.last_used = time.monotonic()
+            self._leases[thread_id] = entry
+        return entry.sandbox
+
+    def release(self, thread_id: str, recycle: bool = False) -> None:
+        with self._cond:
+            entry = self._leases.pop(thread_id, None)
+        if entry is None:
+            return
+        if self._reset(thread_id, entry, recycle):
+            with self._cond:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def park(self, thread_id: str) -> None:
+        # The thread keeps its sandbox (and kernel) for a follow-up, but gives it up if another thread needs the slot
+        with self._cond:
+            entry = self._leases.get(thread_id)
+            if entry is not None:
+                entry.parked = True
+                entry.last_used = time.monotonic()
+                self._cond.notify()
+
+    def _reset(self, thread_id: str, entry: _Entry, recycle: bool) -> bool:
+        # Detach a popped lease from its thread; False if the sandbox was discarded instead
+        for hook in self.on_release:
+            try:
+                hook(thread_id, entry.sandbox)
+            except Exception as e:
+                print(f"Sandbox release hook failed: {e}")
+        entry.parked = False
+        if recycle or entry.uses >= self.max_uses:
+            self._discard(entry)
+            return False
+        try:
+            self.backend.reset(entry.sandbox)
+        except Exception:
+            self._discard(entry)
+            return False
+        return True
+
+    def transfer(self, from_id: str, to_id: str) -> None:
+        with self._cond:
+            if to_id in self._leases:
+                raise ValueError(f"Thread {to_id} already holds a sandbox lease")
+            entry = self._leases.pop(from_id)
+            entry.last_used = time.monotonic()
+            self._leases[to_id] = entry
+
+    def leased(self, thread_id: str):
+        entry = self._leases.get(thread_id)
+        return entry.sandbox if entry else None
+
+    def shared_environment(self, thread_id: str) -> bool:
+        return self.backend.shared_environment
+
+    def fill(self) -> None:
+        # Backends with warm workers (procpool) start them here, not on the first run
+        if hasattr(self.backend, "warm"):
+            self.backend.warm()
+        while True:
+            with self._cond:
+                if self._closed.is_set() or self._size >= self.min_size:
+                    return
+                self._size += 1
+            entry = self._create_entry()
+            with self._cond:
+                self._idle.appendleft(entry)
+                self._cond.notify()
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            # Oldest idle entries sit on the left
+            while self._idle and self._size - len(expired) > self.min_size \
+                    and now - self._idle[0].last_used > self.idle_timeout:
+                expired.append(self._idle.popleft())
+            stale = [tid for tid, e in self._leases.items() if now - e.last_used > self.lease_ttl]
+        for entry in expired:
+            self._discard(entry)
+        for thread_id in stale:
+            # Reset and reuse it like any release; only a failed reset discards the sandbox
+            self.release(thread_id)
+
+    def check_health(self) -> None:
+        with self._cond:
+            idle = list(self._idle)
+        for entry in idle:
+            if not self._healthy(entry, force=True):
+                with self._cond:
+                    if entry not in self._idle:
+                        continue
+                    self._idle.remove(entry)
+                self._discard(entry)
+
+    def apply_idle_policy(self) -> None:
+        with self._cond:
+            entries = [(None, e) for e in self._idle] + list(self._leases.items())
+        for thread_id, entry in entries:
+            try:
+                action = entry.sandbox.apply_idle_policy()
+            except Exception as e:
+                print(f"Sandbox idle policy failed: {e}")
+                continue
+            if action and thread_id is not None:
+                # Stopping a sandbox kills anything living in it, e.g. the thread's kernel context
+                for hook in self.on_stop:
+                    try:
+                        hook(thread_id, entry.sandbox)
+                    except Exception as e:
+                        print(f"Sandbox stop hook failed: {e}")
+
+    def start_maintenance(self) -> None:
+        if self._maintenance is not None:
+            return
+
+        def loop():
+            while not self._closed.is_set():
+                try:
+                    self.evict_idle()
+                    self.check_health()
+                    self.apply_idle_policy()
+                    self.fill()
+                except Exception as e:
+                    print(f"Sandbox pool maintenance failed: {e}")
+                self._closed.wait(self.health_interval)
+
+        self._maintenance = threading.Thread(target=loop, name="sandbox-pool-maintenance", daemon=True)
+        self._maintenance.start()
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._cond:
+            entries = list(self._idle) + list(self._leases.values())
+            self._idle.clear()
+            self._leases.clear()
+        for entry in entries:
+            self._discard(entry)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "leased": len(self._leases),
+                    "min_size": self.min_size, "max_size": self.max_size}
+
+    def _create_entry(self) -> _Entry:
+        try:
+            sandbox = self.backend.create(f"{self.name_prefix}-{uuid.uuid4().hex[:8]}")
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        sandbox = ManagedSandbox(sandbox, async_factory=getattr(self.backend, "async_handle", None))
+        for hook in self.on_create:
+            try:
+                hook(sandbox)
+            except Exception as e:
+                print(f"Sandbox create hook failed: {e}")
+        return _Entry(sandbox=sandbox)
+
+    def _healthy(self, entry: _Entry, force: bool = False) -> bool:
+        # Leasing skips the remote probe if maintenance checked the entry recently
+        if not force and time.monotonic() - entry.checked_at < self.health_interval:
+            return True
+        try:
+            healthy = self.backend.is_healthy(entry.sandbox)
+        except Exception:
+            return False
+        entry.checked_at = time.monotonic()
+        return healthy
+
+    def _discard(self, entry: _Entry) -> None:
+        try:
+            self.backend.destroy(entry.sandbox)
+        except Exception as e:
+            print(f"Failed to destroy sandbox: {e}")
+        finally:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+
+class RoutedPool:
+    """Two sandbox pools behind the SandboxPool interface.
+
+    `route` picks a tier per thread before its first lease: trusted jobs (and,
+    when `local_max_bytes` is set, small ones) go to the local tier (millisecond
+    dispatch), everything else to the remote one. A thread that already holds a
+    lease stays where it is.
+    """
+
+    def __init__(self, local: SandboxPool, remote: SandboxPool, local_max_bytes: int = 0):
+        self.pools = {"local": local, "remote": remote}
+        self.local_max_bytes = local_max_bytes
+        self.on_release: list[Callable] = []
+        self.on_stop: list[Callable] = []
+        for pool in self.pools.values():
+            pool.on_release = self.on_release
+            pool.on_stop = self.on_stop
+        self._routes: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, local: SandboxBackend, remote: SandboxBackend) -> "RoutedPool":
+        return cls(SandboxPool.from_env(local), SandboxPool.from_env(remote),
+                   local_max_bytes=int(float(os.getenv("EXECUTION_LOCAL_MAX_MB", "0")) * 1024 * 1024))
+
+    def route(self, thread_id: str, size_bytes: int, trusted: bool = False) -> str:
+        # The local tier runs LLM-written code on this host, so size alone only qualifies when opted in
+        small = self.local_max_bytes > 0 and size_bytes <= self.local_max_bytes
+        tier = "local" if trusted or small else "remote"
+        with self._lock:
+            if not self.leased(thread_id):
+                self._routes[thread_id] = tier
+            return self._routes.get(thread_id, tier)
+
+    def _pool(self, thread_id: str) -> SandboxPool:
+        for pool in self.pools.values():
+            if pool.leased(thread_id):
+                return pool
+        # Speculative candidates ("<thread>#cand<i>") follow their thread
+        return self.pools[self._routes.get(thread_id.split("#")[0], "remote")]
+
+    def lease(self, thread_id: str):
+        return self._pool(thread_id).lease(thread_id)
+
+    def release(self, thread_id: str, recycle: bool = False) -> None:
+        for pool in self.pools.values():
+            pool.release(thread_id, recycle)
+        with self._lock:
+            self._routes.pop(thread_id, None)
+
+    def transfer(self, from_id: str, to_id: str) -> None:
+        self._pool(from_id).transfer(from_id, to_id)
+
+    def park(self, thread_id: str) -> None:
+        for pool in self.pools.values():
+            pool.park(thread_id)
+
+    def shared_environment(self, thread_id: str) -> bool:
+        return self._pool(thread_id).backend.shared_environment
+
+    def leased(self, thread_id: str):
+        for pool in self.pools.values():
+            sandbox = pool.leased(thread_id)
+            if sandbox:
+                return sandbox
+        return None
+
+    def fill(self) -> None:
+        for pool in self.pools.values():
+            pool.fill()
+
+    def start_maintenance(self) -> None:
+        for pool in self.pools.values():
+            pool.start_maintenance()
+
+    def close(self) -> None:
+        for pool in self.pools.values():
+            pool.close()
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
@@ -1,11 +1,12 @@
 from langgraph.graph import  MessagesState 
-from typing import Literal
+from typing import Annotated, Literal
 from pydantic import BaseModel, Field
 
 class ManagerOutput(BaseModel):
     decision: Literal["chats", "code_gen", "summarizer"] = Field( description="Classification of user query: chats for conversation, code_gen for new analysis, summarizer for follow-up questions")
     messages: str | None = Field( description="Direct response message for chitchat. Only populate when decision is 'chats'")
     question: str | None = Field( description="Extracted question for code_gen or summarizer. Clear, actionable task description")
+    result_refs: list[str] | None = Field(default=None, description="Ids of stored analysis results a summarizer follow-up needs. Empty otherwise")
 
 class GeneratorOutput(BaseModel):
     thinking: str = Field(description="Thinking process to solve the problem in bullet points")
@@ -13,13 +14,34 @@ class GeneratorOutput(BaseModel):
     charts_exists: bool = Field(description="Whether the code generates charts or not")
     generated_chart_names: list[str] = Field(description="List of chart names generated by the code")
 
+class LinePatch(BaseModel):
+    start_line: int = Field(description="First line to replace, 1-based, as numbered in the code listing")
+    end_line: int = Field(description="Last line to replace, inclusive. Use start_line - 1 to insert before start_line without replacing anything")
+    replacement: str = Field(description="New text for those lines, without line numbers. Empty string deletes them")
+
 class ReflectorOutput(BaseModel):
     fix_type : Literal["ENVIRONMENT_FIX", "CODE_FIX"] = Field(description="Type of fix required if its something that requires terminal cmd to run or just code_fix")
-    code: str = Field(description="Correct code to resolve the error if its CODE_FIX")
+    patches: list[LinePatch] | None = Field(default=None, description="Line-range replacements that fix the code if its CODE_FIX. Preferred over code")
+    diff: str | None = Field(default=None, description="Unified diff against the code, as an alternative to patches")
+    code: str | None = Field(default=None, description="Complete corrected code, only when most of the script has to change or when asked for a rewrite")
     cmd: str | None = Field(description="Cmd required to resolve the error if its ENVIRNMENT_FIX")
     comment: str | None = Field(description="single line comment to explain the fix")
 
 
+# An update carrying this key replaces the trace instead of merging into it
+TRACE_RESET = "__reset__"
+
+
+def merge_trace(left: dict | None, right: dict | None) -> dict:
+    if right and right.get(TRACE_RESET):
+        return {k: v for k, v in right.items() if k != TRACE_RESET}
+    return {**(left or {}), **(right or {})}
+
+
+def merge_handles(left: list[str] | None, right: list[str] | None) -> list[str]:
+    return list(dict.fromkeys((left or []) + (right or [])))
+
+
 class AgentState(MessagesState):
     thinking: str | None
     fix_type: Literal["ENVIRONMENT_FIX", "CODE_FIX"] | None
@@ -34,4 +56,12 @@ class AgentState(MessagesState):
     reflection: ReflectorOutput | None
     charts_exists: bool | None
     generated_chart_names: list[str] | list
-
+    charts: list[dict]
+    datasets: Annotated[list[str], merge_handles]
+    speculation: dict | None
+    conversation_summary: str | None
+    summarized_count: int
+    result_refs: list[str] | None
+    cache_key: str | None
+    cache_hit: Literal["exact", "semantic"] | None
+    trace: Annotated[dict, merge_trace]
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, File, HTTPException, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from pydantic import BaseModel, Field
+
+from admission import Admission, QueueFull
+from agent_async import graph
+from metrics import metrics
+from recovery import apending_nodes, open_async_checkpointer
+from resources import get_charts, get_env_fixes, get_pool, get_registry, prewarm
+
+DRAIN_TIMEOUT = float(os.getenv("SERVER_DRAIN_TIMEOUT", "60"))
+MAX_UPLOAD_MB = int(os.getenv("SERVER_MAX_UPLOAD_MB", "200"))
+
+# Threads keep their conversation between requests; runs of one thread never overlap.
+# The lifespan swaps in the durable checkpointer (CHECKPOINTER) once the loop is running.
+agent_app = graph.compile(checkpointer=InMemorySaver())
+admission = Admission.from_env()
+_thread_locks: dict[str, asyncio.Lock] = {}
+
+
+class MessageRequest(BaseModel):
+    message: str
+    datasets: list[str] = Field(default_factory=list, description="Handles returned by POST /datasets")
+
+
+class ThreadBusy(Exception):
+    pass
+
+
+class RunFailed(Exception):
+    def __init__(self, thread_id: str, error: Exception, pending: tuple[str, ...]):
+        super().__init__(f"{type(error).__name__}: {error}")
+        self.thread_id = thread_id
+        self.pending = pending
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global agent_app
+    prewarm()
+    async with open_async_checkpointer() as checkpointer:
+        if checkpointer is not None:
+            agent_app = graph.compile(checkpointer=checkpointer)
+        yield
+        # Stop admitting, let in-flight analyses finish, then give the sandboxes back
+        drained = await admission.drain(DRAIN_TIMEOUT)
+        if not drained:
+            print(f"Shutdown drain timed out after {DRAIN_TIMEOUT}s with {admission.stats()['active']} run(s) in flight")
+    await asyncio.to_thread(get_pool().close)
+
+
+app = FastAPI(title="Multi-Agent Data Analyst", lifespan=lifespan)
+
+
+def graph_input(req: MessageRequest) -> dict:
+    registry = get_registry()
+    try:
+        datasets = [registry.get(h) for h in req.datasets]
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset {e}")
+    content = "\n".join([req.message] + [d.reference() for d in datasets])
+    return {"messages": [HumanMessage(content=content)], "datasets": [d.handle for d in datasets]}
+
+
+def to_event(mode: str, payload) -> dict | None:
+    if mode == "custom":
+        return {"event": payload.get("type", "custom"), **{k: v for k, v in payload.items() if k != "type"}}
+    if mode == "messages":
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") == "summarizer" and isinstance(chunk.content, str) and chunk.content:
+            return {"event": "token", "text": chunk.content}
+    return None
+
+
+async def run_turn(thread_id: str, inputs: dict | None, send=None) -> dict:
+    # inputs=None resumes the thread's failed run from its last completed node
+    lock = _thread_locks.setdefault(thread_id, asyncio.Lock())
+    if lock.locked():
+        raise ThreadBusy(f"Thread {thread_id} already has a run in progress")
+    try:
+        return await _run_locked(lock, thread_id, inputs, send)
+    finally:
+        if not lock.locked():
+            _thread_locks.pop(thread_id, None)
+
+
+async def _run_locked(lock: asyncio.Lock, thread_id: str, inputs: dict, send) -> dict:
+    async with lock, admission.slot():
+        config = {"configurable": {"thread_id": thread_id}}
+        result = {"answer": None, "charts": []}
+        with metrics.timer("server_run_ms"):
+            try:
+                async for mode, payload in agent_app.astream(inputs, config, stream_mode=["custom", "messages", "updates"]):
+                    if mode == "updates":
+                        # The reply comes from manager_cmd (chats) or summarizer
+                        for update in payload.values():
+                            if isinstance(update, dict) and update.get("messages"):
+                                result["answer"] = update["messages"][-1].content
+                            if isinstance(update, dict) and update.get("charts"):
+                                result["charts"] = update["charts"]
+                        continue
+                    event = to_event(mode, payload)
+                    if event and send:
+                        await send(event)
+            except Exception as e:
+                # Node retries are exhausted; completed nodes are checkpointed and the run can be resumed
+                metrics.inc("server_run_failures", error=type(e).__name__)
+                raise RunFailed(thread_id, e, await apending_nodes(agent_app, config)) from e
+        if result["charts"]:
+            result["charts"] = await asyncio.to_thread(get_charts().with_data, result["charts"])
+        return result
+
+
+def refusal(e: Exception) -> tuple[int, dict, dict]:
+    if isinstance(e, QueueFull):
+        return 429, {"detail": str(e), "retry_after": e.retry_after}, {"Retry-After": str(e.retry_after)}
+    if isinstance(e, RunFailed):
+        return 503, {"detail": str(e), "resumable": bool(e.pending), "pending": list(e.pending)}, {}
+    return 409, {"detail": str(e)}, {}
+
+
+@app.post("/datasets")
+async def upload_dataset(file: UploadFile = File(...)):
+    # Spool to disk so large uploads don't sit in memory
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        size = 0
+        while chunk := await file.read(1024 * 1024):
+            size += len(chunk)
+            if size > MAX_UPLOAD_MB * 1024 * 1024:
+                tmp.close()
+                os.remove(tmp.name)
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_MB} MB")
+            tmp.write(chunk)
+    try:
+        dataset = await asyncio.to_thread(get_registry().register_file, tmp.name, file.filename or "data.csv")
+    finally:
+        os.remove(tmp.name)
+    return {"handle": dataset.handle, "name": dataset.name, "n_rows": dataset.n_rows, "columns": dataset.columns,
+            "reference": dataset.reference()}
+
+
+@app.post("/threads/{thread_id}/messages")
+async def post_message(thread_id: str, req: MessageRequest):
+    try:
+        return await run_turn(thread_id, graph_input(req))
+    except (QueueFull, ThreadBusy, RunFailed) as e:
+        status, body, headers = refusal(e)
+        return JSONResponse(status_code=status, content=body, headers=headers)
+
+
+@app.post("/threads/{thread_id}/resume")
+async def resume_thread(thread_id: str):
+    # Picks a failed run up at the node that failed; nothing already completed runs again
+    if not await apending_nodes(agent_app, {"configurable": {"thread_id": thread_id}}):
+        raise HTTPException(status_code=409, detail=f"Thread {thread_id} has no failed run to resume")
+    try:
+        return await run_turn(thread_id, None)
+    except (QueueFull, ThreadBusy, RunFailed) as e:
+        status, body, headers = refusal(e)
+        return JSONResponse(status_code=status, content=body, headers=headers)
+
+
+@app.websocket("/threads/{thread_id}/ws")
+async def thread_socket(websocket: WebSocket, thread_id: str):
+    await websocket.accept()
+    connected = True
+
+    async def send(event: dict):
+        nonlocal connected
+        if connected:
+            try:
+                await websocket.send_json(event)
+            except (WebSocketDisconnect, RuntimeError):
+                # Keep running to completion so the thread's state stays consistent
+                connected = False
+
+    try:
+        while connected:
+            try:
+                data = await websocket.receive_json()
+                if data.get("resume"):
+                    # {"resume": true} continues the thread's failed run
+                    result = await run_turn(thread_id, None, send)
+                else:
+                    result = await run_turn(thread_id, graph_input(MessageRequest(**data)), send)
+                await send({"event": "done", **result})
+            except (QueueFull, ThreadBusy, RunFailed) as e:
+                status, body, _ = refusal(e)
+                await send({"event": "busy" if status == 429 else "error", "status": status, **body})
+            except HTTPException as e:
+                await send({"event": "error", "status": e.status_code, "detail": e.detail})
+            except ValueError as e:
+                await send({"event": "error", "status": 422, "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/healthz")
+async def healthz():
+    if admission.draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    return {"status": "ok"}
+
+
+@app.get("/stats")
+async def stats():
+    fixes = get_env_fixes()
+    return {"admission": admission.stats(), "pool": get_pool().stats(), "metrics": metrics.summary(),
+            "env_fixes": fixes.stats() if fixes else None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus():
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("server:app", host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8000")),
+                timeout_graceful_shutdown=int(DRAIN_TIMEOUT) + 5)
@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from backends import ExecResult
+from recovery import is_transient
+from sandbox_pool import PoolExhausted
+
+
+@dataclass
+class Candidate:
+    index: int
+    label: str  # model/temperature the candidate was drawn with
+    status: str = "pending"  # won | failed | invalid | cancelled | no_sandbox | error
+    generator_ms: float = 0.0
+    execute_ms: float = 0.0
+    error: str | None = None
+    transient: bool = False  # failed on infrastructure (sandbox/LLM), not on its code
+
+
+class Speculation:
+    """Race K generator candidates, each executing in its own sandbox.
+
+    The first candidate whose code runs cleanly wins and its sandbox becomes
+    the thread's lease; the rest stop at their next checkpoint and return
+    their sandboxes. Losers still executing have their sandboxes destroyed.
+    In-flight LLM requests can't be aborted, only ignored.
+    """
+
+    def __init__(self, pool, generators: list[tuple[str, object]]):
+        self.pool = pool
+        self.generators = generators
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(generators)) * 4, thread_name_prefix="speculative")
+
+    def run(self, thread_id: str, msgs: list, prepare_sandbox=None, check=None, timeout: float | None = None) -> dict:
+        candidates = [Candidate(i, label) for i, (label, _) in enumerate(self.generators)]
+        lock = threading.Lock()
+        decided = threading.Event()
+        outcome: dict = {"winner": None, "first_failure": None}
+        remaining = [len(candidates)]
+        running: set[str] = set()  # candidate leases inside code_run
+
+        def attempt(candidate: Candidate, generator):
+            key = f"{thread_id}#cand{candidate.index}"
+            keep_lease = False
+            try:
+                try:
+                    sandbox = self.pool.lease(key)
+                except PoolExhausted as e:
+                    candidate.status, candidate.error, candidate.transient = "no_sandbox", str(e), True
+                    return
+                startup = sandbox.start_async()
+                t0 = time.perf_counter()
+                soln = generator.invoke(msgs)
+                candidate.generator_ms = round((time.perf_counter() - t0) * 1000, 1)
+                if decided.is_set():
+                    candidate.status = "cancelled"
+                    return
+                if soln is None:
+                    candidate.status, candidate.error = "failed", "Generator didnt provide any code soln"
+                    return
+                startup.result()
+                if prepare_sandbox:
+                    prepare_sandbox(sandbox)
+                # Statically broken candidates fail without a sandbox run
+                error = check(sandbox, soln) if check else None
+                if error:
+                    resp = ExecResult(exit_code=1, result=error)
+                else:
+                    with lock:
+                        if decided.is_set():
+                            candidate.status = "cancelled"
+                            return
+                        running.add(key)
+                    t0 = time.perf_counter()
+                    try:
+                        resp = sandbox.process.code_run(soln.code)
+                    finally:
+                        with lock:
+                            running.discard(key)
+                    candidate.execute_ms = round((time.perf_counter() - t0) * 1000, 1)
+                with lock:
+                    won = resp.exit_code == 0 and outcome["winner"] is None
+                    if won:
+                        candidate.status = "won"
+                        outcome["winner"] = (candidate, soln, resp, sandbox)
+                        losers = list(running)
+                    elif resp.exit_code == 0 or decided.is_set():
+                        candidate.status = "cancelled"
+                    else:
+                        candidate.status = "invalid" if error else "failed"
+                        candidate.error = error or f"Error: Code execution failed {resp.exit_code} {resp.result}"
+                        if outcome["first_failure"] is None:
+                            outcome["first_failure"] = (candidate, soln, resp)
+                if won:
+                    # Hand the winning sandbox over to the thread, charts and all. The
+                    # reset in release is remote, so it runs outside the lock
+                    self.pool.release(thread_id)
+                    self.pool.transfer(key, thread_id)
+                    keep_lease = True
+                    decided.set()
+                    # code_run can't be interrupted; destroying the sandbox stops the run and frees its slot
+                    for loser in losers:
+                        self.pool.release(loser, recycle=True)
+            except Exception as e:
+                if decided.is_set():
+                    candidate.status = "cancelled"
+                else:
+                    candidate.status, candidate.error = "error", f"{type(e).__name__}: {e}"
+                    candidate.transient = is_transient(e)
+            finally:
+                if not keep_lease:
+                    self.pool.release(key)
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        decided.set()
+
+        for candidate, (_, generator) in zip(candidates, self.generators):
+            self._executor.submit(attempt, candidate, generator)
+        decided.wait(timeout)
+        for candidate in candidates:
+            if candidate.status == "pending":
+                candidate.status = "cancelled"
+
+        report = {"candidates": [asdict(c) for c in candidates], "winner": None}
+        if outcome["winner"]:
+            candidate, soln, resp, sandbox = outcome["winner"]
+            report["winner"] = candidate.index
+            return {"soln": soln, "resp": resp, "sandbox": sandbox, "report": report}
+        if outcome["first_failure"]:
+            _, soln, resp = outcome["first_failure"]
+            return {"soln": soln, "resp": resp, "sandbox": None, "report": report}
+        return {"soln": None, "resp": None, "sandbox": None, "report": report}
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import ExecResult
+
+# Forward sandbox output while the code runs. Off falls back to one-shot code_run.
+STREAM_EXECUTION = os.getenv("STREAM_EXECUTION", "1").lower() in ("1", "true")
+STREAM_TIMEOUT = int(os.getenv("STREAM_TIMEOUT", "600"))
+
+
+async def astream_code_run(sandbox, code: str, on_output, timeout: int | None = None) -> ExecResult:
+    """Run `code` as a background session command and hand output chunks to
+    `on_output(stream, text)` as they arrive. Returns the same ExecResult a
+    one-shot code_run would, with stdout and stderr interleaved."""
+    process = sandbox.process
+    if not STREAM_EXECUTION or not hasattr(process, "create_session"):
+        resp = await asyncio.to_thread(process.code_run, code)
+        on_output("stdout", resp.result)
+        return resp
+
+    from daytona import SessionExecuteRequest
+    timeout = timeout or STREAM_TIMEOUT
+    session_id = f"exec-{uuid.uuid4().hex[:12]}"
+    script = f".agent_runs/{session_id}.py"
+    chunks: list[str] = []
+
+    def forward(stream):
+        def handler(text: str):
+            chunks.append(text)
+            on_output(stream, text)
+        return handler
+
+    await asyncio.to_thread(sandbox.fs.upload_file, code.encode(), script)
+    await asyncio.to_thread(process.create_session, session_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    timed_out = False
+    try:
+        # The script removes itself, saving a round-trip per run
+        command = await asyncio.to_thread(process.execute_session_command, session_id, SessionExecuteRequest(
+            command=f"python3 -u {script}; rc=$?; rm -f {script}; exit $rc", run_async=True))
+        try:
+            await asyncio.wait_for(process.get_session_command_logs_async(
+                session_id, command.cmd_id, forward("stdout"), forward("stderr")), timeout)
+            # The log stream can close just before the exit code is recorded
+            while (exit_code := (await asyncio.to_thread(process.get_session_command, session_id,
+                                                         command.cmd_id)).exit_code) is None:
+                if loop.time() >= deadline:
+                    raise asyncio.TimeoutError
+                await asyncio.sleep(0.1)
+        except asyncio.TimeoutError:
+            timed_out = True
+            return ExecResult(exit_code=-1, result=f"Timed out after {timeout}s\n{''.join(chunks)}")
+    finally:
+        # Deleting the session also kills the command if it timed out
+        await asyncio.to_thread(process.delete_session, session_id)
+        if timed_out:
+            await asyncio.to_thread(process.exec, f"rm -f {script}")
+    return ExecResult(exit_code=exit_code, result="".join(chunks))
+
+
+def stream_code_run(sandbox, code: str, on_output, timeout: int | None = None) -> ExecResult:
+    coro = astream_code_run(sandbox, code, on_output, timeout)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Called from inside an event loop's thread: run on a private loop instead
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        return runner.submit(asyncio.run, coro).result()
@@ -0,0 +1,262 @@
+import contextvars
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import metrics
+
+# Local timing and accounting for nodes, LLM calls and sandbox calls. Every
+# span lands in the metrics registry (and so /metrics), in a JSONL file that
+# works offline, and in OpenTelemetry when the API is installed.
+
+# USD per 1M tokens (prompt, completion). MODEL_PRICES='{"model": [in, out]}' adds or overrides.
+PRICES = {
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1-nano": (0.1, 0.4),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+}
+PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("MODEL_PRICES", "{}")).items()})
+
+# thread_id / node / attempt of the node currently running, attached to every span under it
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("telemetry_context", default={})
+
+
+def estimate_cost(model: str | None, prompt_tokens: int, completion_tokens: int) -> float | None:
+    # Longest matching prefix, so dated model ids ("gpt-4.1-mini-2025-04-14") still price
+    name = next((m for m in sorted(PRICES, key=len, reverse=True) if model and model.startswith(m)), None)
+    if name is None:
+        return None
+    prompt, completion = PRICES[name]
+    return (prompt_tokens * prompt + completion_tokens * completion) / 1_000_000
+
+
+class Telemetry:
+    def __init__(self, path: str | None = None, otel: bool = True, enabled: bool = True):
+        self.enabled = enabled
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self.tracer = None
+        if enabled and otel:
+            try:
+                from opentelemetry import trace
+                self.tracer = trace.get_tracer("multi-agent-data-analyst")
+            except ImportError:
+                pass
+
+    @classmethod
+    def from_env(cls) -> "Telemetry":
+        return cls(
+            path=os.getenv("TELEMETRY_PATH") or None,
+            otel=os.getenv("TELEMETRY_OTEL", "1").lower() in ("1", "true"),
+            enabled=os.getenv("TELEMETRY", "1").lower() in ("1", "true"),
+        )
+
+    def record(self, kind: str, name: str, ms: float, status: str = "ok", **attrs) -> None:
+        metrics.observe(f"{kind}_ms", ms, op=name)
+        if attrs.get("queue_ms"):
+            metrics.observe(f"{kind}_queue_ms", attrs["queue_ms"], op=name)
+        if status != "ok":
+            metrics.inc(f"{kind}_errors", op=name, status=status)
+        for field in ("prompt_tokens", "completion_tokens"):
+            if attrs.get(field):
+                metrics.inc("llm_tokens", attrs[field], op=name, type=field.split("_")[0])
+        if attrs.get("cost_usd"):
+            metrics.inc("llm_cost_usd", attrs["cost_usd"], op=name)
+        if self.path:
+            line = {"ts": round(time.time(), 3), "kind": kind, "name": name, "ms": round(ms, 1), "status": status,
+                    **_context.get(), **{k: v for k, v in attrs.items() if v is not None}}
+            self._write(json.dumps(line, default=str))
+
+    def _write(self, line: str) -> None:
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", buffering=1)
+            self._file.write(line + "\n")
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs):
+        # Yields a dict; whatever the body puts in it is recorded with the span
+        if not self.enabled:
+            yield attrs
+            return
+        otel = self.tracer.start_as_current_span(f"{kind} {name}") if self.tracer else None
+        otel_span = otel.__enter__() if otel else None
+        status, t0 = "ok", time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            status = type(e).__name__
+            raise
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            if otel_span is not None:
+                for key, value in {**_context.get(), **attrs, "status": status}.items():
+                    if isinstance(value, (str, bool, int, float)):
+                        otel_span.set_attribute(key, value)
+                otel.__exit__(None, None, None)
+            self.record(kind, name, ms, status, **attrs)
+
+    @contextmanager
+    def bind(self, **fields):
+        token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+        try:
+            yield
+        finally:
+            _context.reset(token)
+
+
+telemetry = Telemetry.from_env()
+
+
+class LLMTelemetry(BaseCallbackHandler):
+    """Records each chat model call of one role: latency, tokens and estimated cost."""
+
+    def __init__(self, role: str):
+        self.role = role
+        self._runs: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, invocation_params=None, **kwargs):
+        params = invocation_params or kwargs.get("invocation_params") or {}
+        model = (metadata or {}).get("ls_model_name") or params.get("model") or params.get("model_name")
+        span = telemetry.tracer.start_span(f"llm {self.role}") if telemetry.enabled and telemetry.tracer else None
+        self._runs[run_id] = (time.perf_counter(), model, span, _context.get())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id, "ok", response)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, type(error).__name__, None)
+
+    def _finish(self, run_id, status: str, response) -> None:
+        started = self._runs.pop(run_id, None)
+        if started is None or not telemetry.enabled:
+            return
+        t0, model, span, context = started
+        prompt, completion = _usage(response)
+        model = model or _response_model(response)
+        attrs = {"model": model, "prompt_tokens": prompt, "completion_tokens": completion,
+                 "cost_usd": estimate_cost(model, prompt or 0, completion or 0) if prompt or completion else None}
+        if span is not None:
+            for key, value in {**context, **attrs, "status": status}.items():
+                if value is not None:
+                    span.set_attribute(key, value)
+            span.end()
+        # Callbacks can fire on another thread; restore the caller's node/attempt for the record
+        token = _context.set(context)
+        try:
+            telemetry.record("llm", self.role, (time.perf_counter() - t0) * 1000, status, **attrs)
+        finally:
+            _context.reset(token)
+
+
+def _usage(response) -> tuple[int | None, int | None]:
+    if response is None:
+        return None, None
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens"), usage.get("output_tokens")
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+def _response_model(response) -> str | None:
+    if response is None:
+        return None
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+            if metadata.get("model_name"):
+                return metadata["model_name"]
+    return (response.llm_output or {}).get("model_name")
+
+
+class Traced:
+    """Proxy that records every public method call on `target` as a span."""
+
+    def __init__(self, target, kind: str, prefix: str, queue_ms: float | None = None):
+        self._target = target
+        self._kind = kind
+        self._prefix = prefix
+        self._queue_ms = round(queue_ms, 1) if queue_ms else None  # waited for the target to be ready
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        label = f"{self._prefix}.{name}"
+
+        if inspect.iscoroutinefunction(attr):
+            async def traced_async(*args, **kwargs):
+                with telemetry.span(self._kind, label, queue_ms=self._queue_ms) as span:
+                    result = await attr(*args, **kwargs)
+                    span["exit_code"] = getattr(result, "exit_code", None)
+                    return result
+            return traced_async
+
+        def traced(*args, **kwargs):
+            with telemetry.span(self._kind, label, queue_ms=self._queue_ms) as span:
+                result = attr(*args, **kwargs)
+                span["exit_code"] = getattr(result, "exit_code", None)
+                return result
+        return traced
+
+
+_node_ends: dict[str, float] = {}
+
+
+def traced_node(name: str, fn, entry: bool = False):
+    # One span per node run, tagged with the thread, node and attempt so LLM and sandbox spans nest under it.
+    # queue_ms is the gap since the thread's previous node finished (not measured at the graph's entry node).
+    def fields(state, config):
+        return {"thread_id": (config or {}).get("configurable", {}).get("thread_id"), "node": name,
+                "attempt": state.get("attempts") if isinstance(state, dict) else None}
+
+    def queued(thread_id):
+        ended = None if entry else _node_ends.get(thread_id)
+        return round((time.perf_counter() - ended) * 1000, 1) if ended else None
+
+    def finished(thread_id):
+        _node_ends[thread_id] = time.perf_counter()
+        if len(_node_ends) > 4096:
+            _node_ends.pop(next(iter(_node_ends)))
+
+    def outcome(span, result):
+        if isinstance(result, dict):
+            span["outcome"] = "error" if result.get("system_error") else "failed" if result.get("agent_error") else "ok"
+
+    if inspect.iscoroutinefunction(fn):
+        async def node(state, config):
+            tags = fields(state, config)
+            with telemetry.bind(**tags), telemetry.span("node", name, queue_ms=queued(tags["thread_id"])) as span:
+                try:
+                    result = await fn(state, config)
+                finally:
+                    finished(tags["thread_id"])
+                outcome(span, result)
+                return result
+    else:
+        def node(state, config):
+            tags = fields(state, config)
+            with telemetry.bind(**tags), telemetry.span("node", name, queue_ms=queued(tags["thread_id"])) as span:
+                try:
+                    result = fn(state, config)
+                finally:
+                    finished(tags["thread_id"])
+                outcome(span, result)
+                return result
+
+    if "return" in getattr(fn, "__annotations__", {}):
+        node.__annotations__["return"] = fn.__annotations__["return"]
+    node.__name__ = fn.__name__
+    return node
@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+
+from datasets import DatasetRegistry
+
+CSV = b"region,units\nNorth,3\nSouth,5\nEast,2\n"
+
+
+def test_reregister_after_restart_keeps_ingested_profile(tmp_path):
+    registry = DatasetRegistry(str(tmp_path))
+    dataset = registry.register(CSV, "sales.csv")
+    columnar = dataset.path.rsplit(".", 1)[0] + ".parquet"
+    (tmp_path / columnar.rsplit("/", 1)[1]).write_bytes(b"parquet")
+    registry.set_columnar(SimpleNamespace(id="sb-1"), dataset, columnar, {"n_rows": 3, "columns": {}})
+
+    # A new process: nothing in memory, same store on disk
+    again = DatasetRegistry(str(tmp_path)).register(CSV, "sales.csv")
+
+    assert again.handle == dataset.handle
+    assert again.columnar_path == columnar
+    assert again.profile == {"n_rows": 3, "columns": {}}
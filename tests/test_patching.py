@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+
+from patching import PatchError, apply_fix, apply_line_patches, apply_unified_diff
+
+CODE = "import pandas as pd\ndf = pd.read_csv('a.csv')\nresult = df.sum()\nprint(result)\n"
+
+
+def patch(start, end, replacement):
+    return SimpleNamespace(start_line=start, end_line=end, replacement=replacement)
+
+
+def test_line_patch_replaces_range():
+    assert apply_line_patches(CODE, [patch(3, 3, "result = df.mean()")]).splitlines()[2] == "result = df.mean()"
+
+
+def test_line_patch_inserts_when_end_is_before_start():
+    # end_line = start_line - 1 replaces nothing, so the line goes in before start_line
+    lines = apply_line_patches(CODE, [patch(3, 2, "df = df.dropna()"), patch(5, 4, "print('done')")]).splitlines()
+    assert lines[2] == "df = df.dropna()"
+    assert lines[3] == "result = df.sum()"
+    assert lines[-1] == "print('done')"
+
+
+def test_line_patches_apply_bottom_up_in_any_order():
+    lines = apply_line_patches(CODE, [patch(1, 1, "import numpy as np\nimport pandas as pd"),
+                                      patch(3, 3, "result = df.max()")]).splitlines()
+    assert lines[0] == "import numpy as np"
+    assert lines[3] == "result = df.max()"
+
+
+def test_overlapping_line_patches_are_rejected():
+    with pytest.raises(PatchError, match="overlaps"):
+        apply_line_patches(CODE, [patch(2, 3, "x = 1"), patch(3, 4, "y = 2")])
+
+
+def test_line_patch_outside_script_is_rejected():
+    with pytest.raises(PatchError, match="outside"):
+        apply_line_patches(CODE, [patch(4, 5, "x = 1")])
+
+
+def test_unified_diff_applies_at_stated_lines():
+    diff = "--- a\n+++ b\n@@ -3,2 +3,2 @@\n-result = df.sum()\n+result = df.mean()\n print(result)\n"
+    assert apply_unified_diff(CODE, diff).splitlines()[2] == "result = df.mean()"
+
+
+def test_unified_diff_accepts_drifted_hunk_with_unique_context():
+    diff = "@@ -10,1 +10,1 @@\n-result = df.sum()\n+result = df.mean()\n"
+    assert apply_unified_diff(CODE, diff).splitlines()[2] == "result = df.mean()"
+
+
+def test_unified_diff_rejects_drifted_hunk_with_ambiguous_context():
+    code = "x = 1\nprint(x)\nx = 1\nprint(x)\n"
+    with pytest.raises(PatchError, match="does not match"):
+        apply_unified_diff(code, "@@ -9,1 +9,1 @@\n-x = 1\n+x = 2\n")
+
+
+def test_unified_diff_without_hunks_is_rejected():
+    with pytest.raises(PatchError, match="no hunks"):
+        apply_unified_diff(CODE, "result = df.mean()\n")
+
+
+def test_fix_that_breaks_syntax_is_rejected():
+    with pytest.raises(PatchError, match="does not parse"):
+        apply_fix(CODE, patches=[patch(3, 3, "result = df.sum(")])
@@ -0,0 +1,61 @@
+from validation import _imports, imported_modules, parse_code, validate_code
+
+MODULES = frozenset({"pandas", "matplotlib", "json"})
+
+
+def test_imports_skip_guarded_try_import():
+    code = (
+        "import pandas\n"
+        "try:\n    import polars\nexcept ImportError:\n    polars = None\n"
+        "try:\n    from scipy import stats\nexcept (ValueError, ModuleNotFoundError):\n    stats = None\n"
+        "try:\n    import seaborn\nexcept:\n    pass\n"
+    )
+    assert _imports(parse_code(code)) == [(1, "pandas")]
+
+
+def test_imports_keep_try_import_with_unrelated_handler():
+    code = "try:\n    import seaborn.objects\nexcept ValueError:\n    pass\nfrom .local import x\n"
+    # Only the import in the try body counts as guarded, and relative imports are skipped
+    assert _imports(parse_code(code)) == [(2, "seaborn")]
+
+
+def test_imported_modules_of_unparseable_code_is_empty():
+    assert imported_modules("import pandas\nif True print(1)") == set()
+
+
+def test_missing_module_is_reported_with_its_line():
+    errors = validate_code("import pandas\nimport polars\nprint(result)\n", MODULES)
+    assert len(errors) == 1
+    assert errors[0].startswith("Line 2: ModuleNotFoundError: No module named 'polars'")
+
+
+def test_unknown_environment_skips_import_check():
+    assert validate_code("import polars\nprint(result)\n", None) == []
+
+
+def test_syntax_error_is_reported_alone():
+    errors = validate_code("result = [\nprint(result)\n", MODULES)
+    assert len(errors) == 1
+    assert "SyntaxError" in errors[0]
+
+
+def test_savefig_must_match_chart_names():
+    code = "import matplotlib.pyplot as plt\nplt.savefig('charts/other.png')\nprint(result)\n"
+    errors = validate_code(code, MODULES, charts_exists=True, chart_names=["revenue.png"])
+    assert errors[0].startswith("Line 2: savefig writes 'other.png'")
+    assert errors[1].startswith("generated_chart_names lists 'revenue.png'")
+
+
+def test_dynamic_savefig_path_does_not_count_as_missing_chart():
+    code = (
+        "import matplotlib.pyplot as plt\n"
+        "for name in ['a.png', 'b.png']:\n    plt.savefig(f'charts/{name}')\n"
+        "print(result)\n"
+    )
+    assert validate_code(code, MODULES, charts_exists=True, chart_names=["a.png", "b.png"]) == []
+
+
+def test_missing_print_result_is_reported():
+    errors = validate_code("result = []\n", MODULES)
+    assert len(errors) == 1
+    assert "never calls print(result)" in errors[0]
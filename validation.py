@@ -0,0 +1,182 @@
+import ast
+import json
+import threading
+from collections import OrderedDict
+
+# Errors that are knowable from the source alone are caught here, before the
+# code costs a sandbox round-trip. Each problem comes back as one line in the
+# shape the reflector already sees from real tracebacks.
+
+# iter_modules misses namespace packages (google, mpl_toolkits); distribution metadata covers those
+MANIFEST_COMMAND = (
+    "python3 -c \"import importlib.metadata as md, json, pkgutil, sys; "
+    "print(json.dumps(sorted({m.name for m in pkgutil.iter_modules()} | set(md.packages_distributions()) "
+    "| set(sys.builtin_module_names) | set(getattr(sys, 'stdlib_module_names', ())))))\""
+)
+
+_IMPORT_ERRORS = {"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}
+
+# CPython before 3.11.8 / 3.12.1 keeps the AST builder's recursion counter in
+# shared module state, so concurrent ast.parse calls can fail with
+# "SystemError: AST constructor recursion depth mismatch" (gh-106905)
+_parse_lock = threading.Lock()
+
+
+def parse_code(code: str) -> ast.Module:
+    with _parse_lock:
+        return ast.parse(code)
+
+
+def _image_key(sandbox) -> str:
+    raw = getattr(sandbox, "raw", sandbox)
+    return f"{type(raw).__name__}:{getattr(raw, 'snapshot', None) or ''}"
+
+
+class ImportManifest:
+    """Top-level modules importable in each sandbox.
+
+    Pool sandboxes come from one image, so a single fetch per image covers
+    them all. A sandbox whose environment was changed by a fix gets its own
+    entry, fetched again on next use.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._images: dict[str, frozenset[str]] = {}
+        self._changed: OrderedDict[str, frozenset[str] | None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def _cached(self, sandbox) -> frozenset[str] | None:
+        with self._lock:
+            if sandbox.id in self._changed:
+                self._changed.move_to_end(sandbox.id)
+                return self._changed[sandbox.id]
+            return self._images.get(_image_key(sandbox))
+
+    def get(self, sandbox) -> frozenset[str] | None:
+        modules = self._cached(sandbox)
+        if modules is not None:
+            return modules
+        # One fetch at a time: concurrent first uses would all pay for the same list
+        with self._fetch_lock:
+            modules = self._cached(sandbox)
+            if modules is not None:
+                return modules
+            try:
+                resp = sandbox.process.exec(MANIFEST_COMMAND, timeout=60)
+                modules = frozenset(json.loads(resp.result.strip().splitlines()[-1])) if resp.exit_code == 0 else None
+            except Exception:
+                modules = None
+            if modules is None:
+                # Unknown environment: skip the import check rather than guess
+                return None
+            with self._lock:
+                if sandbox.id in self._changed:
+                    self._changed[sandbox.id] = modules
+                else:
+                    self._images[_image_key(sandbox)] = modules
+        return modules
+
+    def invalidate(self, sandbox) -> None:
+        with self._lock:
+            self._changed[sandbox.id] = None
+            self._changed.move_to_end(sandbox.id)
+            while len(self._changed) > self.max_entries:
+                self._changed.popitem(last=False)
+
+
+def _chart_name(path: str) -> str:
+    path = path.removeprefix("./")
+    return path.removeprefix("charts/")
+
+
+def _guarded(node: ast.Try) -> bool:
+    # try: import x / except ImportError: ... is the code handling absence itself
+    for handler in node.handlers:
+        if handler.type is None:
+            return True
+        names = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+        if any(isinstance(n, ast.Name) and n.id in _IMPORT_ERRORS for n in names):
+            return True
+    return False
+
+
+def _imports(tree: ast.Module) -> list[tuple[int, str]]:
+    found = []
+
+    def visit(node, guarded):
+        if isinstance(node, ast.Import):
+            found.extend((node.lineno, alias.name.split(".")[0]) for alias in node.names if not guarded)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module and not guarded:
+            found.append((node.lineno, node.module.split(".")[0]))
+        for child in ast.iter_child_nodes(node):
+            visit(child, guarded or (isinstance(node, ast.Try) and child in node.body and _guarded(node)))
+
+    visit(tree, False)
+    return found
+
+
+def imported_modules(code: str) -> set[str]:
+    try:
+        return {module for _, module in _imports(parse_code(code))}
+    except SyntaxError:
+        return set()
+
+
+def _savefig_targets(tree: ast.Module) -> tuple[list[tuple[int, str]], bool]:
+    # (line, name) for every literal savefig path, and whether any path is computed
+    targets, dynamic = [], False
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+        if name != "savefig":
+            continue
+        arg = node.args[0] if node.args else next((k.value for k in node.keywords if k.arg == "fname"), None)
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            targets.append((node.lineno, _chart_name(arg.value)))
+        else:
+            dynamic = True
+    return targets, dynamic
+
+
+def _prints_result(tree: ast.Module) -> bool:
+    return any(isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "print"
+               and any(isinstance(a, ast.Name) and a.id == "result" for a in node.args)
+               for node in ast.walk(tree))
+
+
+def validate_code(code: str, modules: frozenset[str] | None = None, charts_exists: bool = False,
+                  chart_names: list[str] | None = None) -> list[str]:
+    try:
+        tree = parse_code(code)
+    except SyntaxError as e:
+        line = (e.text or "").rstrip()
+        return [f"Line {e.lineno}: SyntaxError: {e.msg}" + (f"\n    {line.strip()}" if line else "")]
+
+    errors = []
+    if modules is not None:
+        for lineno, module in _imports(tree):
+            if module not in modules and module != "__future__":
+                errors.append(f"Line {lineno}: ModuleNotFoundError: No module named '{module}' is installed in the sandbox. "
+                              "Use an installed package or install it with an ENVIRONMENT_FIX")
+
+    if charts_exists:
+        targets, dynamic = _savefig_targets(tree)
+        listed = {_chart_name(n) for n in chart_names or []}
+        for lineno, name in targets:
+            if name not in listed:
+                errors.append(f"Line {lineno}: savefig writes '{name}', which is not in generated_chart_names {sorted(listed)}, "
+                              "so it would not be collected. Save it under one of the listed names")
+        if not dynamic:
+            saved = {name for _, name in targets}
+            for name in sorted(listed - saved):
+                errors.append(f"generated_chart_names lists '{name}' but no savefig call saves it. "
+                              f"Add plt.savefig(\"charts/{name}\")")
+
+    if not _prints_result(tree):
+        errors.append("The script never calls print(result). Build `result` as a list of "
+                      "{'question': ..., 'answer': ...} dicts and end with print(result)")
+    return errors